@@ -0,0 +1,69 @@
+# scripts/bench_answer_matching.py
+#
+# Microbenchmark: per-pair encoding (the old match_answer loop) vs the batched,
+# cached similarity matrix behind match_answer / evaluate_question:
+#   python scripts/bench_answer_matching.py [--students 200] [--expected 5] [--repeat 3]
+
+import time
+import random
+import argparse
+
+from smartscripts.ai.embedding_cache import clear_embedding_cache, cosine_matrix
+from smartscripts.ai.models import get_embedding_model
+from smartscripts.ai.text_matching import match_answer
+
+WORDS = ("cell energy light water plant membrane osmosis diffusion carbon dioxide oxygen glucose "
+         "chlorophyll root leaf stem enzyme protein reaction temperature pressure").split()
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 25)))
+
+
+def per_pair_match(student_answer, expected_answers):
+    """The old loop: a fresh encode of the student answer and one expected answer per pair."""
+    model = get_embedding_model()
+    best_score, best_match = 0.0, ""
+    for expected in expected_answers:
+        embeddings = model.encode([student_answer, expected], convert_to_numpy=True,
+                                  show_progress_bar=False)
+        score = float(cosine_matrix(embeddings[:1], embeddings[1:])[0, 0])
+        if score > best_score:
+            best_score, best_match = score, expected
+    return best_match, best_score
+
+
+def _time(label, func, students, expected, repeat):
+    timings = []
+    for _ in range(repeat):
+        clear_embedding_cache()
+        start = time.perf_counter()
+        for answer in students:
+            func(answer, expected)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"  {label:<12} {best:.3f}s total  {best / len(students) * 1000:.2f}ms/student")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="match_answer microbenchmark")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--expected", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    students = [_sentence(rng) for _ in range(args.students)]
+    expected = [_sentence(rng) for _ in range(args.expected)]
+    get_embedding_model()  # load outside the timed region
+
+    print(f"\n📊 {args.students} answers x {args.expected} expected answers (best of {args.repeat})")
+    old = _time("per-pair", per_pair_match, students, expected, args.repeat)
+    new = _time("batched", lambda answer, exp: match_answer(answer, exp, threshold=0.0),
+                students, expected, args.repeat)
+    print(f"  speedup      x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
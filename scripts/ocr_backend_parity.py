@@ -0,0 +1,46 @@
+# scripts/ocr_backend_parity.py
+#
+# Compare TrOCR backends (torch fp32 vs torch-int8 / onnx) on sample pages:
+#   python scripts/ocr_backend_parity.py data/scanned_images/ [--backends torch-int8 onnx]
+
+import os
+import sys
+import argparse
+
+from smartscripts.ai.ocr_parity import run_backend_parity_check
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TrOCR backend parity check")
+    parser.add_argument("folder", help="Folder of sample page images")
+    parser.add_argument("--backends", nargs="+", default=["torch-int8", "onnx"])
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    image_paths = [
+        os.path.join(args.folder, name)
+        for name in sorted(os.listdir(args.folder))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+    if not image_paths:
+        print(f"❌ No images found in {args.folder}")
+        sys.exit(1)
+
+    report = run_backend_parity_check(image_paths, backends=args.backends,
+                                      batch_size=args.batch_size)
+
+    print(f"\n📊 Parity on {len(image_paths)} page(s) (baseline: torch fp32)")
+    for backend, result in report.items():
+        if "error" in result:
+            print(f"  {backend:<11} ❌ {result['error']}")
+            continue
+        print(
+            f"  {backend:<11} mean CER {result['mean_cer']:.4f}  max CER {result['max_cer']:.4f}  "
+            f"{result['seconds_per_page']:.3f}s/page  x{result['speedup']:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
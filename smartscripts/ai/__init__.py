@@ -5,21 +5,21 @@ Initialization of AI-related utilities and shared models for OCR, text matching,
 rubric-based scoring, and question alignment.
 """
 
-from sentence_transformers import SentenceTransformer
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
-import torch
+from .models import get_device, get_embedding_model, get_trocr
 
-# === Embedding Model for Text Matching ===
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
 
-# === TrOCR Model for OCR ===
-ocr_processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
-ocr_model = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-handwritten")
+# === Shared models (loaded lazily on first attribute access) ===
+def __getattr__(name):
+    if name == "embedding_model":
+        return get_embedding_model()
+    if name == "ocr_processor":
+        return get_trocr()[0]
+    if name == "ocr_model":
+        return get_trocr()[1]
+    if name == "device":
+        return get_device()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Use GPU if available
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-ocr_model.to(device)
-embedding_model.to(device)  # Optional – SBERT works on CPU too
 
 # === Import utility functions and classes from submodules ===
 from .gpt_explainer import generate_explanation
@@ -34,6 +34,9 @@ __all__ = [
     "ocr_model",
     "ocr_processor",
     "device",
+    "get_device",
+    "get_embedding_model",
+    "get_trocr",
     'generate_explanation',
     'generate_socratic_prompt',
     'build_reasoning_trace',
@@ -0,0 +1,288 @@
+"""
+Compiled marking guides.
+
+Everything grading needs from a guide is derived once per guide version
+instead of once per submission:
+
+- the guide text that free-text marking compares against (guide.txt)
+- the structured questions (guide.json, in the grade_submission_using_guide
+  format), each with its expected answers also cleaned ("clean_answers")
+- the embeddings of the guide text and of every cleaned expected answer
+- each question's rubric compiled into a keyword matcher, and its max marks
+
+A CompiledGuide is versioned by a content hash of its sources, the embedding
+model and RUBRIC_MAX_EDITS. It is kept in-process per test and on disk: a
+manifest under COMPILED_GUIDE_DIR plus the guide's embedding store, so a
+restarted worker loads the vectors memory-mapped instead of re-encoding.
+Source files are checked by (mtime, size) on each lookup, so an edited guide
+is recompiled on its next use. Uploading a marking guide goes through
+import_uploaded_guide() (queued as a Celery task, since scanned guides need
+OCR), which writes the upload's text as guide.txt and compiles it, so the
+first student graded after an upload does not pay for it. Deleting the guide
+goes through delete_compiled_guide(), which removes guide.txt, the manifest
+and the embedding store, so nothing is graded against a deleted guide.
+
+    guide = get_compiled_guide(test_id)
+    guide.expected_text, guide.expected_vector
+    guide.items[0]["clean_answers"], guide.answer_vectors(0), guide.rubric(0)
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from smartscripts.ai.embedding_cache import delete_store, guide_store_name, stored_embeddings
+from smartscripts.ai.rubric_matcher import CompiledRubric, get_compiled_rubric
+from smartscripts.config import BaseConfig
+from smartscripts.utils.text_cleaner import clean_text
+
+GUIDE_TEXT_FILE = "guide.txt"
+GUIDE_ITEMS_FILE = "guide.json"
+# Bump when the manifest layout changes, so older manifests are recompiled
+MANIFEST_FORMAT = 2
+
+
+def guide_source_dir(test_id) -> str:
+    return os.path.join("uploads", "guides", str(test_id))
+
+
+def _source_signature(test_id) -> List[Optional[Tuple[int, int]]]:
+    """(mtime_ns, size) of each source file, None when it does not exist."""
+    signature = []
+    for name in (GUIDE_TEXT_FILE, GUIDE_ITEMS_FILE):
+        try:
+            stat = os.stat(os.path.join(guide_source_dir(test_id), name))
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return signature
+
+
+def _read_sources(test_id) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    text_path = os.path.join(guide_source_dir(test_id), GUIDE_TEXT_FILE)
+    items_path = os.path.join(guide_source_dir(test_id), GUIDE_ITEMS_FILE)
+    guide_text = None
+    guide_items: List[Dict[str, Any]] = []
+    if os.path.isfile(text_path):
+        with open(text_path, "r", encoding="utf-8") as f:
+            guide_text = f.read()
+    if os.path.isfile(items_path):
+        with open(items_path, "r", encoding="utf-8") as f:
+            guide_items = json.load(f)
+    return guide_text, guide_items
+
+
+def guide_version(guide_text: Optional[str], guide_items: List[Dict[str, Any]]) -> str:
+    """Content hash of the guide sources plus the settings compilation depends on."""
+    payload = json.dumps(
+        [BaseConfig.EMBEDDING_MODEL, BaseConfig.RUBRIC_MAX_EDITS, guide_text, guide_items],
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class CompiledGuide:
+    """Precomputed grading data for one version of a test's marking guide."""
+
+    def __init__(self, test_id, version: str, expected_text: Optional[str],
+                 items: List[Dict[str, Any]], signature: List[Optional[Tuple[int, int]]] = None):
+        self.test_id = test_id
+        self.version = version
+        self.expected_text = expected_text
+        self.items = items
+        self.signature = signature
+
+        # One store row per text: the guide text (if any), then each question's answers in order
+        texts = [expected_text] if expected_text else []
+        texts += [answer for item in items for answer in item["clean_answers"]]
+        self._vectors = (stored_embeddings(guide_store_name(test_id), texts) if texts
+                         else np.zeros((0, 0), np.float32))
+        self._offsets = []
+        offset = 1 if expected_text else 0
+        for item in items:
+            self._offsets.append((offset, offset + len(item["clean_answers"])))
+            offset += len(item["clean_answers"])
+        self._rubrics = [
+            get_compiled_rubric(item["rubric"], BaseConfig.RUBRIC_MAX_EDITS) for item in items
+        ]
+
+    @property
+    def expected_vector(self) -> Optional[np.ndarray]:
+        """Embedding of the guide text, shaped (1, dim)."""
+        return self._vectors[:1] if self.expected_text else None
+
+    def answer_vectors(self, index: int) -> np.ndarray:
+        """Embeddings of question `index`'s cleaned expected answers (empty answers included)."""
+        start, end = self._offsets[index]
+        return self._vectors[start:end]
+
+    def rubric(self, index: int) -> CompiledRubric:
+        return self._rubrics[index]
+
+    def to_manifest(self) -> Dict[str, Any]:
+        return {
+            "format": MANIFEST_FORMAT,
+            "test_id": self.test_id,
+            "version": self.version,
+            "signature": self.signature,
+            "embedding_model": BaseConfig.EMBEDDING_MODEL,
+            "rubric_max_edits": BaseConfig.RUBRIC_MAX_EDITS,
+            "expected_text": self.expected_text,
+            "items": self.items,
+        }
+
+
+def _compile_items(guide_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    items = []
+    for idx, item in enumerate(guide_items):
+        items.append({
+            "id": item.get("id", f"q{idx+1}"),
+            "question": item.get("question", ""),
+            "answers": list(item.get("answers", [])),
+            "clean_answers": [clean_text(answer) for answer in item.get("answers", [])],
+            "rubric": list(item.get("rubric", [])),
+            "max_marks": item.get("max_marks", 1.0),
+        })
+    return items
+
+
+# -------------------- Caches --------------------
+
+_compiled: Dict[str, CompiledGuide] = {}
+_lock = threading.Lock()
+
+
+def _manifest_path(test_id) -> str:
+    return os.path.join(BaseConfig.COMPILED_GUIDE_DIR, f"{test_id}.json")
+
+
+def _write_manifest(guide: CompiledGuide):
+    path = _manifest_path(guide.test_id)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(guide.to_manifest(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[guides] Could not write compiled guide for test {guide.test_id}: {e}")
+
+
+def _load_manifest(test_id, signature) -> Optional[CompiledGuide]:
+    try:
+        with open(_manifest_path(test_id), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stored_signature = [
+        tuple(entry) if entry else None for entry in manifest.get("signature") or []
+    ]
+    if manifest.get("format") != MANIFEST_FORMAT or stored_signature != signature:
+        return None
+    if (manifest.get("embedding_model"), manifest.get("rubric_max_edits")) != (
+            BaseConfig.EMBEDDING_MODEL, BaseConfig.RUBRIC_MAX_EDITS):
+        return None
+    return CompiledGuide(test_id, manifest["version"], manifest.get("expected_text"),
+                         manifest["items"], signature)
+
+
+def compile_guide(test_id, guide_text: Optional[str] = None,
+                  guide_items: Optional[List[Dict[str, Any]]] = None) -> CompiledGuide:
+    """
+    Compile a test's guide and cache it in-process and on disk. Sources are
+    read from the guide folder unless given. Raises FileNotFoundError when
+    the test has no guide.
+    """
+    signature = _source_signature(test_id)
+    if guide_text is None and guide_items is None:
+        guide_text, guide_items = _read_sources(test_id)
+    guide_items = guide_items or []
+    if guide_text is None and not guide_items:
+        raise FileNotFoundError(
+            f"Guide file not found for test_id={test_id} in {guide_source_dir(test_id)}"
+        )
+
+    guide = CompiledGuide(test_id, guide_version(guide_text, guide_items), guide_text,
+                          _compile_items(guide_items), signature)
+    with _lock:
+        _compiled[str(test_id)] = guide
+    _write_manifest(guide)
+    return guide
+
+
+def get_compiled_guide(test_id) -> CompiledGuide:
+    """The current CompiledGuide for a test: in-process, else from disk, else compiled now."""
+    signature = _source_signature(test_id)
+    with _lock:
+        guide = _compiled.get(str(test_id))
+    if guide is not None and guide.signature == signature:
+        return guide
+
+    guide = _load_manifest(test_id, signature)
+    if guide is not None:
+        with _lock:
+            _compiled[str(test_id)] = guide
+        return guide
+    return compile_guide(test_id)
+
+
+def _uploaded_guide_text(upload_path: str) -> str:
+    """Text of an uploaded guide PDF: text layer where present, OCR otherwise."""
+    from smartscripts.ai.ocr_engine import extract_pdf_pages
+
+    return "\n\n".join(page["text"] for page in extract_pdf_pages(upload_path) if page["text"])
+
+
+def import_uploaded_guide(test_id, upload_path: str) -> Optional[CompiledGuide]:
+    """
+    Make an uploaded marking guide the test's guide source (its text becomes
+    guide.txt) and compile it, so grading starts warm. The previous upload's
+    text is removed first, so it is not used when this one cannot be read.
+    Returns None when no text could be read from the upload.
+    """
+    delete_compiled_guide(test_id)
+    guide_text = _uploaded_guide_text(upload_path)
+    if not guide_text.strip():
+        print(f"[guides] No text found in uploaded guide {upload_path} for test {test_id}")
+        return None
+
+    source_dir = guide_source_dir(test_id)
+    os.makedirs(source_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=source_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(guide_text)
+    os.replace(tmp_path, os.path.join(source_dir, GUIDE_TEXT_FILE))
+    return refresh_compiled_guide(test_id)
+
+
+def refresh_compiled_guide(test_id) -> Optional[CompiledGuide]:
+    """Recompile after an upload or edit; None when the test has no guide sources yet."""
+    invalidate_compiled_guide(test_id)
+    try:
+        return compile_guide(test_id)
+    except FileNotFoundError:
+        return None
+
+
+def invalidate_compiled_guide(test_id):
+    with _lock:
+        _compiled.pop(str(test_id), None)
+    try:
+        os.remove(_manifest_path(test_id))
+    except OSError:
+        pass
+
+
+def delete_compiled_guide(test_id):
+    """Forget an uploaded guide: its guide.txt, compiled manifest and embedding store."""
+    invalidate_compiled_guide(test_id)
+    try:
+        os.remove(os.path.join(guide_source_dir(test_id), GUIDE_TEXT_FILE))
+    except OSError:
+        pass
+    delete_store(guide_store_name(test_id))
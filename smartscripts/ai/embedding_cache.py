@@ -0,0 +1,207 @@
+"""
+Embedding cache for answer texts.
+
+Vectors are keyed by a hash of the text and the embedding model name:
+
+- an in-process LRU (EMBEDDING_CACHE_SIZE vectors) shared by every caller, so
+  an expected answer is encoded once per process rather than once per student
+- named stores on disk, one `.npy` file per store and content version under
+  EMBEDDING_STORE_DIR, memory-mapped on load. A marking guide's expected
+  answers live in a store named after the guide and are computed once per
+  guide version; a submission's answers can be stored the same way so a
+  regrade re-reads them instead of re-encoding.
+
+    vectors = embed_texts(["answer one", "answer two"])      # LRU, one batched encode for misses
+    vectors = stored_embeddings("guide-12", expected_answers)  # LRU + guide-12/<version>.npy
+    sims = cosine_matrix(student_vectors, vectors)
+"""
+
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from smartscripts.config import BaseConfig
+from smartscripts.ai.models import get_embedding_model
+
+_lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "store_hits": 0, "store_writes": 0}
+
+
+def _model_name(model_name: Optional[str]) -> str:
+    return model_name or BaseConfig.EMBEDDING_MODEL
+
+
+def text_key(text: str, model_name: Optional[str] = None) -> str:
+    return hashlib.sha256(f"{_model_name(model_name)}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _lru_get(key: str) -> Optional[np.ndarray]:
+    with _lock:
+        vector = _lru.get(key)
+        if vector is not None:
+            _lru.move_to_end(key)
+        return vector
+
+
+def _lru_put(key: str, vector: np.ndarray):
+    with _lock:
+        _lru[key] = vector
+        _lru.move_to_end(key)
+        while len(_lru) > BaseConfig.EMBEDDING_CACHE_SIZE:
+            _lru.popitem(last=False)
+
+
+def _encode(texts: List[str], model_name: str) -> np.ndarray:
+    if model_name != BaseConfig.EMBEDDING_MODEL:
+        raise ValueError(
+            f"Only the configured embedding model ({BaseConfig.EMBEDDING_MODEL}) can be encoded."
+        )
+    vectors = get_embedding_model().encode(texts, convert_to_numpy=True, show_progress_bar=False)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def embed_texts(texts: Sequence[str], model_name: Optional[str] = None) -> np.ndarray:
+    """
+    Embeddings for `texts` as a (len(texts), dim) float32 array. Cached
+    vectors come from the LRU; all misses are encoded in one batch.
+    """
+    model_name = _model_name(model_name)
+    texts = list(texts)
+    if not BaseConfig.EMBEDDING_CACHE_ENABLED:
+        return _encode(texts, model_name) if texts else np.zeros((0, 0), np.float32)
+
+    keys = [text_key(text, model_name) for text in texts]
+    vectors: List[Optional[np.ndarray]] = [_lru_get(key) for key in keys]
+    missing: Dict[str, List[int]] = {}
+    for index, vector in enumerate(vectors):
+        if vector is None:
+            missing.setdefault(keys[index], []).append(index)
+
+    with _lock:
+        _stats["hits"] += len(texts) - sum(len(indices) for indices in missing.values())
+        _stats["misses"] += len(missing)
+
+    if missing:
+        encoded = _encode([texts[indices[0]] for indices in missing.values()], model_name)
+        for (key, indices), vector in zip(missing.items(), encoded):
+            _lru_put(key, vector)
+            for index in indices:
+                vectors[index] = vector
+
+    if not vectors:
+        return np.zeros((0, 0), np.float32)
+    return np.vstack(vectors)
+
+
+# -------------------- Named stores (.npy per guide / submission) --------------------
+
+def _store_dir(store: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", store)
+    return os.path.join(BaseConfig.EMBEDDING_STORE_DIR, safe)
+
+
+def store_version(texts: Sequence[str], model_name: Optional[str] = None) -> str:
+    """Content hash of a store: the model and every text, in order."""
+    digest = hashlib.sha256(_model_name(model_name).encode("utf-8"))
+    for text in texts:
+        digest.update(text_key(text, model_name).encode("ascii"))
+    return digest.hexdigest()[:16]
+
+
+def _write_store(path: str, vectors: np.ndarray):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A private temp file per writer: threads of one process may write the same store
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, vectors)
+    os.replace(tmp_path, path)
+    # Older versions of this store are stale once the new one is in place
+    for name in os.listdir(os.path.dirname(path)):
+        if name.endswith(".npy") and os.path.join(os.path.dirname(path), name) != path:
+            try:
+                os.remove(os.path.join(os.path.dirname(path), name))
+            except OSError:
+                pass
+
+
+def stored_embeddings(store: str, texts: Sequence[str],
+                      model_name: Optional[str] = None) -> np.ndarray:
+    """
+    Embeddings for `texts` kept in the named store (e.g. "guide-12"). The
+    store's `.npy` file is versioned by content hash, so editing the texts or
+    changing the model writes a new version; an unchanged store is
+    memory-mapped from disk and its vectors seed the in-process LRU.
+    """
+    model_name = _model_name(model_name)
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), np.float32)
+    if not BaseConfig.EMBEDDING_CACHE_ENABLED:
+        return _encode(texts, model_name)
+
+    path = os.path.join(_store_dir(store), f"{store_version(texts, model_name)}.npy")
+    if os.path.isfile(path):
+        try:
+            vectors = np.load(path, mmap_mode="r")
+            if vectors.shape[0] == len(texts):
+                with _lock:
+                    _stats["store_hits"] += 1
+                for text, vector in zip(texts, vectors):
+                    _lru_put(text_key(text, model_name), np.array(vector))
+                return vectors
+        except (OSError, ValueError):
+            pass  # unreadable or truncated file; rebuilt below
+
+    vectors = embed_texts(texts, model_name)
+    try:
+        _write_store(path, vectors)
+        with _lock:
+            _stats["store_writes"] += 1
+    except OSError as e:
+        print(f"[embeddings] Could not write store {store}: {e}")
+    return vectors
+
+
+def delete_store(store: str):
+    """Remove a named store's vectors from disk."""
+    shutil.rmtree(_store_dir(store), ignore_errors=True)
+
+
+def guide_store_name(test_id) -> str:
+    return f"guide-{test_id}"
+
+
+def submission_store_name(test_id, student_id) -> str:
+    return f"submission-{test_id}-{student_id}"
+
+
+# -------------------- Similarity --------------------
+
+def cosine_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Cosine similarity between every row of `a` and every row of `b`."""
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    if a.size == 0 or b.size == 0:
+        return np.zeros((len(a), len(b)), np.float32)
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return a @ b.T
+
+
+def embedding_cache_stats() -> dict:
+    with _lock:
+        return dict(_stats, size=len(_lru))
+
+
+def clear_embedding_cache():
+    """Drop the in-process vectors (stores on disk are kept)."""
+    with _lock:
+        _lru.clear()
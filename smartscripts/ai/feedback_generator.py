@@ -1,9 +1,7 @@
 import os
 import json
-from transformers import pipeline
 
-# Load a transformer model for text generation (replace with OpenAI API if preferred)
-generator = pipeline("text-generation", model="gpt2")
+from smartscripts.ai.models import get_text_generator
 
 def generate_feedback(question: str, student_answer: str, correct_answer: str) -> str:
     prompt = f"""
@@ -13,6 +11,8 @@ Correct Answer: {correct_answer}
 
 Provide specific, constructive feedback to help the student improve.
 """
+    # Shared text-generation pipeline (GPT-2 by default), loaded on first use
+    generator = get_text_generator()
     response = generator(prompt, max_length=100, num_return_sequences=1)
     return response[0]['generated_text'].strip()
 
@@ -1,10 +1,7 @@
 # gpt_explainer.py
 # LLM calls for explanation generation using OpenAI API
 
-import os
-import openai
-
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from smartscripts.ai.llm_client import llm_chat
 
 def generate_explanation(answer_text, rubric_json):
     """
@@ -16,13 +13,12 @@ def generate_explanation(answer_text, rubric_json):
         "Provide a detailed reasoning trace."
     )
     try:
-        response = openai.ChatCompletion.create(
+        explanation = llm_chat(
+            [{"role": "user", "content": prompt}],
             model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=500
         )
-        explanation = response['choices'][0]['message']['content']
         return explanation
     except Exception as e:
         return f"Error generating explanation: {e}"
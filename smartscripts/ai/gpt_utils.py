@@ -1,8 +1,4 @@
-import os
-import openai
-
-# Ensure your API key is loaded from environment variable
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from smartscripts.ai.llm_client import llm_chat
 
 
 def call_gpt(prompt: str, model: str = "gpt-4", temperature: float = 0.7, max_tokens: int = 300) -> str:
@@ -10,13 +6,13 @@ def call_gpt(prompt: str, model: str = "gpt-4", temperature: float = 0.7, max_to
     Call OpenAI's GPT model with a prompt and return the response text.
     """
     try:
-        response = openai.ChatCompletion.create(
+        response = llm_chat(
+            [{"role": "user", "content": prompt}],
             model=model,
-            messages=[{"role": "user", "content": prompt}],
             temperature=temperature,
             max_tokens=max_tokens
         )
-        return response.choices[0].message["content"].strip()
+        return response.strip()
     except Exception as e:
         print(f"[GPT ERROR] {e}")
         return "Sorry, I couldn't generate a response."
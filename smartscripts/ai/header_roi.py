@@ -0,0 +1,215 @@
+"""
+Header region-of-interest extraction for cover-sheet identity fields.
+
+Only the top band of a cover sheet carries the student's name and ID, and
+TrOCR reads single text lines far better than whole pages, so identity OCR
+runs on small crops instead of the full page: one crop for the name field
+and one for the ID field. Regions come from, in order:
+
+    1. a teacher-defined template (HEADER_ROI_TEMPLATE or the `template` argument)
+    2. horizontal form lines (the write-on lines of the cover sheet), when there
+       are at least two of them in the band
+    3. keyword anchors ("Name", "ID", "Reg No", ...) found by Tesseract in the
+       band, topped up with any form line found; a full Tesseract pass costs
+       about as much as the crops it saves, so it is the last resort
+    4. the whole header band, when nothing else is found
+
+Cover sheets with boxed fields rather than write-on lines are best served by
+a template.
+
+Templates are fractions of the page size, either one rectangle
+`"x0,y0,x1,y1"` or labelled rectangles `"name=x0,y0,x1,y1;id=x0,y0,x1,y1"`
+(a dict/tuple in Python).
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from smartscripts.config import BaseConfig
+
+Box = Tuple[int, int, int, int]            # (left, top, right, bottom) in page pixels
+FractionRect = Tuple[float, float, float, float]
+Template = Union[str, FractionRect, Dict[str, FractionRect]]
+
+NAME_KEYWORDS = {"name", "names", "surname", "candidate"}
+ID_KEYWORDS = {"id", "reg", "regno", "registration", "admission", "adm", "index", "number", "no"}
+
+FIELD_LABELS = ("name", "id")  # one crop per field and page
+MIN_LINE_WIDTH_FRACTION = 0.1  # form lines shorter than this share of the width are ignored
+TEXT_HEIGHT_FRACTION = 0.035   # handwriting height above a form line, as a share of page height
+
+
+def parse_template(template: Optional[Template]) -> Dict[str, FractionRect]:
+    """Normalise a template string/tuple/dict to {label: (x0, y0, x1, y1)}; "" marks no label."""
+    if not template:
+        return {}
+    if isinstance(template, dict):
+        return {label: tuple(float(v) for v in rect) for label, rect in template.items()}
+    if not isinstance(template, str):
+        return {"": tuple(float(v) for v in template)}
+
+    rects = {}
+    for part in template.split(";"):
+        if not part.strip():
+            continue
+        label, _, values = part.rpartition("=")
+        rect = tuple(float(v) for v in values.split(","))
+        if len(rect) != 4:
+            raise ValueError(f"Invalid header template rectangle: '{part}'")
+        rects[label.strip().lower()] = rect
+    return rects
+
+
+def _to_gray(image) -> np.ndarray:
+    if isinstance(image, Image.Image):
+        return np.array(image.convert("L"))
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    return image
+
+
+def _field_label(word: str) -> str:
+    word = re.sub(r"[^a-z]", "", word.lower())
+    if word in NAME_KEYWORDS:
+        return "name"
+    if word in ID_KEYWORDS:
+        return "id"
+    return ""
+
+
+def find_keyword_anchors(band: np.ndarray) -> List[Tuple[str, Box]]:
+    """
+    Locate field labels in the header band with Tesseract's word boxes.
+    Adjacent label words on one row ("Reg", "No:") are merged into a single
+    anchor. Returns [] when pytesseract/Tesseract is unavailable.
+    """
+    try:
+        import pytesseract
+        data = pytesseract.image_to_data(band, output_type=pytesseract.Output.DICT)
+    except Exception as e:
+        print(f"[header_roi] Keyword anchors unavailable: {e}")
+        return []
+
+    words = []
+    for i, word in enumerate(data["text"]):
+        label = _field_label(word or "")
+        if label:
+            left, top = data["left"][i], data["top"][i]
+            words.append((label, (left, top, left + data["width"][i], top + data["height"][i])))
+    words.sort(key=lambda item: (item[1][1], item[1][0]))
+
+    anchors: List[Tuple[str, Box]] = []
+    for label, box in words:
+        if anchors:
+            prev_label, prev = anchors[-1]
+            height = max(prev[3] - prev[1], 1)
+            same_row = abs(box[1] - prev[1]) < height
+            if same_row and 0 <= box[0] - prev[2] < 1.5 * height:
+                merged_label = "name" if "name" in (prev_label, label) else prev_label
+                merged = (prev[0], min(prev[1], box[1]), box[2], max(prev[3], box[3]))
+                anchors[-1] = (merged_label, merged)
+                continue
+        anchors.append((label, box))
+    return anchors
+
+
+def find_form_lines(band: np.ndarray) -> List[Box]:
+    """Horizontal write-on lines in the header band, top to bottom, as pixel boxes."""
+    binary = cv2.adaptiveThreshold(band, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                   cv2.THRESH_BINARY_INV, 15, 10)
+    width = band.shape[1]
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(40, width // 30), 1))
+    lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w >= MIN_LINE_WIDTH_FRACTION * width:
+            boxes.append((x, y, x + w, y + h))
+    return sorted(boxes, key=lambda box: (box[1], box[0]))
+
+
+def _overlaps(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _pick_fields(regions: List[Tuple[str, Box]]) -> List[Tuple[str, Box]]:
+    """The first "name" and first "id" region; other regions fill the slots left, in order."""
+    keep = []
+    seen = set()
+    for i, (label, _) in enumerate(regions):
+        if label in FIELD_LABELS and label not in seen:
+            seen.add(label)
+            keep.append(i)
+    for i, (label, _) in enumerate(regions):
+        if len(keep) >= len(FIELD_LABELS):
+            break
+        if label not in FIELD_LABELS:
+            keep.append(i)
+    return [regions[i] for i in sorted(keep)]
+
+
+def locate_header_regions(image, template: Optional[Template] = None,
+                          band_fraction: Optional[float] = None) -> List[Tuple[str, Box]]:
+    """
+    Return at most two (label, box) pairs for the identity fields of a cover
+    page, one name and one ID. Labels are "name", "id" or "" when unknown.
+    """
+    gray = _to_gray(image)
+    page_h, page_w = gray.shape[:2]
+
+    rects = parse_template(template if template is not None else BaseConfig.HEADER_ROI_TEMPLATE)
+    if rects:
+        return _pick_fields([
+            (label, (int(x0 * page_w), int(y0 * page_h), int(x1 * page_w), int(y1 * page_h)))
+            for label, (x0, y0, x1, y1) in rects.items()
+        ])
+
+    band_fraction = BaseConfig.HEADER_ROI_BAND if band_fraction is None else band_fraction
+    band_h = max(1, int(page_h * band_fraction))
+    band = gray[:band_h]
+
+    # Form lines: the handwriting sits just above each write-on line
+    text_h = max(8, int(page_h * TEXT_HEIGHT_FRACTION))
+    line_regions: List[Tuple[str, Box]] = []
+    previous_bottom = 0
+    for left, top, right, bottom in find_form_lines(band):
+        box = (left, max(previous_bottom, top - text_h), right, min(band_h, bottom + text_h // 8))
+        previous_bottom = bottom
+        if box[3] - box[1] >= 4:
+            line_regions.append(("", box))
+    if len(line_regions) >= len(FIELD_LABELS):
+        return line_regions[:len(FIELD_LABELS)]
+
+    # Keyword anchors: the value sits to the right of the label, up to the next label on the row
+    regions: List[Tuple[str, Box]] = []
+    anchors = find_keyword_anchors(band)
+    for label, (left, top, right, bottom) in anchors:
+        height = bottom - top
+        row_end = min(
+            [a[1][0] for a in anchors if a[1][0] > right and abs(a[1][1] - top) < height]
+            or [page_w]
+        )
+        box = (right, max(0, top - height // 2), row_end, min(band_h, bottom + height))
+        regions.append((label, box))
+    regions += [
+        (label, box) for label, box in line_regions
+        if not any(_overlaps(box, existing) for _, existing in regions)
+    ]
+
+    if not regions:
+        return [("", (0, 0, page_w, band_h))]
+    return _pick_fields(regions)
+
+
+def extract_header_regions(image, template: Optional[Template] = None,
+                           band_fraction: Optional[float] = None) -> List[Tuple[str, Image.Image]]:
+    """Crop the identity-field regions of a cover page (PIL image or RGB/grayscale array)."""
+    page = image if isinstance(image, Image.Image) else Image.fromarray(image)
+    regions = locate_header_regions(page, template, band_fraction)
+    return [(label, page.crop(box)) for label, box in regions]
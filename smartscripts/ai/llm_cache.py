@@ -0,0 +1,106 @@
+"""
+Persistent cache for LLM responses.
+
+Keys hash the model, the generation parameters and the normalized prompt
+(whitespace collapsed, so re-OCR'd text with different spacing still hits),
+which lets recurring calls such as `gpt_similarity` on a common wrong answer
+or `explain_answer` for the same question across a class be served from the
+local SQLite cache instead of being re-billed.
+
+Sampled calls (temperature > 0) are cached too unless LLM_CACHE_BYPASS_SAMPLED
+is set; any single call can opt out with `cache=False`.
+"""
+
+import re
+import json
+import hashlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+from smartscripts.config import BaseConfig
+from smartscripts.utils.disk_cache import DiskCache
+
+# Bump when prompts or response handling change in a way that should invalidate old entries
+LLM_CACHE_VERSION = 1
+
+_cache: Optional[DiskCache] = None
+_counters = Counter()
+
+
+def get_llm_cache() -> Optional[DiskCache]:
+    """Process-wide LLM response cache, or None when LLM_CACHE_ENABLED is off."""
+    global _cache
+    if not BaseConfig.LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = DiskCache(
+            BaseConfig.LLM_CACHE_PATH,
+            max_entries=BaseConfig.LLM_CACHE_MAX_ENTRIES,
+            max_bytes=BaseConfig.LLM_CACHE_MAX_BYTES,
+            default_ttl=BaseConfig.LLM_CACHE_TTL or None,
+        )
+    return _cache
+
+
+def normalize_prompt(content):
+    """Collapse whitespace in text content; image parts are kept as-is (their data is hashed)."""
+    if isinstance(content, str):
+        return re.sub(r"\s+", " ", content).strip()
+    if isinstance(content, list):
+        return [normalize_prompt(part) for part in content]
+    if isinstance(content, dict):
+        return {
+            key: normalize_prompt(value) if key == "text" else value
+            for key, value in content.items()
+        }
+    return content
+
+
+def llm_cache_key(request: Dict) -> str:
+    """Fingerprint of a chat request: model + parameters + normalized messages."""
+    params = {
+        key: value for key, value in request.items()
+        if key not in ("messages", "timeout", "cache")
+    }
+    messages = [
+        {"role": message.get("role"), "content": normalize_prompt(message.get("content"))}
+        for message in request.get("messages", [])
+    ]
+    payload = {"v": LLM_CACHE_VERSION, "params": params, "messages": messages}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def is_cacheable(request: Dict) -> bool:
+    if request.get("cache") is False:
+        return False
+    if BaseConfig.LLM_CACHE_BYPASS_SAMPLED and (request.get("temperature") or 0) > 0:
+        return False
+    return True
+
+
+def lookup(requests: List[Dict]) -> List[Optional[str]]:
+    """Cached response per request (None for misses and bypassed requests)."""
+    cache = get_llm_cache()
+    results: List[Optional[str]] = []
+    for request in requests:
+        if cache is None or not is_cacheable(request):
+            _counters["bypassed"] += 1
+            results.append(None)
+            continue
+        value = cache.get(llm_cache_key(request))
+        results.append(value.decode("utf-8") if value is not None else None)
+    return results
+
+
+def store(request: Dict, response: str):
+    cache = get_llm_cache()
+    if cache is not None and is_cacheable(request):
+        cache.set(llm_cache_key(request), response.encode("utf-8"))
+
+
+def llm_cache_stats() -> dict:
+    """Hit/miss/eviction counts and hit rate for this process, plus bypassed calls."""
+    cache = get_llm_cache()
+    if cache is None:
+        return {"enabled": False, "bypassed": _counters["bypassed"]}
+    return dict(cache.stats(), bypassed=_counters["bypassed"])
@@ -0,0 +1,308 @@
+"""
+Shared asyncio client for OpenAI-compatible chat completion calls.
+
+- Bounded concurrency (a semaphore around in-flight requests)
+- Token-bucket rate limiting (requests per second with a burst allowance)
+- Per-call timeouts, and retries with exponential backoff plus full jitter
+  on timeouts, connection errors, HTTP 429 and 5xx
+- A circuit breaker that fails fast (CircuitOpenError) once the API keeps
+  failing, and lets a single probe through after a cool-down
+
+Existing synchronous callers use the facade:
+
+    text = llm_chat([{"role": "user", "content": prompt}], model="gpt-4")
+    texts = llm_chat_many([{"messages": [...]}, {"messages": [...]}])  # concurrent
+
+Both go through the persistent response cache in llm_cache first.
+
+The facade runs one event loop in a background thread per process, so it can
+be called from Flask views, Celery tasks and worker threads alike.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional, Union
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """A chat completion call failed."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class LLMTimeoutError(LLMError):
+    def __init__(self, message: str):
+        super().__init__(message, retryable=True)
+
+
+class CircuitOpenError(LLMError):
+    """Raised without calling the API while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half-open after `reset_timeout` seconds (one probe call allowed);
+    half-open -> closed on success, back to open on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError("LLM circuit breaker is open; failing fast.")
+            self.state = "half-open"
+        if self.state == "half-open":
+            if self._probe_in_flight:
+                raise CircuitOpenError("LLM circuit breaker is half-open; probe already in flight.")
+            self._probe_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.state = "closed"
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == "half-open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+class AsyncLLMClient:
+    """Concurrent, rate-limited chat completion client. Create and use it on one event loop."""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = DEFAULT_BASE_URL,
+                 max_concurrency: int = 8, rate_per_second: float = 5.0,
+                 burst: Optional[float] = None, timeout: float = 30.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "short_circuited": 0}
+
+    def _post(self, payload: dict, timeout: float) -> dict:
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.api_key or ''}",
+            },
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            body = e.read().decode("utf-8", "replace")[:500]
+            raise LLMError(f"HTTP {e.code}: {body}", status=e.code,
+                           retryable=e.code in RETRYABLE_STATUS)
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, TimeoutError):
+                raise LLMTimeoutError(f"Request timed out after {timeout}s")
+            raise LLMError(f"Connection error: {e.reason}", retryable=True)
+        except TimeoutError:
+            raise LLMTimeoutError(f"Request timed out after {timeout}s")
+
+    async def _attempt(self, payload: dict, timeout: float) -> dict:
+        await self._bucket.acquire()
+        async with self._semaphore:
+            try:
+                # The thread-level socket timeout and the asyncio timeout back each other up
+                return await asyncio.wait_for(
+                    asyncio.to_thread(self._post, payload, timeout), timeout + 1
+                )
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"Request timed out after {timeout}s")
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def chat(self, messages: List[Dict], model: str = "gpt-4",
+                   temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                   timeout: Optional[float] = None) -> str:
+        """Return the content of the first choice for one chat completion request."""
+        payload = {"model": model, "messages": messages}
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        timeout = timeout or self.timeout
+
+        self.stats["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self.stats["short_circuited"] += 1
+                raise
+            try:
+                response = await self._attempt(payload, timeout)
+            except LLMError as e:
+                if not e.retryable:
+                    # Client errors (bad request, auth) say nothing about API health
+                    self.breaker.record_success()
+                    self.stats["failures"] += 1
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            self.breaker.record_success()
+            return response["choices"][0]["message"]["content"]
+
+    async def chat_many(self, requests: List[Dict]) -> List[Union[str, Exception]]:
+        """Run several `chat(**request)` calls concurrently; failures are returned, not raised."""
+        return await asyncio.gather(
+            *(self.chat(**request) for request in requests), return_exceptions=True
+        )
+
+
+# -------------------- Synchronous facade --------------------
+
+class SyncLLMClient:
+    """Blocking wrapper that owns an AsyncLLMClient on a background event loop thread."""
+
+    def __init__(self, **client_kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client",
+                                        daemon=True)
+        self._thread.start()
+        self.client = self._run(self._create(client_kwargs))
+
+    @staticmethod
+    async def _create(client_kwargs: dict) -> AsyncLLMClient:
+        return AsyncLLMClient(**client_kwargs)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def chat(self, messages: List[Dict], **kwargs) -> str:
+        return self._run(self.client.chat(messages, **kwargs))
+
+    def chat_many(self, requests: List[Dict]) -> List[Union[str, Exception]]:
+        return self._run(self.client.chat_many(requests))
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_client: Optional[SyncLLMClient] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> SyncLLMClient:
+    """Process-wide client configured from BaseConfig (recreated after a fork)."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            from smartscripts.config import BaseConfig
+
+            _client = SyncLLMClient(
+                api_key=os.getenv("OPENAI_API_KEY") or BaseConfig.OPENAI_API_KEY,
+                base_url=BaseConfig.OPENAI_API_BASE,
+                max_concurrency=BaseConfig.LLM_MAX_CONCURRENCY,
+                rate_per_second=BaseConfig.LLM_RATE_PER_SECOND,
+                burst=BaseConfig.LLM_BURST,
+                timeout=BaseConfig.LLM_TIMEOUT,
+                max_retries=BaseConfig.LLM_MAX_RETRIES,
+                breaker=CircuitBreaker(BaseConfig.LLM_BREAKER_THRESHOLD,
+                                       BaseConfig.LLM_BREAKER_RESET),
+            )
+            _client_pid = os.getpid()
+        return _client
+
+
+def llm_chat(messages: List[Dict], cache: Optional[bool] = None, **kwargs) -> str:
+    """
+    Blocking chat completion through the shared client and the response cache
+    (see llm_cache; pass cache=False to bypass it). Raises LLMError on failure.
+    """
+    result = llm_chat_many([dict(kwargs, messages=messages, cache=cache)])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def llm_chat_many(requests: List[Dict]) -> List[Union[str, Exception]]:
+    """
+    Concurrent chat completions; each request is a dict of `chat()` kwargs
+    incl. "messages" and optionally "cache". Cached responses are returned
+    without an API call and failures are returned, not raised.
+    """
+    if not requests:
+        return []
+    from smartscripts.ai import llm_cache
+
+    results: List[Union[str, Exception, None]] = llm_cache.lookup(requests)
+    misses = [index for index, result in enumerate(results) if result is None]
+    if misses:
+        calls = [
+            {key: value for key, value in requests[index].items() if key != "cache"}
+            for index in misses
+        ]
+        for index, result in zip(misses, get_llm_client().chat_many(calls)):
+            results[index] = result
+            if not isinstance(result, Exception):
+                llm_cache.store(requests[index], result)
+    return results
@@ -1,33 +1,73 @@
 import os
 import json
 import cv2
+import numpy as np
 from celery import shared_task
 from flask import current_app, flash
 from sqlalchemy.exc import SQLAlchemyError
-from sentence_transformers import SentenceTransformer, util
 
-from smartscripts.ai.ocr_engine import extract_text_from_image
+from smartscripts.ai.compiled_guide import get_compiled_guide, guide_source_dir
+from smartscripts.ai.embedding_cache import (
+    cosine_matrix, embed_texts, stored_embeddings, submission_store_name
+)
+from smartscripts.ai.ocr_engine import extract_pdf_pages, extract_text_from_image
+from smartscripts.ai.ocr_pool import get_ocr_pool
+from smartscripts.config import BaseConfig
 from smartscripts.services.overlay_service import add_overlay
+from smartscripts.utils.staged_pipeline import Stage, StagedPipeline
 from smartscripts.utils.text_cleaner import clean_text
 from smartscripts.models import StudentSubmission
 from smartscripts.extensions import db
 
-# Load embedding model once globally
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
-
 def fetch_expected_text_from_guide(test_id: int) -> str:
-    guide_path = os.path.join("uploads", "guides", str(test_id), "guide.txt")
-    if os.path.isfile(guide_path):
-        with open(guide_path, "r", encoding="utf-8") as f:
-            return f.read()
-    raise FileNotFoundError(f"Guide file not found for test_id={test_id} at {guide_path}")
-
-
-def compute_similarity(text1: str, text2: str) -> float:
-    embedding1 = model.encode(text1, convert_to_tensor=True)
-    embedding2 = model.encode(text2, convert_to_tensor=True)
-    return util.pytorch_cos_sim(embedding1, embedding2).item()
+    guide = get_compiled_guide(test_id)
+    if guide.expected_text is None:
+        raise FileNotFoundError(
+            f"Guide text not found for test_id={test_id} in {guide_source_dir(test_id)}"
+        )
+    return guide.expected_text
+
+
+def extract_submission_text(file_path: str):
+    """
+    OCR text for a submission plus the image to annotate. PDFs go through the
+    per-page strategy selector, so typed or digitally filled pages skip OCR.
+    Returns (text, BGR image, page strategies).
+    """
+    if not file_path.lower().endswith(".pdf"):
+        return extract_text_from_image(file_path), cv2.imread(file_path), ["ocr"]
+
+    from smartscripts.utils.pdf_helpers import iter_pdf_pages
+
+    pages = extract_pdf_pages(file_path)
+    text = "\n\n".join(page["text"] for page in pages)
+    first_page = next(iter_pdf_pages(file_path, last_page=1), None)
+    image = None
+    if first_page is not None:
+        image = cv2.cvtColor(np.array(first_page), cv2.COLOR_RGB2BGR)
+    return text, image, [page["strategy"] for page in pages]
+
+
+def compute_similarity(text1: str, text2: str, test_id: int = None,
+                       student_id: int = None) -> float:
+    """
+    Cosine similarity of the two texts' embeddings. With `test_id` the
+    expected text (text2) comes from the test's compiled guide when it is the
+    guide text, and with `student_id` as well the student text is kept in the
+    submission's store for regrades; otherwise both go through the in-process
+    cache only.
+    """
+    if test_id is None:
+        embeddings = embed_texts([text1, text2])
+        return float(cosine_matrix(embeddings[:1], embeddings[1:])[0, 0])
+
+    guide = get_compiled_guide(test_id)
+    expected = guide.expected_vector if guide.expected_text == text2 else embed_texts([text2])
+    if student_id is None:
+        student = embed_texts([text1])
+    else:
+        student = stored_embeddings(submission_store_name(test_id, student_id), [text1])
+    return float(cosine_matrix(student, expected)[0, 0])
 
 
 def update_marked_submission(submission_id: int, score: float, feedback: str, marked_file_path: str):
@@ -64,60 +104,105 @@ def update_marked_submission(submission_id: int, score: float, feedback: str, ma
     print(f"? Submission {submission_id} updated with score={score:.2f} and feedback saved.")
 
 
-def mark_submission(file_path: str, test_id: int, student_id: int, threshold: float = 0.75):
-    try:
-        if not os.path.isfile(file_path):
-            raise FileNotFoundError(f"Input file '{file_path}' does not exist.")
-
-        expected_text = fetch_expected_text_from_guide(test_id)
-        if not expected_text or len(expected_text.strip()) < 10:
-            raise ValueError("Expected text is invalid or too short.")
-
-        raw_text = extract_text_from_image(file_path)
-        if not raw_text or len(raw_text.strip()) < 20:
-            raise ValueError("OCR text too short or failed.")
-
-        student_text = clean_text(raw_text)
-        if not student_text:
-            raise ValueError("Text cleaning produced empty result.")
-
-        similarity_score = compute_similarity(student_text, expected_text)
-        is_correct = similarity_score >= threshold
-        overlay_type = 'tick' if is_correct else 'cross'
-
-        image = cv2.imread(file_path)
-        if image is None:
-            raise ValueError("Failed to load image for annotation.")
-
-        annotated_image = add_overlay(image, overlay_type)
-        if annotated_image is None:
-            raise ValueError("Failed to generate annotated image.")
-
-        marked_dir = os.path.join("uploads", "marked", str(test_id), str(student_id))
-        os.makedirs(marked_dir, exist_ok=True)
-        marked_filename = f"marked_{os.path.basename(file_path)}"
-        marked_path = os.path.join(marked_dir, marked_filename)
-
-        if not cv2.imwrite(marked_path, annotated_image):
-            raise IOError(f"Failed to write annotated image to {marked_path}")
-
-        submission = StudentSubmission.query.filter_by(student_id=student_id, test_id=test_id).first()
-        if not submission:
-            raise ValueError(f"No submission found for student_id={student_id}, test_id={test_id}.")
-
-        update_marked_submission(
-            submission_id=submission.id,
-            score=round(similarity_score * 100, 2),
-            feedback="Auto-marked based on answer similarity.",
-            marked_file_path=marked_path
+# -------------------- Marking steps (mark_submission and the staged pipeline) --------------------
+
+def _new_job(file_path: str, test_id: int, student_id, threshold: float = 0.75) -> dict:
+    return {"file_path": file_path, "test_id": test_id, "student_id": student_id,
+            "threshold": threshold}
+
+
+def _ocr_step(job: dict) -> dict:
+    if not os.path.isfile(job["file_path"]):
+        raise FileNotFoundError(f"Input file '{job['file_path']}' does not exist.")
+
+    expected_text = fetch_expected_text_from_guide(job["test_id"])
+    if not expected_text or len(expected_text.strip()) < 10:
+        raise ValueError("Expected text is invalid or too short.")
+
+    raw_text, image, page_strategies = extract_submission_text(job["file_path"])
+    if not raw_text or len(raw_text.strip()) < 20:
+        raise ValueError("OCR text too short or failed.")
+
+    job.update(expected_text=expected_text, raw_text=raw_text, image=image,
+               page_strategies=page_strategies)
+    return job
+
+
+def _clean_step(job: dict) -> dict:
+    student_text = clean_text(job["raw_text"])
+    if not student_text:
+        raise ValueError("Text cleaning produced empty result.")
+    job["student_text"] = student_text
+    return job
+
+
+def _embed_step(jobs: list) -> list:
+    # One batched encode for every student text; compute_similarity then reads them from the cache
+    embed_texts([job["student_text"] for job in jobs])
+    for job in jobs:
+        job["similarity_score"] = compute_similarity(
+            job["student_text"], job["expected_text"],
+            test_id=job["test_id"], student_id=job["student_id"]
         )
+    return jobs
+
+
+def _overlay_step(job: dict) -> dict:
+    is_correct = job["similarity_score"] >= job["threshold"]
+    overlay_type = 'tick' if is_correct else 'cross'
+
+    if job["image"] is None:
+        raise ValueError("Failed to load image for annotation.")
+
+    annotated_image = add_overlay(job["image"], overlay_type)
+    if annotated_image is None:
+        raise ValueError("Failed to generate annotated image.")
+
+    marked_dir = os.path.join("uploads", "marked", str(job["test_id"]), str(job["student_id"]))
+    os.makedirs(marked_dir, exist_ok=True)
+    marked_filename = f"marked_{os.path.basename(job['file_path'])}"
+    if marked_filename.lower().endswith(".pdf"):
+        marked_filename = f"{marked_filename[:-4]}.png"
+    marked_path = os.path.join(marked_dir, marked_filename)
+
+    if not cv2.imwrite(marked_path, annotated_image):
+        raise IOError(f"Failed to write annotated image to {marked_path}")
+
+    job["marked_path"] = marked_path
+    job["image"] = None  # no need to hold the page until persistence
+    return job
+
+
+def _persist_step(job: dict) -> dict:
+    submission = StudentSubmission.query.filter_by(
+        student_id=job["student_id"], test_id=job["test_id"]
+    ).first()
+    if not submission:
+        raise ValueError(
+            f"No submission found for student_id={job['student_id']}, test_id={job['test_id']}."
+        )
+
+    update_marked_submission(
+        submission_id=submission.id,
+        score=round(job["similarity_score"] * 100, 2),
+        feedback="Auto-marked based on answer similarity.",
+        marked_file_path=job["marked_path"]
+    )
+
+    return {
+        "student_id": job["student_id"],
+        "similarity_score": job["similarity_score"],
+        "student_text": job["student_text"],
+        "marked_path": job["marked_path"],
+        "page_strategies": job["page_strategies"]
+    }
+
 
-        return {
-            "student_id": student_id,
-            "similarity_score": similarity_score,
-            "student_text": student_text,
-            "marked_path": marked_path
-        }
+def mark_submission(file_path: str, test_id: int, student_id: int, threshold: float = 0.75):
+    try:
+        job = _clean_step(_ocr_step(_new_job(file_path, test_id, student_id, threshold)))
+        job = _overlay_step(_embed_step([job])[0])
+        return _persist_step(job)
 
     except Exception as e:
         error_message = f"? mark_submission failed for student_id={student_id}, test_id={test_id}: {str(e)}"
@@ -149,34 +234,107 @@ def mark_submission_async(submission_id):
             current_app.logger.error(f"Async marking error: {e}")
 
 
-def mark_batch_submissions(submissions: list):
-    results = []
-    for submission in submissions:
+# -------------------- Staged batch marking --------------------
+
+def new_marking_pipeline() -> StagedPipeline:
+    """
+    OCR -> cleaning -> batched embedding -> overlay rendering run on worker
+    threads joined by bounded queues; persistence runs in the calling thread,
+    which holds the app context and the database session.
+
+    TrOCR runs on the shared OCR process pool when this process can own one
+    (web process, threads/solo Celery worker); one OCR thread per pool worker
+    keeps it busy. In a prefork Celery child there is no pool and TrOCR runs
+    in-process on one shared model, so a single OCR thread is used: more
+    threads would only contend for it. MARKING_OCR_WORKERS overrides both.
+    """
+    pool = get_ocr_pool()
+    ocr_workers = BaseConfig.MARKING_OCR_WORKERS or (pool.max_workers if pool is not None else 1)
+    return StagedPipeline(
+        [
+            Stage("ocr", _ocr_step, workers=ocr_workers),
+            Stage("clean", _clean_step, workers=BaseConfig.MARKING_CLEAN_WORKERS),
+            Stage("embed", _embed_step, batch_size=BaseConfig.MARKING_EMBED_BATCH_SIZE),
+            Stage("overlay", _overlay_step, workers=BaseConfig.MARKING_OVERLAY_WORKERS),
+        ],
+        sink=_persist_step,
+        queue_size=BaseConfig.MARKING_QUEUE_SIZE,
+    )
+
+
+def _warm_guides(jobs: list):
+    """
+    Compile each test's guide once, before the OCR threads start: on a cold
+    guide they would otherwise all compile and embed it at the same time.
+    A guide that fails here fails again, per submission, in the OCR stage.
+    """
+    for test_id in dict.fromkeys(job["test_id"] for job in jobs):
         try:
-            result = mark_submission(
-                file_path=submission.file_path,
-                test_id=submission.test_id,
-                student_id=submission.student_id
-            )
-            results.append(result)
+            get_compiled_guide(test_id)
         except Exception as e:
-            error_msg = f"Batch marking error for submission {submission.id}: {e}"
-            print(error_msg)
-            if current_app:
-                current_app.logger.error(error_msg)
+            print(f"[pipeline] Could not compile guide for test_id={test_id}: {e}")
+
+
+def _run_marking_jobs(jobs: list, label: str) -> list:
+    """Run jobs through the staged pipeline; returns (result, error) per job, in order."""
+    _warm_guides(jobs)
+    pipeline = new_marking_pipeline()
+    outcomes = pipeline.run(jobs)
+    marked = sum(1 for _, error in outcomes if error is None)
+    print(f"[pipeline] Marked {marked}/{len(jobs)} submission(s) for {label}\n{pipeline.report()}")
+    return outcomes
+
+
+def mark_batch_submissions(submissions: list, test_id: int = None, threshold: float = 0.75):
+    """
+    Mark submissions through the staged pipeline. Returns the results of the
+    submissions that were marked, in input order; failures are logged.
+    """
+    jobs = [_new_job(s.file_path, s.test_id, s.student_id, threshold) for s in submissions]
+    label = f"test_id={test_id}" if test_id is not None else "batch"
+
+    results = []
+    for submission, (result, error) in zip(submissions, _run_marking_jobs(jobs, label)):
+        if error is None:
+            results.append(result)
+            continue
+        error_msg = f"Batch marking error for submission {submission.id}: {error}"
+        print(error_msg)
+        if current_app:
+            current_app.logger.error(error_msg)
     return results
 
 
+@shared_task
+def mark_submissions_async(submission_ids: list):
+    submissions = StudentSubmission.query.filter(StudentSubmission.id.in_(submission_ids)).all()
+    if not submissions:
+        print(f"Submissions {submission_ids} not found.")
+        return
+
+    print(f"Marking {len(submissions)} submission(s) through the staged pipeline...")
+    try:
+        results = mark_batch_submissions(submissions)
+        print(f"? Finished marking {len(results)}/{len(submissions)} submission(s)")
+    except Exception as e:
+        print(f"? Error marking submissions {submission_ids}: {e}")
+        if current_app:
+            current_app.logger.error(f"Async marking error: {e}")
+
+
 def mark_all_for_test(test_id):
     submissions = StudentSubmission.query.filter_by(test_id=test_id, marked=False).all()
     if not submissions:
         print(f"?? No unmarked submissions found for test_id={test_id}")
         return
 
+    # One task per chunk: Celery spreads chunks over workers, each worker pipelines its chunk
+    chunk_size = max(1, BaseConfig.MARKING_TASK_CHUNK_SIZE)
     print(f"?? Queuing {len(submissions)} submissions for batch marking (test_id={test_id})...")
-    for submission in submissions:
-        print(f"?? Queuing submission ID {submission.id} for student {submission.student_id}")
-        mark_submission_async.delay(submission.id)
+    for start in range(0, len(submissions), chunk_size):
+        submission_ids = [submission.id for submission in submissions[start:start + chunk_size]]
+        print(f"?? Queuing submission IDs {submission_ids}")
+        mark_submissions_async.delay(submission_ids)
 
 
 def mark_single_submission(submission):
@@ -193,15 +351,17 @@ def mark_all_submissions_in_folder(test_id: int):
         print(f"No submissions found for test {test_id}")
         return []
 
-    results = []
+    jobs = []
     for student_id in os.listdir(base_dir):
         student_dir = os.path.join(base_dir, student_id)
         if os.path.isdir(student_dir):
             for filename in os.listdir(student_dir):
-                file_path = os.path.join(student_dir, filename)
-                try:
-                    result = mark_submission(file_path, test_id, student_id)
-                    results.append(result)
-                except Exception as e:
-                    print(f"Failed to mark submission {file_path}: {e}")
+                jobs.append(_new_job(os.path.join(student_dir, filename), test_id, student_id))
+
+    results = []
+    for job, (result, error) in zip(jobs, _run_marking_jobs(jobs, f"test_id={test_id}")):
+        if error is None:
+            results.append(result)
+        else:
+            print(f"Failed to mark submission {job['file_path']}: {error}")
     return results
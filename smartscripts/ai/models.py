@@ -0,0 +1,155 @@
+"""
+smartscripts.ai.models
+----------------------
+Lazy, per-process registry for the heavy models used across the AI package
+(TrOCR, the SentenceTransformer embedder and the GPT-2 feedback generator).
+
+Nothing is imported or loaded until a getter is first called, and each model
+is loaded at most once per process no matter how many modules ask for it.
+Model names come from `BaseConfig`; when `MODEL_DIR` contains a copy of a
+model (e.g. `MODEL_DIR/microsoft/trocr-base-handwritten`) it is loaded from
+there, and `MODELS_OFFLINE` stops any download attempts.
+
+TrOCR inference backends (`TROCR_BACKEND`):
+    torch       - PyTorch fp32 (default)
+    torch-int8  - PyTorch with dynamic int8 quantization of the Linear layers
+    onnx        - ONNX Runtime export of the encoder/decoder (needs `optimum[onnxruntime]`)
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from smartscripts.config import BaseConfig
+
+TROCR_BACKENDS = ("torch", "torch-int8", "onnx")
+
+_registry: Dict[str, Any] = {}
+_lock = threading.RLock()
+
+
+def _load_once(key: str, loader: Callable[[], Any]) -> Any:
+    """Return the cached object for `key`, calling `loader` on first use only."""
+    if key in _registry:
+        return _registry[key]
+    with _lock:
+        if key not in _registry:
+            print(f"[models] Loading {key}...")
+            _registry[key] = loader()
+        return _registry[key]
+
+
+def resolve_model_path(name: str) -> str:
+    """Prefer a local copy under MODEL_DIR; otherwise return the hub name unchanged."""
+    model_dir = BaseConfig.MODEL_DIR
+    if model_dir:
+        local_path = os.path.join(model_dir, name)
+        if os.path.isdir(local_path):
+            return local_path
+    return name
+
+
+def _pretrained_kwargs() -> dict:
+    if BaseConfig.MODELS_OFFLINE:
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+        return {"local_files_only": True}
+    return {}
+
+
+def get_device():
+    def _load():
+        import torch
+        return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    return _load_once("device", _load)
+
+
+def get_trocr(backend: Optional[str] = None) -> Tuple[Any, Any]:
+    """
+    Return the shared `(processor, model)` pair for BaseConfig.TROCR_MODEL on
+    the given backend (BaseConfig.TROCR_BACKEND by default). Every backend's
+    model exposes the same `generate()` API.
+    """
+    name = BaseConfig.TROCR_MODEL
+    backend = backend or BaseConfig.TROCR_BACKEND
+    if backend not in TROCR_BACKENDS:
+        raise ValueError(f"Unknown TROCR_BACKEND '{backend}'. Expected one of {TROCR_BACKENDS}.")
+
+    def _load():
+        from transformers import TrOCRProcessor
+
+        path = resolve_model_path(name)
+        processor = TrOCRProcessor.from_pretrained(path, **_pretrained_kwargs())
+        if backend == "onnx":
+            return processor, _load_trocr_onnx(name, path)
+
+        import torch
+        from transformers import VisionEncoderDecoderModel
+
+        model = VisionEncoderDecoderModel.from_pretrained(path, **_pretrained_kwargs())
+        model.eval()
+        if backend == "torch-int8":
+            # Dynamic quantization is CPU-only; weights are int8, activations stay fp32
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            return processor, model
+        model.to(get_device())
+        return processor, model
+
+    return _load_once(f"trocr:{name}:{backend}", _load)
+
+
+def _load_trocr_onnx(name: str, path: str):
+    """Load (exporting on first use) the ONNX Runtime encoder/decoder for TrOCR."""
+    try:
+        from optimum.onnxruntime import ORTModelForVision2Seq
+    except ImportError as e:
+        raise ImportError(
+            "TROCR_BACKEND='onnx' requires optimum with onnxruntime: "
+            "pip install optimum[onnxruntime]"
+        ) from e
+
+    export_dir = os.path.join(BaseConfig.ONNX_EXPORT_DIR, name)
+    if os.path.isfile(os.path.join(export_dir, "encoder_model.onnx")):
+        return ORTModelForVision2Seq.from_pretrained(export_dir)
+
+    model = ORTModelForVision2Seq.from_pretrained(path, export=True, **_pretrained_kwargs())
+    model.save_pretrained(export_dir)
+    print(f"[models] Exported ONNX TrOCR to {export_dir}")
+    return model
+
+
+def get_embedding_model():
+    """Return the shared SentenceTransformer for BaseConfig.EMBEDDING_MODEL."""
+    name = BaseConfig.EMBEDDING_MODEL
+
+    def _load():
+        from sentence_transformers import SentenceTransformer
+
+        _pretrained_kwargs()
+        return SentenceTransformer(resolve_model_path(name), device=str(get_device()))
+
+    return _load_once(f"embedding:{name}", _load)
+
+
+def get_text_generator():
+    """Return the shared text-generation pipeline for BaseConfig.FEEDBACK_MODEL."""
+    name = BaseConfig.FEEDBACK_MODEL
+
+    def _load():
+        from transformers import pipeline
+
+        _pretrained_kwargs()
+        return pipeline("text-generation", model=resolve_model_path(name))
+
+    return _load_once(f"text-generation:{name}", _load)
+
+
+def loaded_models() -> List[str]:
+    """Keys of the models already loaded in this process."""
+    return [key for key in _registry if key != "device"]
+
+
+def clear_models():
+    """Drop every cached model (mainly for tests and worker recycling)."""
+    with _lock:
+        _registry.clear()
@@ -0,0 +1,88 @@
+"""
+Content-addressed cache for OCR results.
+
+Keys combine a hash of the page pixels with the OCR model name and the
+parameters that change the output (`confidence_threshold`, `do_fallback`,
+`do_refine`), so re-running OCR on an unchanged page is a single SQLite lookup
+instead of a TrOCR pass plus GPT calls. ocr_engine does not store a result
+whose requested GPT steps were skipped for lack of an API key, so a later run
+with a key is not served the TrOCR-only text.
+"""
+
+import json
+import hashlib
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from smartscripts.config import BaseConfig
+from smartscripts.utils.disk_cache import DiskCache
+
+# Bump when the OCR pipeline changes in a way that should invalidate old results
+OCR_CACHE_VERSION = 2
+
+_cache: Optional[DiskCache] = None
+
+
+def get_ocr_cache() -> Optional[DiskCache]:
+    """Process-wide OCR cache, or None when OCR_CACHE_ENABLED is off."""
+    global _cache
+    if not BaseConfig.OCR_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = DiskCache(
+            BaseConfig.OCR_CACHE_PATH,
+            max_entries=BaseConfig.OCR_CACHE_MAX_ENTRIES,
+            max_bytes=BaseConfig.OCR_CACHE_MAX_BYTES,
+        )
+    return _cache
+
+
+def image_content_hash(image: Image.Image) -> str:
+    """SHA-256 over the decoded pixels, so the same page hashes equally from PNG, JPEG or memory."""
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def ocr_cache_key(image: Image.Image, confidence_threshold: float, do_fallback: bool,
+                  do_refine: bool) -> str:
+    payload = {
+        "v": OCR_CACHE_VERSION,
+        "image": image_content_hash(image),
+        "model": f"{BaseConfig.TROCR_MODEL}:{BaseConfig.TROCR_BACKEND}",
+        "confidence_threshold": round(float(confidence_threshold), 4),
+        "do_fallback": bool(do_fallback),
+        "do_refine": bool(do_refine),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_cached_result(key: str) -> Optional[Tuple[str, Optional[float]]]:
+    """(text, TrOCR confidence) for a cached page, or None on a miss."""
+    cache = get_ocr_cache()
+    if cache is None:
+        return None
+    value = cache.get_json(key)
+    return (value["text"], value.get("confidence")) if value is not None else None
+
+
+def get_cached_text(key: str) -> Optional[str]:
+    result = get_cached_result(key)
+    return result[0] if result is not None else None
+
+
+def store_result(key: str, text: str, confidence: Optional[float] = None):
+    cache = get_ocr_cache()
+    if cache is not None:
+        cache.set_json(key, {"text": text, "confidence": confidence})
+
+
+def store_text(key: str, text: str):
+    store_result(key, text)
+
+
+def ocr_cache_stats() -> dict:
+    cache = get_ocr_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
@@ -0,0 +1,70 @@
+"""
+Model-derived OCR confidence.
+
+TrOCR's per-token probabilities (from `generate(output_scores=True,
+return_dict_in_generate=True)`) are rolled up into a line confidence:
+
+    line confidence = sigmoid(slope * mean token log-prob + bias)
+
+The logistic calibration (OCR_CONFIDENCE_SLOPE / OCR_CONFIDENCE_BIAS) maps the
+raw log-prob onto "probability the line is read correctly"; refit it from
+labelled lines with `fit_calibration` when the model or the scripts change.
+"""
+
+import math
+from typing import List, Optional, Sequence, Tuple
+
+from smartscripts.config import BaseConfig
+
+MIN_PROBABILITY = 1e-12
+
+
+def mean_token_logprob(token_probs: Sequence[float]) -> Optional[float]:
+    """Average log-probability of the generated tokens (None when nothing was generated)."""
+    if not token_probs:
+        return None
+    return sum(math.log(max(p, MIN_PROBABILITY)) for p in token_probs) / len(token_probs)
+
+
+def _sigmoid(x: float) -> float:
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+
+def calibrate(mean_logprob: Optional[float], slope: Optional[float] = None,
+              bias: Optional[float] = None) -> float:
+    if mean_logprob is None:
+        return 0.0
+    slope = BaseConfig.OCR_CONFIDENCE_SLOPE if slope is None else slope
+    bias = BaseConfig.OCR_CONFIDENCE_BIAS if bias is None else bias
+    return _sigmoid(slope * mean_logprob + bias)
+
+
+def line_confidence(token_probs: Sequence[float], slope: Optional[float] = None,
+                    bias: Optional[float] = None) -> float:
+    """Calibrated confidence for one decoded line."""
+    return round(calibrate(mean_token_logprob(token_probs), slope, bias), 4)
+
+
+def fit_calibration(samples: List[Tuple[float, bool]], epochs: int = 2000,
+                    learning_rate: float = 0.5) -> Tuple[float, float]:
+    """
+    Fit (slope, bias) by logistic regression on (mean token log-prob, line
+    was read correctly) pairs, e.g. lines whose CER against a reference is
+    below a tolerance (see ocr_parity.character_error_rate).
+    """
+    if not samples:
+        raise ValueError("fit_calibration needs at least one sample")
+    slope, bias = BaseConfig.OCR_CONFIDENCE_SLOPE, BaseConfig.OCR_CONFIDENCE_BIAS
+    n = len(samples)
+    for _ in range(epochs):
+        grad_slope = grad_bias = 0.0
+        for logprob, correct in samples:
+            error = _sigmoid(slope * logprob + bias) - (1.0 if correct else 0.0)
+            grad_slope += error * logprob
+            grad_bias += error
+        slope -= learning_rate * grad_slope / n
+        bias -= learning_rate * grad_bias / n
+    return round(slope, 4), round(bias, 4)
@@ -1,74 +1,88 @@
 import os
 import re
+import math
 import base64
-import multiprocessing
+from io import BytesIO
 from pathlib import Path
-from typing import List, Tuple, Optional
-
-import torch
-from PIL import Image, ImageOps, ImageChops
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
-from pdf2image import convert_from_path
-
-# === OpenAI (Optional) ===
-try:
-    import openai
-except ImportError:
-    openai = None
-    print("⚠️ OpenAI not installed. GPT-based features will be disabled.")
-
-# === Device & Model Setup ===
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
-model = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-handwritten")
-model.to(device)
-model.eval()
+from typing import Any, Iterable, Iterator, List, Tuple, Optional, Union
+
+from PIL import Image, ImageOps
+
+from smartscripts.ai.llm_client import llm_chat_many
+from smartscripts.ai.models import get_device, get_trocr
+from smartscripts.ai.ocr_cache import get_cached_result, ocr_cache_key, store_result
+from smartscripts.ai.ocr_confidence import line_confidence
+from smartscripts.ai.ocr_pool import ocr_page_stream, ocr_pages, trocr_pages
+from smartscripts.ai.preprocessing import preprocess_page, preprocess_pages
+from smartscripts.config import BaseConfig
+
+# TrOCR (and torch) are loaded lazily through smartscripts.ai.models on first OCR call.
 
 # === Constants ===
+OCR_BATCH_SIZE = BaseConfig.OCR_BATCH_SIZE
+
+# Anything the OCR entry points accept: a file path, a PIL image or an RGB/grayscale numpy array
+ImageSource = Union[str, Path, Image.Image, Any]
+
 KEYWORDS = [
     "name", "student name", "full name",
     "id", "student id", "reg no", "registration number"
 ]
 
-def run_ocr_on_test(pdf_path: str) -> dict:
-    images = convert_from_path(pdf_path, dpi=300)
-    if not images:
-        return {"name": "", "id": "", "confidence": 0.0}
-
-    first_page_path = Path("temp_first_page.png")
-    images[0].save(first_page_path)
-
-    text = extract_text_from_image(str(first_page_path))
-    first_page_path.unlink()
+def run_ocr_on_test(pdf_path: str, template=None) -> dict:
+    from smartscripts.utils.pdf_helpers import iter_pdf_pages
 
-    lines = [line.strip() for line in text.split("\n") if line.strip()]
-
-    name = ""
-    student_id = ""
-    for line in lines:
-        if not student_id and re.match(r"^[A-Za-z0-9\-/]{5,12}$", line):
-            student_id = line
-        elif not name and re.match(r"^[A-Z][a-zA-Z]{1,}\s[A-Z]?[a-zA-Z]{1,}$", line):
-            name = line
-        if name and student_id:
-            break
+    # Only the cover page is needed, so only the cover page is rendered
+    cover = next(iter_pdf_pages(pdf_path, last_page=1), None)
+    if cover is None:
+        return {"name": "", "id": "", "confidence": 0.0}
 
-    confidence = estimate_ocr_confidence(text)
+    # ...and only its name/ID regions are OCR'd
+    name, student_id, confidence = header_name_id_pages([cover], template=template)[0]
     return {"name": name, "id": student_id, "confidence": confidence}
 
 # === Helper Functions ===
-def preprocess_image(image_path: str) -> Image.Image:
-    image = Image.open(image_path)
-    image = ImageOps.exif_transpose(image).convert("RGB")
-    bg = Image.new(image.mode, image.size, image.getpixel((0, 0)))
-    diff = ImageChops.difference(image, bg)
-    bbox = diff.getbbox()
-    return image.crop(bbox) if bbox else image
+def load_image(source: ImageSource) -> Image.Image:
+    """Return a PIL image for a path, PIL image or numpy array; only a path touches disk."""
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (str, Path)):
+        return Image.open(source)
+    if hasattr(source, "__array_interface__"):
+        return Image.fromarray(source)
+    raise TypeError(f"Unsupported image source: {type(source).__name__}")
+
+def describe_source(source: ImageSource) -> str:
+    if isinstance(source, (str, Path)):
+        return str(source)
+    if isinstance(source, Image.Image):
+        size = source.size
+    else:
+        size = getattr(source, "shape", None)
+    return f"<in-memory image {size}>"
+
+def preprocess_image(image_path: ImageSource) -> Image.Image:
+    """Deskewed, border-trimmed, downscaled and binarized page (see ai/preprocessing), as RGB."""
+    return Image.fromarray(preprocess_page(_page_array(image_path))).convert("RGB")
+
+def preprocess_images(images: List[ImageSource]) -> List[Image.Image]:
+    """Batch form of preprocess_image; pages are cleaned in parallel."""
+    cleaned = preprocess_pages([_page_array(image) for image in images])
+    return [Image.fromarray(page).convert("RGB") for page in cleaned]
+
+def _page_array(source: ImageSource):
+    import numpy as np
+
+    image = ImageOps.exif_transpose(load_image(source))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    return np.asarray(image)
 
 def crop_region(image: Image.Image, box: Tuple[int, int, int, int]) -> Image.Image:
     return image.crop(box)
 
 def estimate_ocr_confidence(text: str) -> float:
+    """Text-only heuristic for text that did not come from TrOCR (model confidence is preferred)."""
     if not text.strip():
         return 0.0
     confidence = 1.0
@@ -79,99 +93,357 @@ def estimate_ocr_confidence(text: str) -> float:
     return max(confidence, 0.0)
 
 def run_tr_ocr(image: Image.Image) -> str:
-    pixel_values = processor(images=image, return_tensors="pt").pixel_values.to(device)
-    with torch.no_grad():
-        generated_ids = model.generate(pixel_values)
-        predicted_texts = processor.batch_decode(generated_ids, skip_special_tokens=True)
-    return predicted_texts[0].strip() if predicted_texts else ""
-
-def trocr_extract_with_confidence(image_path: str) -> Tuple[str, float]:
-    image = preprocess_image(image_path)
-    text = run_tr_ocr(image)
-    confidence = estimate_ocr_confidence(text)
-    return text, confidence
-
-def gpt4_vision_extract(image_path: str) -> str:
-    if not openai or not os.getenv("OPENAI_API_KEY"):
-        print("⚠️ GPT-4 Vision skipped: OpenAI not available or API key not set.")
-        return ""
+    texts = run_tr_ocr_batch([image], batch_size=1)
+    return texts[0] if texts else ""
+
+def run_tr_ocr_scored(image: Image.Image) -> dict:
+    """{"text", "token_probs", "confidence"} for one image; see run_tr_ocr_batch_scored."""
+    return run_tr_ocr_batch_scored([image], batch_size=1)[0]
+
+def _stack_pixel_values(tensors: List[Any]) -> Any:
+    """Pad (C, H, W) pixel tensors to a common size and stack them into one batch."""
+    import torch
+
+    max_h = max(t.shape[-2] for t in tensors)
+    max_w = max(t.shape[-1] for t in tensors)
+    padded = [
+        torch.nn.functional.pad(t, (0, max_w - t.shape[-1], 0, max_h - t.shape[-2]))
+        for t in tensors
+    ]
+    return torch.stack(padded)
+
+def _token_probabilities(model, outputs, pad_token_id: Optional[int]) -> List[List[float]]:
+    """Probability of each generated token (padding dropped) from a scored generate() output."""
+    import torch
+
+    beam_indices = getattr(outputs, "beam_indices", None)
+    if hasattr(model, "compute_transition_scores"):
+        # Beam scores are already log-softmaxed; greedy/sampling logits are not
+        logprobs = model.compute_transition_scores(
+            outputs.sequences, outputs.scores, beam_indices, normalize_logits=beam_indices is None
+        )
+    else:
+        steps = [torch.log_softmax(step.float(), dim=-1) for step in outputs.scores]
+        tokens = outputs.sequences[:, 1:len(steps) + 1]
+        logprobs = torch.stack(
+            [step.gather(1, tokens[:, i:i + 1]).squeeze(1) for i, step in enumerate(steps)], dim=1
+        )
 
-    try:
-        openai.api_key = os.getenv("OPENAI_API_KEY")
+    tokens = outputs.sequences[:, -logprobs.shape[1]:]
+    results = []
+    for row_tokens, row_logprobs in zip(tokens.tolist(), logprobs.float().cpu().tolist()):
+        results.append([
+            math.exp(logprob) for token, logprob in zip(row_tokens, row_logprobs)
+            if token != pad_token_id and math.isfinite(logprob)
+        ])
+    return results
+
+def _generate_batch(images: List[Image.Image], batch_size: int, backend: Optional[str],
+                    with_scores: bool) -> List[dict]:
+    import torch
+
+    processor, model = get_trocr(backend)
+    device = model.device if hasattr(model, "device") else get_device()
+    pad_token_id = getattr(processor.tokenizer, "pad_token_id", None)
+    results: List[dict] = []
+    batch_size = max(1, batch_size)
+    for start in range(0, len(images), batch_size):
+        chunk = [img.convert("RGB") for img in images[start:start + batch_size]]
+        pixel_values = processor(images=chunk, return_tensors="pt").pixel_values
+        pixel_values = _stack_pixel_values(list(pixel_values)).to(device)
+        with torch.no_grad():
+            if with_scores:
+                outputs = model.generate(pixel_values, output_scores=True,
+                                         return_dict_in_generate=True)
+                generated_ids = outputs.sequences
+                token_probs = _token_probabilities(model, outputs, pad_token_id)
+            else:
+                generated_ids = model.generate(pixel_values)
+                token_probs = [None] * len(chunk)
+        predicted_texts = processor.batch_decode(generated_ids, skip_special_tokens=True)
+        for text, probs in zip(predicted_texts, token_probs):
+            text = text.strip()
+            confidence = (line_confidence(probs) if text else 0.0) if probs is not None else None
+            results.append({"text": text, "token_probs": probs, "confidence": confidence})
+    return results
+
+def run_tr_ocr_batch(images: List[Image.Image], batch_size: int = OCR_BATCH_SIZE,
+                     backend: Optional[str] = None) -> List[str]:
+    """
+    Run TrOCR over many images, decoding each chunk of `batch_size` images with a
+    single `generate` call. Returns one string per input image, in input order.
+    `backend` overrides BaseConfig.TROCR_BACKEND (torch, torch-int8 or onnx).
+    """
+    results = _generate_batch(images, batch_size, backend, with_scores=False)
+    return [result["text"] for result in results]
+
+def run_tr_ocr_batch_scored(images: List[Image.Image], batch_size: int = OCR_BATCH_SIZE,
+                            backend: Optional[str] = None) -> List[dict]:
+    """
+    Like run_tr_ocr_batch, but also returns the probability of every generated
+    token and the calibrated line confidence (see ocr_confidence):
+    one {"text", "token_probs", "confidence"} dict per image.
+    """
+    return _generate_batch(images, batch_size, backend, with_scores=True)
+
+def trocr_extract_with_confidence(image_path: ImageSource) -> Tuple[str, float]:
+    result = run_tr_ocr_scored(preprocess_image(image_path))
+    return result["text"], result["confidence"]
+
+def _encode_image_base64(image_path: ImageSource) -> str:
+    if isinstance(image_path, (str, Path)):
         with open(image_path, "rb") as img_file:
-            encoded_image = base64.b64encode(img_file.read()).decode("utf-8")
-        response = openai.ChatCompletion.create(
-            model="gpt-4-vision-preview",
-            messages=[{
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Extract all readable handwritten text from this exam page:"},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{encoded_image}"}}
-                ]
-            }],
-            max_tokens=1024
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"[GPT-4 Vision Error] {e}")
-        return ""
+            return base64.b64encode(img_file.read()).decode("utf-8")
+    buffer = BytesIO()
+    load_image(image_path).convert("RGB").save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+def _vision_request(image_path: ImageSource) -> dict:
+    encoded_image = _encode_image_base64(image_path)
+    return {
+        "model": "gpt-4-vision-preview",
+        "messages": [{
+            "role": "user",
+            "content": [
+                {"type": "text",
+                 "text": "Extract all readable handwritten text from this exam page:"},
+                {"type": "image_url",
+                 "image_url": {"url": f"data:image/png;base64,{encoded_image}"}}
+            ]
+        }],
+        "max_tokens": 1024,
+    }
+
+def _refine_request(text: str) -> dict:
+    prompt = (
+        "The following text was extracted from a handwritten exam paper. "
+        "Please correct any OCR or formatting errors:\n\n"
+        f"{text}\n\nCleaned text:"
+    )
+    return {
+        "model": "gpt-4",
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.3,
+        "max_tokens": 1000,
+    }
+
+def gpt_available() -> bool:
+    return bool(os.getenv("OPENAI_API_KEY"))
+
+def _cacheable(do_fallback: bool, do_refine: bool) -> bool:
+    """A result is cached only if every GPT step it asked for could run."""
+    return gpt_available() or not (do_fallback or do_refine)
+
+def gpt4_vision_extract(image_path: ImageSource) -> str:
+    return gpt4_vision_extract_many([image_path])[0]
+
+def gpt4_vision_extract_many(images: List[ImageSource]) -> List[str]:
+    """GPT-4 Vision transcription of several pages, requested concurrently ("" on failure)."""
+    if not gpt_available():
+        print("⚠️ GPT-4 Vision skipped: OpenAI API key not set.")
+        return [""] * len(images)
+
+    results = llm_chat_many([_vision_request(image) for image in images])
+    texts = []
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"[GPT-4 Vision Error] {result}")
+            texts.append("")
+        else:
+            texts.append(result.strip())
+    return texts
 
 def gpt4_chat_refine(text: str) -> str:
-    if not openai or not os.getenv("OPENAI_API_KEY"):
-        print("⚠️ GPT-4 Chat skipped: OpenAI not available or API key not set.")
-        return text
-
-    if not text:
-        return ""
-    try:
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-        prompt = (
-            "The following text was extracted from a handwritten exam paper. "
-            "Please correct any OCR or formatting errors:\n\n"
-            f"{text}\n\nCleaned text:"
-        )
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"[GPT-4 Chat Error] {e}")
-        return text
-
-def extract_text_from_image(image_path: str, confidence_threshold=0.7, do_fallback=True, do_refine=True) -> str:
-    print(f"\n📄 Processing {image_path} with TrOCR...")
-    trocr_text, confidence = trocr_extract_with_confidence(image_path)
-    print(f"🔍 TrOCR text: {trocr_text}\n📈 Confidence: {confidence:.4f}")
-
-    final_text = trocr_text
-    if do_fallback and (not trocr_text or confidence < confidence_threshold):
-        print("⚠️ Low confidence. Falling back to GPT-4 Vision...")
-        vision_text = gpt4_vision_extract(image_path)
-        if vision_text:
-            print(f"🧠 GPT-4 Vision text: {vision_text}")
-            final_text = vision_text
-
-    if do_refine and final_text:
-        print("✨ Refining with GPT-4 Chat...")
-        final_text = gpt4_chat_refine(final_text)
+    return gpt4_chat_refine_many([text])[0]
+
+def gpt4_chat_refine_many(texts: List[str]) -> List[str]:
+    """GPT-4 clean-up of several OCR texts, requested concurrently (input text kept on failure)."""
+    if not gpt_available():
+        print("⚠️ GPT-4 Chat skipped: OpenAI API key not set.")
+        return list(texts)
+
+    pending = [index for index, text in enumerate(texts) if text]
+    refined = list(texts)
+    results = llm_chat_many([_refine_request(texts[index]) for index in pending])
+    for index, result in zip(pending, results):
+        if isinstance(result, Exception):
+            print(f"[GPT-4 Chat Error] {result}")
+        else:
+            refined[index] = result.strip()
+    return refined
+
+def extract_text_from_image(image_path: ImageSource, confidence_threshold=0.7, do_fallback=True,
+                            do_refine=True, use_cache: bool = True) -> str:
+    """
+    OCR one page. `image_path` may be a file path, a PIL image or a numpy
+    array; in-memory images are never written to disk.
+    """
+    print(f"\n📄 Processing {describe_source(image_path)} with TrOCR...")
+    image = preprocess_image(image_path)
 
+    cache_key = None
+    if use_cache:
+        cache_key = ocr_cache_key(image, confidence_threshold, do_fallback, do_refine)
+    cached = get_cached_result(cache_key) if cache_key else None
+    if cached is not None:
+        print("♻️ OCR cache hit.")
+        return cached[0]
+
+    # The GPT fallback routes on TrOCR's own token probabilities
+    result = run_tr_ocr_scored(image)
+    final_text = _fallback_and_refine(
+        image_path, result["text"], result["confidence"], confidence_threshold,
+        do_fallback, do_refine
+    )
+    # Without an API key the GPT steps were skipped: don't cache a TrOCR-only text under this key
+    if cache_key and _cacheable(do_fallback, do_refine):
+        store_result(cache_key, final_text, result["confidence"])
     return final_text
 
-def _ocr_page(index: int, image: Image.Image) -> str:
-    temp_image = Path(f"temp_page_{index + 1}.png")
-    image.save(temp_image)
-    page_text = extract_text_from_image(str(temp_image))
-    temp_image.unlink()
+def _fallback_and_refine(image_path: Optional[ImageSource], trocr_text: str, confidence: float,
+                         confidence_threshold=0.7, do_fallback=True, do_refine=True) -> str:
+    return _fallback_and_refine_many(
+        [image_path], [trocr_text], [confidence], confidence_threshold, do_fallback, do_refine
+    )[0]
+
+def _fallback_and_refine_many(images: List[Optional[ImageSource]], trocr_texts: List[str],
+                              confidences: List[float], confidence_threshold=0.7,
+                              do_fallback=True, do_refine=True) -> List[str]:
+    """GPT fallback/refinement for a batch of pages; the GPT calls of all pages run concurrently."""
+    final_texts = list(trocr_texts)
+    for trocr_text, confidence in zip(trocr_texts, confidences):
+        print(f"🔍 TrOCR text: {trocr_text}\n📈 Confidence: {confidence:.4f}")
+
+    if do_fallback:
+        low = [i for i, (text, confidence) in enumerate(zip(trocr_texts, confidences))
+               if not text or confidence < confidence_threshold]
+        if low:
+            print(f"⚠️ Low confidence on {len(low)} page(s). Falling back to GPT-4 Vision...")
+            for i, vision_text in zip(low, gpt4_vision_extract_many([images[i] for i in low])):
+                if vision_text:
+                    print(f"🧠 GPT-4 Vision text: {vision_text}")
+                    final_texts[i] = vision_text
+
+    if do_refine and any(final_texts):
+        print("✨ Refining with GPT-4 Chat...")
+        final_texts = gpt4_chat_refine_many(final_texts)
+
+    return final_texts
+
+def extract_text_from_images(images: List[ImageSource], confidence_threshold=0.7, do_fallback=True,
+                             do_refine=True, batch_size: int = OCR_BATCH_SIZE,
+                             use_cache: bool = True, return_confidence: bool = False) -> List:
+    """
+    Batched counterpart of `extract_text_from_image` (paths, PIL images or arrays).
+    Pages found in the OCR cache are returned directly; the rest go through
+    TrOCR in batches, then GPT fallback/refinement with the same rules as the
+    single-image path, with the GPT calls of the batch issued concurrently.
+    Results are not cached when a requested GPT step was skipped (no API key).
+    With `return_confidence`, returns (text, TrOCR confidence) per page.
+    """
+    pages = preprocess_images(images)
+    results: List[Optional[Tuple[str, Optional[float]]]] = [None] * len(pages)
+    cache_keys: List[Optional[str]] = [None] * len(pages)
+
+    if use_cache:
+        for index, page in enumerate(pages):
+            cache_keys[index] = ocr_cache_key(page, confidence_threshold, do_fallback, do_refine)
+            results[index] = get_cached_result(cache_keys[index])
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    print(f"\n📄 Processing {len(pending)} of {len(pages)} page(s) with TrOCR "
+          f"(batch size {batch_size})...")
+    scored = run_tr_ocr_batch_scored([pages[index] for index in pending], batch_size=batch_size)
+
+    # The GPT fallback routes on TrOCR's own token probabilities
+    confidences = [result["confidence"] for result in scored]
+    final_texts = _fallback_and_refine_many(
+        [images[index] for index in pending], [result["text"] for result in scored], confidences,
+        confidence_threshold, do_fallback, do_refine
+    )
+
+    cacheable = _cacheable(do_fallback, do_refine)
+    for index, final_text, confidence in zip(pending, final_texts, confidences):
+        results[index] = (final_text, confidence)
+        if cache_keys[index] and cacheable:
+            store_result(cache_keys[index], final_text, confidence)
+
+    if return_confidence:
+        return [(text, confidence if confidence is not None else estimate_ocr_confidence(text))
+                for text, confidence in results]
+    return [text for text, _ in results]
+
+def _ocr_page(index: int, page_text: str) -> str:
     return f"--- Page {index + 1} ---\n{page_text}"
 
-def extract_text_from_pdf(pdf_path: str, output_text_path: Optional[str] = None) -> str:
+def _merge_page_text(plan: dict, ocr_texts: List[str]) -> str:
+    parts = [plan["text_layer"]] if plan["strategy"] != "ocr" and plan["text_layer"] else []
+    parts.extend(text for text in ocr_texts if text)
+    return "\n".join(parts)
+
+def iter_pdf_page_texts(pdf_path: str, batch_size: int = OCR_BATCH_SIZE,
+                        func=None) -> Iterator[dict]:
+    """
+    Per-page text extraction that reads the native text layer first and OCRs
+    only image-only pages or image regions (see pdf_helpers.classify_pdf_page).
+    Image-only pages are triaged first: blank pages get strategy "blank" and
+    no OCR (see page_triage). Pages that only look like a repeat of the
+    previous one are still read; their text is the student's answers, and a
+    near-identical page may differ in a few handwritten words.
+    Yields {"page", "strategy", "text"} in page order; `func` is the batched
+    OCR job run on the worker pool (TrOCR by default).
+    """
+    from collections import deque
+    from smartscripts.ai.page_triage import TRIAGE_BLANK, new_page_triage
+    from smartscripts.utils.pdf_helpers import PAGE_STRATEGY_OCR, iter_pdf_page_plans
+
+    waiting = deque()
+    triage = new_page_triage()
+
+    def ocr_images():
+        for plan in iter_pdf_page_plans(pdf_path):
+            images = plan.pop("images")
+            if triage and plan["strategy"] == PAGE_STRATEGY_OCR and len(images) == 1:
+                decision = triage.overrule(triage.triage(images[0], plan["page"]))
+                if decision["triage"] == TRIAGE_BLANK:
+                    plan["strategy"] = TRIAGE_BLANK
+                    images = []
+            plan["pending"] = len(images)
+            plan["ocr_texts"] = []
+            waiting.append(plan)
+            yield from images
+
+    def finished():
+        while waiting and waiting[0]["pending"] == 0:
+            plan = waiting.popleft()
+            text = _merge_page_text(plan, plan["ocr_texts"])
+            yield {"page": plan["page"], "strategy": plan["strategy"], "text": text}
+
+    # OCR results come back in submission order, so each one belongs to the
+    # oldest page that is still waiting for text
+    for text in ocr_page_stream(ocr_images(), func=func or trocr_pages, chunk_size=batch_size):
+        yield from finished()
+        plan = waiting[0]
+        plan["ocr_texts"].append(text)
+        plan["pending"] -= 1
+    yield from finished()
+
+def extract_pdf_pages(pdf_path: str, batch_size: int = OCR_BATCH_SIZE) -> List[dict]:
+    """List form of iter_pdf_page_texts, with a summary of the strategies used."""
+    pages = list(iter_pdf_page_texts(pdf_path, batch_size=batch_size))
+    counts = {}
+    for page in pages:
+        counts[page["strategy"]] = counts.get(page["strategy"], 0) + 1
+    print(f"🧭 Page strategies for {os.path.basename(pdf_path)}: {counts}")
+    return pages
+
+def extract_text_from_pdf(pdf_path: str, output_text_path: Optional[str] = None,
+                          batch_size: int = OCR_BATCH_SIZE) -> str:
     print(f"\n📄 Extracting from PDF: {pdf_path}")
-    images = convert_from_path(pdf_path, dpi=300)
-    with multiprocessing.Pool() as pool:
-        results = pool.starmap(_ocr_page, [(i, img) for i, img in enumerate(images)])
+    # Text-layer pages skip OCR; the rest are rendered lazily and spread over the
+    # persistent OCR worker pool in batch-sized chunks
+    pages = extract_pdf_pages(pdf_path, batch_size=batch_size)
+    results = [_ocr_page(page["page"] - 1, page["text"]) for page in pages]
 
     joined_text = "\n\n".join(results)
     if output_text_path:
@@ -181,7 +453,7 @@ def extract_text_from_pdf(pdf_path: str, output_text_path: Optional[str] = None)
 
     return joined_text
 
-def extract_text_lines_from_image(image_path: str) -> List[str]:
+def extract_text_lines_from_image(image_path: ImageSource) -> List[str]:
     text = extract_text_from_image(image_path)
     return [line.strip() for line in text.split("\n") if line.strip()]
 
@@ -211,10 +483,19 @@ def detect_keywords_with_positions(lines: List[str]) -> List[dict]:
                 matches.append({'line': i, 'keyword': keyword})
     return matches
 
-def extract_name_id_from_image(image_path: str) -> Tuple[str, str]:
-    full_text = extract_text_from_image(image_path)
-    lines = [line.strip() for line in full_text.split("\n") if line.strip()]
-    
+FIELD_LABEL_PATTERN = re.compile(
+    r"^(student\s+|full\s+|candidate\s+)?"
+    r"(name|id|reg(istration)?\.?\s*(no|number)?|admission\s*(no|number))\b\s*[:\-.]?\s*",
+    re.IGNORECASE,
+)
+
+def strip_field_label(line: str) -> str:
+    """Drop a leading form label such as "Name:" or "Reg No." from an OCR'd line."""
+    return FIELD_LABEL_PATTERN.sub("", line.strip()).strip()
+
+def parse_name_id(text: str) -> Tuple[str, str]:
+    lines = [strip_field_label(line) for line in text.split("\n") if line.strip()]
+
     name = ""
     student_id = ""
     for line in lines:
@@ -224,5 +505,63 @@ def extract_name_id_from_image(image_path: str) -> Tuple[str, str]:
             name = line
         if name and student_id:
             break
-    
+
+    return name, student_id
+
+def _name_id_from_regions(region_texts: List[Tuple[str, str, float]]) -> Tuple[str, str, float]:
+    """Labelled regions fill their field directly; unlabelled text goes through parse_name_id."""
+    fields = {"name": "", "id": ""}
+    for label, text, _ in region_texts:
+        value = strip_field_label(" ".join(text.split()))
+        if label in fields and value and not fields[label]:
+            fields[label] = value if label == "name" else re.sub(r"[^A-Za-z0-9\-/]", "", value)
+
+    parsed_name, parsed_id = parse_name_id("\n".join(text for _, text, _ in region_texts))
+    name = fields["name"] or parsed_name
+    student_id = fields["id"] or parsed_id
+
+    confidences = [confidence for _, text, confidence in region_texts if text.strip()]
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return name, student_id, round(confidence, 4)
+
+def header_name_id_pages(images: List[ImageSource], template=None, batch_size: int = OCR_BATCH_SIZE,
+                         **kwargs) -> List[Tuple[str, str, float]]:
+    """
+    Name/ID extraction from the header regions of cover pages (see header_roi):
+    at most one name and one ID crop per page. All crops of all pages are
+    OCR'd in one batch; GPT refinement is off by default since the crops are
+    single short fields. Also a worker-pool job.
+    """
+    from smartscripts.ai.header_roi import extract_header_regions
+
+    kwargs.setdefault("do_refine", False)
+    page_regions = [
+        extract_header_regions(load_image(image).convert("RGB"), template=template)
+        for image in images
+    ]
+    crops = [crop for regions in page_regions for _, crop in regions]
+    texts = iter(
+        extract_text_from_images(crops, batch_size=batch_size, return_confidence=True, **kwargs)
+        if crops else []
+    )
+
+    results = []
+    for regions in page_regions:
+        region_texts = [(label, *next(texts)) for label, _ in regions]
+        results.append(_name_id_from_regions(region_texts))
+    return results
+
+def extract_name_id_from_image(image_path: ImageSource, template=None) -> Tuple[str, str]:
+    name, student_id, _ = header_name_id_pages([image_path], template=template)[0]
     return name, student_id
+
+def iter_name_id_from_images(images: Iterable[ImageSource], batch_size: int = OCR_BATCH_SIZE,
+                             template=None) -> Iterator[Tuple[str, str, float]]:
+    """Streaming name/ID extraction over a lazy page iterator, e.g. iter_pdf_pages()."""
+    yield from ocr_page_stream(images, func=header_name_id_pages, chunk_size=batch_size,
+                               template=template)
+
+def extract_name_id_from_images(images: List[ImageSource], batch_size: int = OCR_BATCH_SIZE,
+                                template=None) -> List[Tuple[str, str, float]]:
+    """Batched name/ID extraction: returns (name, student_id, confidence) per image."""
+    return ocr_pages(images, func=header_name_id_pages, chunk_size=batch_size, template=template)
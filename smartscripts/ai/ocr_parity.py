@@ -0,0 +1,83 @@
+"""
+Parity check for the TrOCR inference backends.
+
+Runs the same sample pages through the fp32 PyTorch baseline and each
+candidate backend (`torch-int8`, `onnx`), and reports the character error rate
+(CER) of each candidate against the baseline output together with the
+per-page latency and speedup.
+"""
+
+import time
+from typing import Dict, List, Sequence
+
+
+def levenshtein_distance(a: str, b: str) -> int:
+    """Edit distance between two strings (insertions, deletions, substitutions)."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    CER = edit distance / reference length (1.0 when the reference is empty
+    but the hypothesis is not).
+    """
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return levenshtein_distance(reference, hypothesis) / len(reference)
+
+
+def _timed_ocr(images: List, backend: str, batch_size: int):
+    from smartscripts.ai.ocr_engine import preprocess_images, run_tr_ocr_batch
+
+    pages = preprocess_images(images)
+    run_tr_ocr_batch(pages[:1], batch_size=1, backend=backend)  # warm-up / lazy load
+    start = time.perf_counter()
+    texts = run_tr_ocr_batch(pages, batch_size=batch_size, backend=backend)
+    return texts, (time.perf_counter() - start) / max(1, len(pages))
+
+
+def run_backend_parity_check(images: List, backends: Sequence[str] = ("torch-int8", "onnx"),
+                             baseline: str = "torch", batch_size: int = 8) -> Dict[str, dict]:
+    """
+    OCR `images` (paths, PIL images or arrays) on `baseline` and every backend in
+    `backends`. Returns {backend: {"mean_cer", "max_cer", "seconds_per_page",
+    "speedup", "texts"}}. Backends that fail to load are reported with an "error".
+    """
+    reference_texts, baseline_seconds = _timed_ocr(images, baseline, batch_size)
+    report = {
+        baseline: {
+            "mean_cer": 0.0,
+            "max_cer": 0.0,
+            "seconds_per_page": round(baseline_seconds, 4),
+            "speedup": 1.0,
+            "texts": reference_texts,
+        }
+    }
+
+    for backend in backends:
+        try:
+            texts, seconds = _timed_ocr(images, backend, batch_size)
+        except Exception as e:
+            report[backend] = {"error": str(e)}
+            continue
+        cers = [character_error_rate(ref, hyp) for ref, hyp in zip(reference_texts, texts)]
+        report[backend] = {
+            "mean_cer": round(sum(cers) / len(cers), 4) if cers else 0.0,
+            "max_cer": round(max(cers), 4) if cers else 0.0,
+            "seconds_per_page": round(seconds, 4),
+            "speedup": round(baseline_seconds / seconds, 2) if seconds else 0.0,
+            "texts": texts,
+        }
+    return report
@@ -0,0 +1,236 @@
+"""
+Long-lived OCR worker pool.
+
+Each worker process loads TrOCR once (in the pool initializer) and then serves
+batches of pages for the lifetime of the owning process, instead of a fresh
+`multiprocessing.Pool()` per PDF. Page pixels travel through one
+`multiprocessing.shared_memory` block per batch rather than being pickled.
+
+The owning process must not be daemonic. That holds for the web process and
+for Celery workers started with `--pool threads` or `--pool solo`, whose
+tasks run in the worker process itself; start_ocr_pool_for_worker() starts
+the pool there when the worker comes up. Tasks in a prefork worker run in
+daemonic children, which cannot start processes: they OCR in-process with
+one TrOCR model per child, so run OCR-heavy queues on a threads worker.
+
+Usage:
+    pool = get_ocr_pool()
+    future = pool.submit_trocr(images)      # concurrent.futures.Future[List[str]]
+    texts = ocr_pages(images)               # blocking helper, falls back to in-process OCR
+    for text in ocr_page_stream(iter_pdf_pages(pdf_path)): ...   # bounded streaming
+"""
+
+import os
+import atexit
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+from smartscripts.config import BaseConfig
+
+# (offset, length, mode, width, height) for each page packed into a shared-memory block
+PageDescriptor = Tuple[int, int, str, int, int]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# -------------------- Worker side --------------------
+
+def _init_worker(torch_threads: int):
+    """Pool initializer: pin torch threads and load the model once per worker."""
+    import torch
+    from smartscripts.ai.models import get_trocr
+
+    torch.set_num_threads(max(1, torch_threads))
+    get_trocr()
+
+
+def _unpack_images(shm_name: str, descriptors: List[PageDescriptor]) -> List[Image.Image]:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        return [
+            Image.frombytes(mode, (width, height), bytes(shm.buf[offset:offset + length]))
+            for offset, length, mode, width, height in descriptors
+        ]
+    finally:
+        shm.close()
+
+
+def _run_in_worker(func: Callable, shm_name: str, descriptors: List[PageDescriptor], kwargs: dict):
+    return func(_unpack_images(shm_name, descriptors), **kwargs)
+
+
+def trocr_pages(images: List[Image.Image], **kwargs) -> List[str]:
+    """Default worker job: the batched TrOCR + fallback path from ocr_engine."""
+    from smartscripts.ai.ocr_engine import extract_text_from_images
+    return extract_text_from_images(images, **kwargs)
+
+
+# -------------------- Parent side --------------------
+
+def _pack_images(images: List) -> Tuple[shared_memory.SharedMemory, List[PageDescriptor]]:
+    from smartscripts.ai.ocr_engine import load_image
+
+    pages = []
+    for image in images:
+        page = load_image(image)
+        if page.mode not in ("RGB", "L"):
+            page = page.convert("RGB")
+        pages.append(page)
+
+    raw = [page.tobytes() for page in pages]
+    shm = shared_memory.SharedMemory(create=True, size=max(1, sum(len(data) for data in raw)))
+    descriptors = []
+    offset = 0
+    for page, data in zip(pages, raw):
+        shm.buf[offset:offset + len(data)] = data
+        descriptors.append((offset, len(data), page.mode, page.size[0], page.size[1]))
+        offset += len(data)
+    return shm, descriptors
+
+
+def _release(shm: shared_memory.SharedMemory):
+    shm.close()
+    shm.unlink()
+
+
+class OCRWorkerPool:
+    """Futures-style wrapper around a persistent, preloaded ProcessPoolExecutor."""
+
+    def __init__(self, max_workers: Optional[int] = None, start_method: Optional[str] = None):
+        cpu_count = os.cpu_count() or 1
+        self.max_workers = max_workers or BaseConfig.OCR_POOL_WORKERS or max(1, cpu_count // 2)
+        torch_threads = max(1, cpu_count // self.max_workers)
+
+        # Start the tracker before the workers so they share it with us
+        resource_tracker.ensure_running()
+        context = multiprocessing.get_context(start_method or BaseConfig.OCR_POOL_START_METHOD)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(torch_threads,),
+        )
+
+    def submit(self, func: Callable, images: List, **kwargs) -> Future:
+        """Run `func(images, **kwargs)` in a worker; pages are passed via shared memory."""
+        shm, descriptors = _pack_images(images)
+        try:
+            future = self._executor.submit(_run_in_worker, func, shm.name, descriptors, kwargs)
+        except Exception:
+            _release(shm)
+            raise
+        future.add_done_callback(lambda _: _release(shm))
+        return future
+
+    def submit_trocr(self, images: List, **kwargs) -> Future:
+        return self.submit(trocr_pages, images, **kwargs)
+
+    def map(self, func: Callable, images: List, chunk_size: Optional[int] = None, **kwargs) -> List:
+        """Split `images` into chunks across the workers and return results in input order."""
+        chunk_size = max(1, chunk_size or BaseConfig.OCR_BATCH_SIZE)
+        futures = [
+            self.submit(func, images[start:start + chunk_size], **kwargs)
+            for start in range(0, len(images), chunk_size)
+        ]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def get_ocr_pool() -> Optional[OCRWorkerPool]:
+    """
+    Shared pool for this process, created on first use. Returns None when the
+    pool is disabled or when running inside a daemonic process (e.g. a Celery
+    prefork child), which is not allowed to start its own workers.
+    """
+    global _pool
+    if not BaseConfig.OCR_POOL_ENABLED or multiprocessing.current_process().daemon:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = OCRWorkerPool()
+        return _pool
+
+
+def start_ocr_pool_for_worker(sender=None, **kwargs):
+    """
+    Celery `worker_ready` handler: start the pool up front when tasks run in
+    the worker process (threads/solo pool), so the first task does not wait
+    for TrOCR to load. Prefork workers are left alone (see module docstring).
+    """
+    if type(getattr(sender, "pool", None)).__module__.endswith(".prefork"):
+        print("[ocr_pool] Prefork worker: tasks OCR in-process. "
+              "Use --pool threads to share the OCR pool.")
+        return
+    pool = get_ocr_pool()
+    if pool is not None:
+        print(f"[ocr_pool] Started {pool.max_workers} OCR worker process(es) for this worker")
+
+
+def ocr_pages(images: List, func: Callable = trocr_pages, chunk_size: Optional[int] = None,
+              **kwargs) -> List:
+    """OCR pages on the shared pool when available, otherwise in this process."""
+    if not images:
+        return []
+    pool = get_ocr_pool()
+    if pool is None:
+        return func(list(images), **kwargs)
+    return pool.map(func, list(images), chunk_size=chunk_size, **kwargs)
+
+
+def ocr_page_stream(pages: Iterable, func: Callable = trocr_pages, chunk_size: Optional[int] = None,
+                    max_in_flight: Optional[int] = None, **kwargs) -> Iterator:
+    """
+    Streaming counterpart of ocr_pages for lazily produced pages (e.g.
+    iter_pdf_pages). Pages are grouped into chunks; at most `max_in_flight`
+    chunks (default: two per worker) are queued on the pool at once, so
+    rendering is throttled to OCR speed. Yields one result per page, in order.
+    """
+    chunk_size = max(1, chunk_size or BaseConfig.OCR_BATCH_SIZE)
+    pool = get_ocr_pool()
+
+    def chunks():
+        chunk = []
+        for page in pages:
+            chunk.append(page)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    if pool is None:
+        for chunk in chunks():
+            yield from func(chunk, **kwargs)
+        return
+
+    max_in_flight = max(1, max_in_flight or pool.max_workers * 2)
+    in_flight = deque()
+    for chunk in chunks():
+        in_flight.append(pool.submit(func, chunk, **kwargs))
+        if len(in_flight) >= max_in_flight:
+            yield from in_flight.popleft().result()
+    while in_flight:
+        yield from in_flight.popleft().result()
+
+
+def shutdown_ocr_pool(wait: bool = True):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait)
+            _pool = None
+
+
+atexit.register(shutdown_ocr_pool)
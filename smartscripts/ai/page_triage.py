@@ -0,0 +1,141 @@
+"""
+Page triage ahead of OCR: blank pages and double-feeds.
+
+Each page gets an ink-coverage ratio and a 256-bit difference hash (dHash):
+
+    blank      ink ratio below TRIAGE_BLANK_INK_RATIO -> OCR is skipped
+    duplicate  hash within TRIAGE_DUPLICATE_DISTANCE bits of the previous
+               non-blank page and a similar ink ratio -> a double-feed
+    ocr        everything else
+
+Only the previous page is compared: double-feeds are adjacent, while
+different students' cover sheets (the same printed template, differing only
+in handwriting) can hash almost identically anywhere in a batch. Callers
+must still overrule() a duplicate whose original is a front-page candidate,
+since two one-page scripts in a row are adjacent too.
+
+Both measures are computed on small thumbnails, so triage costs a few
+milliseconds per page compared with a TrOCR pass.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from smartscripts.config import BaseConfig
+
+TRIAGE_BLANK = "blank"
+TRIAGE_DUPLICATE = "duplicate"
+TRIAGE_OCR = "ocr"
+
+HASH_SIZE = 16             # dHash grid: 16 x 16 = 256 bits
+INK_THUMB_WIDTH = 400      # ink ratio is measured on a thumbnail this wide
+INK_LEVEL = 160            # gray level below which a thumbnail pixel counts as ink
+EDGE_FRACTION = 0.03       # outer band ignored for the ink ratio (scanner edges, punch holes)
+INK_RATIO_TOLERANCE = 0.1  # duplicates must also agree on ink ratio within 10% (relative)
+
+
+def _gray(image) -> Image.Image:
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(np.asarray(image))
+    return ImageOps.exif_transpose(image).convert("L")
+
+
+def ink_ratio(image) -> float:
+    """Fraction of dark pixels inside the page, ignoring a thin outer band."""
+    gray = _gray(image)
+    width = min(INK_THUMB_WIDTH, gray.width)
+    height = max(1, int(gray.height * width / gray.width))
+    pixels = np.asarray(gray.resize((width, height), Image.BILINEAR))
+    dy, dx = int(height * EDGE_FRACTION), int(width * EDGE_FRACTION)
+    inner = pixels[dy:height - dy or None, dx:width - dx or None]
+    return float((inner < INK_LEVEL).mean()) if inner.size else 0.0
+
+
+def dhash(image, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: one bit per adjacent pixel pair of a (hash_size+1) x hash_size thumbnail."""
+    thumb = _gray(image).resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(thumb, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PageTriage:
+    """
+    Stateful triage over the pages of one document, in order. A page is a
+    duplicate only of the previous non-blank page seen by this instance.
+    """
+
+    def __init__(self, blank_ink_ratio: Optional[float] = None,
+                 duplicate_distance: Optional[int] = None):
+        self.blank_ink_ratio = (
+            BaseConfig.TRIAGE_BLANK_INK_RATIO if blank_ink_ratio is None else blank_ink_ratio
+        )
+        self.duplicate_distance = (
+            BaseConfig.TRIAGE_DUPLICATE_DISTANCE if duplicate_distance is None
+            else duplicate_distance
+        )
+        self._previous: Optional[Dict] = None
+        self.counts = {TRIAGE_BLANK: 0, TRIAGE_DUPLICATE: 0, TRIAGE_OCR: 0}
+
+    def _find_duplicate(self, page_hash: int, ratio: float) -> Optional[int]:
+        previous = self._previous
+        if previous is None:
+            return None
+        if hamming_distance(page_hash, previous["hash"]) > self.duplicate_distance:
+            return None
+        tolerance = INK_RATIO_TOLERANCE * max(ratio, previous["ink_ratio"])
+        if abs(ratio - previous["ink_ratio"]) <= tolerance:
+            return previous["page"]
+        return None
+
+    def triage(self, image, page: int) -> Dict:
+        """
+        Classify one page (1-based `page` number). Returns
+        {"page", "ink_ratio", "phash", "triage", "duplicate_of"}.
+        """
+        ratio = ink_ratio(image)
+        page_hash = dhash(image)
+        result = {
+            "page": page,
+            "ink_ratio": round(ratio, 5),
+            "phash": f"{page_hash:0{HASH_SIZE * HASH_SIZE // 4}x}",
+            "triage": TRIAGE_OCR,
+            "duplicate_of": None,
+        }
+
+        if ratio < self.blank_ink_ratio:
+            result["triage"] = TRIAGE_BLANK
+        else:
+            original = self._find_duplicate(page_hash, ratio)
+            if original is not None:
+                result.update(triage=TRIAGE_DUPLICATE, duplicate_of=original)
+            else:
+                self._previous = {"page": page, "hash": page_hash, "ink_ratio": ratio}
+
+        self.counts[result["triage"]] += 1
+        return result
+
+    def overrule(self, result: Dict) -> Dict:
+        """
+        Turn a duplicate verdict back into "ocr", for a page whose original is
+        a front-page candidate: it may be the next student's cover sheet.
+        """
+        if result["triage"] == TRIAGE_DUPLICATE:
+            self.counts[TRIAGE_DUPLICATE] -= 1
+            self.counts[TRIAGE_OCR] += 1
+            result.update(triage=TRIAGE_OCR, duplicate_of=None)
+            # Later repeats now refer to this page, not to the one it resembled
+            self._previous = {"page": result["page"], "hash": int(result["phash"], 16),
+                              "ink_ratio": result["ink_ratio"]}
+        return result
+
+
+def new_page_triage() -> Optional[PageTriage]:
+    """A fresh PageTriage for one document, or None when TRIAGE_ENABLED is off."""
+    return PageTriage() if BaseConfig.TRIAGE_ENABLED else None
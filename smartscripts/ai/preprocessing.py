@@ -0,0 +1,208 @@
+"""
+OpenCV preprocessing for scanned pages, ahead of OCR and layout detection.
+
+    grayscale -> deskew -> border/margin removal -> downscale -> adaptive binarization
+
+Every step works on whole numpy arrays (no per-pixel Python), pages are
+processed in parallel threads (OpenCV releases the GIL), and results are
+cached on disk by a hash of the input pixels and the settings, so
+re-processing an unchanged page is a lookup.
+"""
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from smartscripts.config import BaseConfig
+from smartscripts.utils.disk_cache import DiskCache
+
+# Bump when the pipeline changes in a way that should invalidate cached pages
+PREPROCESS_VERSION = 1
+
+MAX_SKEW_DEGREES = 10.0   # larger estimates are treated as detection errors
+MIN_SKEW_DEGREES = 0.3    # smaller angles are not worth a resample
+BORDER_INK_FRACTION = 0.5  # edge rows/columns darker than this are scanner borders
+MARGIN_INK_FRACTION = 0.002  # rows/columns with less ink than this are blank margin
+MARGIN_PAD = 8             # pixels of white kept around the content
+DARK_LEVEL = 128           # gray level below which a pixel counts as dark when trimming borders
+
+_cache: Optional[DiskCache] = None
+
+
+def get_preprocess_cache() -> Optional[DiskCache]:
+    global _cache
+    if not BaseConfig.PREPROCESS_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = DiskCache(
+            BaseConfig.PREPROCESS_CACHE_PATH,
+            max_entries=BaseConfig.PREPROCESS_CACHE_MAX_ENTRIES,
+            max_bytes=BaseConfig.PREPROCESS_CACHE_MAX_BYTES,
+        )
+    return _cache
+
+
+# -------------------- Steps --------------------
+
+def to_grayscale(image: np.ndarray) -> np.ndarray:
+    """RGB(A) or grayscale uint8 array -> grayscale uint8 array."""
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_RGBA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    """Adaptive (local Gaussian) threshold: black ink on a white background."""
+    block = max(15, (min(gray.shape[:2]) // 40) | 1)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                 block, 15)
+
+
+def _ink_mask(gray: np.ndarray) -> np.ndarray:
+    """Stroke pixels, from the adaptive threshold (thin strokes, uneven lighting)."""
+    return binarize(gray) == 0
+
+
+def _dark_mask(gray: np.ndarray) -> np.ndarray:
+    """
+    Dark pixels by a global threshold; unlike the adaptive mask it keeps
+    solid regions such as scan borders.
+    """
+    return gray < DARK_LEVEL
+
+
+def estimate_skew(gray: np.ndarray) -> float:
+    """Skew angle in degrees from the minimum-area rectangle around the ink (0 when unsure)."""
+    mask = _ink_mask(gray).astype(np.uint8)
+    # Thicken strokes into text lines so the rectangle follows lines, not noise
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    mask = cv2.dilate(mask, cv2.getStructuringElement(cv2.MORPH_RECT, (25, 1)))
+    coords = cv2.findNonZero(mask)
+    if coords is None or len(coords) < 100:
+        return 0.0
+
+    angle = cv2.minAreaRect(coords)[-1]
+    # minAreaRect reports angles in (0, 90] or [-90, 0) depending on the OpenCV version
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    if abs(angle) > MAX_SKEW_DEGREES or abs(angle) < MIN_SKEW_DEGREES:
+        return 0.0
+    return float(angle)
+
+
+def deskew(gray: np.ndarray, angle: Optional[float] = None) -> np.ndarray:
+    angle = estimate_skew(gray) if angle is None else angle
+    if not angle:
+        return gray
+    h, w = gray.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+
+
+def remove_borders(gray: np.ndarray) -> np.ndarray:
+    """Trim dark scanner borders along the edges, then blank margins around the content."""
+    ink = _dark_mask(gray)
+    row_ink = ink.mean(axis=1)
+    col_ink = ink.mean(axis=0)
+
+    def edge_span(profile: np.ndarray) -> tuple:
+        start, end = 0, len(profile)
+        while start < end and profile[start] > BORDER_INK_FRACTION:
+            start += 1
+        while end > start and profile[end - 1] > BORDER_INK_FRACTION:
+            end -= 1
+        return start, end
+
+    top, bottom = edge_span(row_ink)
+    left, right = edge_span(col_ink)
+    inner = ink[top:bottom, left:right]
+    if inner.size == 0:
+        return gray
+
+    rows = np.flatnonzero(inner.mean(axis=1) > MARGIN_INK_FRACTION)
+    cols = np.flatnonzero(inner.mean(axis=0) > MARGIN_INK_FRACTION)
+    if rows.size == 0 or cols.size == 0:
+        return gray[top:bottom, left:right]
+
+    y0 = max(0, top + rows[0] - MARGIN_PAD)
+    y1 = min(gray.shape[0], top + rows[-1] + 1 + MARGIN_PAD)
+    x0 = max(0, left + cols[0] - MARGIN_PAD)
+    x1 = min(gray.shape[1], left + cols[-1] + 1 + MARGIN_PAD)
+    return gray[y0:y1, x0:x1]
+
+
+def downscale(gray: np.ndarray, max_side: int) -> np.ndarray:
+    """Shrink (never enlarge) so the longest side is at most `max_side`."""
+    h, w = gray.shape[:2]
+    scale = max_side / max(h, w)
+    if not max_side or scale >= 1:
+        return gray
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+# -------------------- Pipeline --------------------
+
+def _settings(max_side: Optional[int], do_binarize: Optional[bool]) -> tuple:
+    max_side = BaseConfig.PREPROCESS_MAX_SIDE if max_side is None else max_side
+    do_binarize = BaseConfig.PREPROCESS_BINARIZE if do_binarize is None else do_binarize
+    return max_side, do_binarize
+
+
+def _cache_key(image: np.ndarray, max_side: int, do_binarize: bool) -> str:
+    digest = hashlib.sha256()
+    header = f"v{PREPROCESS_VERSION}:{image.shape}:{image.dtype}:{max_side}:{do_binarize}:"
+    digest.update(header.encode("utf-8"))
+    digest.update(np.ascontiguousarray(image).tobytes())
+    return digest.hexdigest()
+
+
+def _run_pipeline(image: np.ndarray, max_side: int, do_binarize: bool) -> np.ndarray:
+    gray = to_grayscale(image)
+    gray = deskew(gray)
+    gray = remove_borders(gray)
+    gray = downscale(gray, max_side)
+    return binarize(gray) if do_binarize else gray
+
+
+def preprocess_page(image: np.ndarray, max_side: Optional[int] = None,
+                    do_binarize: Optional[bool] = None, use_cache: bool = True) -> np.ndarray:
+    """
+    Clean one page (RGB/RGBA/grayscale uint8 array) and return a grayscale
+    uint8 array. Settings default to PREPROCESS_MAX_SIDE / PREPROCESS_BINARIZE.
+    """
+    max_side, do_binarize = _settings(max_side, do_binarize)
+    cache = get_preprocess_cache() if use_cache else None
+    key = _cache_key(image, max_side, do_binarize) if cache is not None else None
+    if key:
+        cached = cache.get(key)
+        if cached is not None:
+            return cv2.imdecode(np.frombuffer(cached, np.uint8), cv2.IMREAD_GRAYSCALE)
+
+    result = _run_pipeline(image, max_side, do_binarize)
+    if key:
+        ok, encoded = cv2.imencode(".png", result)
+        if ok:
+            cache.set(key, encoded.tobytes())
+    return result
+
+
+def preprocess_pages(images: List[np.ndarray], max_side: Optional[int] = None,
+                     do_binarize: Optional[bool] = None, use_cache: bool = True,
+                     workers: Optional[int] = None) -> List[np.ndarray]:
+    """Batch form of preprocess_page, on a thread pool; results keep input order."""
+    if len(images) <= 1:
+        return [preprocess_page(image, max_side, do_binarize, use_cache) for image in images]
+    workers = workers or BaseConfig.PREPROCESS_WORKERS or min(len(images), cv2.getNumberOfCPUs())
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preprocess") as executor:
+        return list(executor.map(
+            lambda image: preprocess_page(image, max_side, do_binarize, use_cache), images
+        ))
@@ -1,10 +1,52 @@
-from smartscripts.ai.text_matching import find_best_match
+import numpy as np
+
+from smartscripts.ai.embedding_cache import cosine_matrix, embed_texts
+from smartscripts.ai.roster_assignment import solve_assignment
+from smartscripts.ai.text_matching import gpt_similarity
+
+
+def _similarity_matrix(question_vectors, block_vectors, student_blocks):
+    """Questions x blocks cosine similarity; empty blocks never match."""
+    sims = cosine_matrix(question_vectors, block_vectors)
+    empty = np.array([not (text or "").strip() for text in student_blocks], dtype=bool)
+    if empty.any():
+        sims[:, empty] = 0.0
+    return sims
+
+
+def _align(sims, student_blocks, guide_questions, threshold, use_gpt_fallback):
+    """
+    One-to-one question -> block assignment maximizing total similarity over
+    pairs at or above `threshold`. With `use_gpt_fallback`, a question left
+    unmatched is checked with GPT against its most similar unused block.
+    """
+    allowed = np.where(sims >= threshold, np.maximum(sims, 1e-9), 0.0)
+    assignment = solve_assignment(allowed) if allowed.size else {}
+    used = set(assignment.values())
+
+    alignment = {}
+    for q, gq in enumerate(guide_questions):
+        block = assignment.get(q)
+        if block is None and use_gpt_fallback:
+            free = [i for i in range(len(student_blocks))
+                    if i not in used and (student_blocks[i] or "").strip()]
+            if free:
+                candidate = max(free, key=lambda i: sims[q, i])
+                if gpt_similarity(student_blocks[candidate], gq["question"]) >= threshold:
+                    block = candidate
+                    used.add(candidate)
+        # "" = no confident match
+        alignment[str(gq["id"])] = student_blocks[block] if block is not None else ""
+    return alignment
 
 
 def align_questions(student_blocks, guide_questions, threshold=0.7, use_gpt_fallback=False):
     """
     Align OCR-extracted answer blocks with marking guide questions using semantic similarity.
 
+    All blocks and questions are embedded in one batch, scored with a single
+    similarity matrix and matched one-to-one by an optimal assignment.
+
     Args:
         student_blocks (list[str]): OCR text blocks from student's submission.
         guide_questions (list[dict]): Guide questions, each with 'id' and 'question' keys.
@@ -14,43 +56,24 @@ def align_questions(student_blocks, guide_questions, threshold=0.7, use_gpt_fall
     Returns:
         dict: Mapping {guide_question_id: matched student answer text or empty string if no match}
     """
-    alignment = {}
-    used_indices = set()
-
-    for gq in guide_questions:
-        best_score = 0.0
-        best_index = -1
-        best_text = ""
-
-        for i, text in enumerate(student_blocks):
-            if i in used_indices:
-                continue
-
-            matched_text, score = find_best_match(
-                student_answer=text,
-                expected_answers=[gq["question"]],
-                threshold=0.0,  # Check all to find best score
-                use_gpt_fallback=use_gpt_fallback,
-            )
-
-            if score > best_score:
-                best_score = score
-                best_index = i
-                best_text = text
-
-        if best_score >= threshold:
-            alignment[str(gq["id"])] = best_text
-            used_indices.add(best_index)
-        else:
-            alignment[str(gq["id"])] = ""  # No confident match found
+    if not guide_questions:
+        return {}
+    if not student_blocks:
+        return {str(gq["id"]): "" for gq in guide_questions}
 
-    return alignment
+    vectors = embed_texts([gq["question"] for gq in guide_questions] + list(student_blocks))
+    q = len(guide_questions)
+    sims = _similarity_matrix(vectors[:q], vectors[q:], student_blocks)
+    return _align(sims, student_blocks, guide_questions, threshold, use_gpt_fallback)
 
 
 def batch_align_multiple_submissions(submissions, guide_questions, threshold=0.7, use_gpt_fallback=False):
     """
     Align multiple students' OCR text blocks to guide questions.
 
+    Every submission's blocks and the guide questions are embedded in a
+    single pass; each submission is then aligned on its slice of vectors.
+
     Args:
         submissions (list[list[str]]): List of OCR blocks per submission.
         guide_questions (list[dict]): Standard guide questions.
@@ -60,8 +83,21 @@ def batch_align_multiple_submissions(submissions, guide_questions, threshold=0.7
     Returns:
         list[dict]: List of alignment dicts per submission.
     """
-    return [
-        align_questions(blocks, guide_questions, threshold, use_gpt_fallback)
-        for blocks in submissions
-    ]
+    if not guide_questions:
+        return [{} for _ in submissions]
+
+    all_blocks = [block for blocks in submissions for block in blocks]
+    vectors = embed_texts([gq["question"] for gq in guide_questions] + all_blocks)
+    q = len(guide_questions)
+    question_vectors = vectors[:q]
 
+    alignments = []
+    offset = q
+    for blocks in submissions:
+        if not blocks:
+            alignments.append({str(gq["id"]): "" for gq in guide_questions})
+            continue
+        sims = _similarity_matrix(question_vectors, vectors[offset:offset + len(blocks)], blocks)
+        offset += len(blocks)
+        alignments.append(_align(sims, blocks, guide_questions, threshold, use_gpt_fallback))
+    return alignments
@@ -0,0 +1,273 @@
+"""
+Global one-to-one assignment of OCR'd scripts to class-list students.
+
+Greedy matching lets two scripts claim the same student. Here the whole
+scripts x roster score matrix is built at once and solved as an assignment
+problem (maximum total score, each student used at most once):
+
+1. candidate pairs come from the RosterIndex of IDs and of names (a pair
+   whose ID or name cannot reach its floor is never scored), and every
+   candidate gets an exact ID score and name score
+2. a combine rule turns those into one pair score (0 = not allowed)
+3. allowed pairs are weighted by their total evidence (ID score + name score),
+   so a script that agrees on both fields outranks one that agrees on one
+4. the allowed pairs split into connected components, and each component is
+   solved with the Hungarian algorithm (scipy's linear_sum_assignment when
+   scipy is installed, a numpy implementation otherwise)
+
+    results = assign_scripts_to_students([("20210045", "Jane Doe"), ...], class_list)
+    # -> [{"script", "student", "score", "id_score", "name_score", "matched_by", "closest"}, ...]
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from smartscripts.ai.roster_index import get_roster_index, normalize_name
+
+ID_MATCH_THRESHOLD = 0.85    # below this an OCR'd ID does not identify a student
+NAME_MATCH_THRESHOLD = 0.8   # same for names (the fallback when the ID fails)
+NAME_CONFLICT_BELOW = 0.5    # an ID match is rejected when the OCR'd name is this far off
+
+# combine(id_score, name_score, has_id, has_name) -> (pair score, matched_by);
+# a score of 0 means "not allowed"
+CombineRule = Callable[[float, float, bool, bool], Tuple[float, str]]
+
+
+def cascade_rule(id_threshold: float = ID_MATCH_THRESHOLD,
+                 name_threshold: float = NAME_MATCH_THRESHOLD,
+                 conflict_below: float = NAME_CONFLICT_BELOW) -> CombineRule:
+    """
+    ID match first, name match as fallback (the rule the upload pipelines
+    use). A near-miss ID that comes with a clearly different name is not a
+    match, so the assignment cannot hand a script to a neighbouring ID.
+    """
+
+    def combine(id_score, name_score, has_id, has_name):
+        if has_id and id_score >= id_threshold:
+            if has_name and name_score < conflict_below:
+                return 0.0, ""
+            return id_score, "id"
+        if has_name and name_score >= name_threshold:
+            return name_score, "name"
+        return 0.0, ""
+
+    return combine
+
+
+def average_rule(threshold: float) -> CombineRule:
+    """Mean of the ID and name scores, allowed at or above `threshold`."""
+
+    def combine(id_score, name_score, has_id, has_name):
+        score = (id_score + name_score) / 2
+        return (score, "id+name") if score >= threshold else (0.0, "")
+
+    return combine
+
+
+# -------------------- Score matrix --------------------
+
+def build_score_matrix(
+    scripts: Sequence[Tuple[Optional[str], Optional[str]]],
+    class_ids: Sequence[str],
+    class_names: Sequence[str],
+    combine: CombineRule,
+    id_floor: float,
+    name_floor: float
+) -> Dict[str, np.ndarray]:
+    """
+    Score every (script, student) pair that can be allowed. `scripts` holds
+    (ocr_id, ocr_name) pairs; a pair is scored when the ID reaches `id_floor`
+    or the name reaches `name_floor` (pass floors the combine rule needs).
+    Returns dense "score", "id_score" and "name_score" matrices (zeros where
+    not scored), "weight" (ID score + name score of allowed pairs, the
+    quantity the assignment maximizes) and "matched_by" (object array).
+    """
+    shape = (len(scripts), len(class_ids))
+    matrices = {
+        "score": np.zeros(shape, np.float64),
+        "weight": np.zeros(shape, np.float64),
+        "id_score": np.zeros(shape, np.float64),
+        "name_score": np.zeros(shape, np.float64),
+        "matched_by": np.full(shape, "", dtype=object),
+    }
+    if not scripts or not class_ids:
+        return matrices
+
+    id_index = get_roster_index(class_ids)
+    name_index = get_roster_index(class_names, normalize_name)
+
+    for row, (ocr_id, ocr_name) in enumerate(scripts):
+        ocr_id, ocr_name = ocr_id or "", ocr_name or ""
+        columns = set()
+        if ocr_id:
+            columns.update(column for column, _ in id_index.search(ocr_id, id_floor))
+        if ocr_name:
+            columns.update(column for column, _ in name_index.search(ocr_name, name_floor))
+
+        for column in columns:
+            id_score = id_index.score(ocr_id, column) if ocr_id else 0.0
+            name_score = name_index.score(ocr_name, column) if ocr_name else 0.0
+            score, matched_by = combine(id_score, name_score, bool(ocr_id), bool(ocr_name))
+            matrices["id_score"][row, column] = id_score
+            matrices["name_score"][row, column] = name_score
+            if score > 0:
+                matrices["score"][row, column] = score
+                matrices["weight"][row, column] = id_score + name_score
+                matrices["matched_by"][row, column] = matched_by
+    return matrices
+
+
+# -------------------- Assignment --------------------
+
+def _hungarian(cost: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Minimum-cost assignment for an n x m cost matrix with n <= m
+    (potentials / shortest augmenting path).
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)    # p[j]: row (1-based) assigned to column j
+    way = np.zeros(m + 1, dtype=int)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            used_columns = np.flatnonzero(used)
+            u[p[used_columns]] += delta
+            v[used_columns] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    return [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j]]
+
+
+def linear_assignment(cost: np.ndarray) -> List[Tuple[int, int]]:
+    """Minimum-cost (row, column) pairs covering min(n, m) rows/columns."""
+    if cost.size == 0:
+        return []
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        linear_sum_assignment = None
+    if linear_sum_assignment is not None:
+        rows, columns = linear_sum_assignment(cost)
+        return [(int(r), int(c)) for r, c in zip(rows, columns)]
+
+    if cost.shape[0] <= cost.shape[1]:
+        return _hungarian(cost)
+    return [(r, c) for c, r in _hungarian(cost.T)]
+
+
+def _components(scores: np.ndarray) -> List[Tuple[List[int], List[int]]]:
+    """Connected components (rows, columns) of the bipartite graph of allowed pairs."""
+    n_rows = scores.shape[0]
+    parent = list(range(n_rows + scores.shape[1]))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    rows, columns = np.nonzero(scores > 0)
+    for r, c in zip(rows.tolist(), columns.tolist()):
+        a, b = find(r), find(n_rows + c)
+        if a != b:
+            parent[a] = b
+
+    groups: Dict[int, Tuple[set, set]] = {}
+    for r, c in zip(rows.tolist(), columns.tolist()):
+        group = groups.setdefault(find(r), (set(), set()))
+        group[0].add(r)
+        group[1].add(c)
+    return [
+        (sorted(group_rows), sorted(group_columns))
+        for group_rows, group_columns in groups.values()
+    ]
+
+
+def solve_assignment(scores: np.ndarray) -> Dict[int, int]:
+    """
+    Row -> column maximizing the total score over allowed (score > 0) pairs,
+    one column per row at most.
+    """
+    assignment = {}
+    for rows, columns in _components(scores):
+        block = scores[np.ix_(rows, columns)]
+        if block.shape == (1, 1):
+            assignment[rows[0]] = columns[0]
+            continue
+        for r, c in linear_assignment(-block):
+            if block[r, c] > 0:
+                assignment[rows[r]] = columns[c]
+    return assignment
+
+
+def _pair_score(matrix: np.ndarray, row: int, column: Optional[int]) -> float:
+    return round(float(matrix[row, column]), 4) if column is not None else 0.0
+
+
+def assign_scripts_to_students(
+    scripts: Sequence[Tuple[Optional[str], Optional[str]]],
+    class_list: List[dict],
+    id_key: str = "student_id",
+    name_key: str = "name",
+    combine: Optional[CombineRule] = None,
+    id_floor: float = ID_MATCH_THRESHOLD,
+    name_floor: float = NAME_MATCH_THRESHOLD
+) -> List[Dict]:
+    """
+    One result per script, in input order:
+    {"script", "student" (class_list entry or None), "score", "id_score",
+     "name_score", "matched_by", "closest"}. "closest" is the best-scoring
+    candidate whether or not it was assigned (None when the script had no
+    candidate at all), so unmatched scripts can still be reported. The
+    default rule is cascade_rule(id_floor, name_floor).
+    """
+    combine = combine or cascade_rule(id_floor, name_floor)
+    class_ids = [str(student.get(id_key) or "") for student in class_list]
+    class_names = [student.get(name_key) or "" for student in class_list]
+    matrices = build_score_matrix(scripts, class_ids, class_names, combine, id_floor, name_floor)
+    assignment = solve_assignment(matrices["weight"])
+    field_scores = matrices["id_score"] + matrices["name_score"]
+
+    results = []
+    for row in range(len(scripts)):
+        column = assignment.get(row)
+        closest = None
+        if len(class_list) and field_scores[row].any():
+            closest = int(np.argmax(field_scores[row]))
+        shown = column if column is not None else closest
+        results.append({
+            "script": row,
+            "student": class_list[column] if column is not None else None,
+            "score": _pair_score(matrices["score"], row, column),
+            "id_score": _pair_score(matrices["id_score"], row, shown),
+            "name_score": _pair_score(matrices["name_score"], row, shown),
+            "matched_by": matrices["matched_by"][row, column] if column is not None else "",
+            "closest": class_list[closest] if closest is not None else None,
+        })
+    return results
@@ -0,0 +1,206 @@
+"""
+Indexed fuzzy matching of OCR'd student IDs and names against a class list.
+
+A RosterIndex is built once per class list (and cached, see get_roster_index):
+
+- candidate retrieval from a character-bigram inverted index plus length
+  buckets, using the q-gram count filter, so only entries that can still
+  reach the threshold are scored
+- a bit-parallel LCS (Hyyro) for the indel similarity
+      ratio = 1 - indel_distance / (len(a) + len(b))
+  which is the quantity difflib.SequenceMatcher.ratio() approximates, so
+  existing thresholds keep their meaning
+- an early cutoff: once a candidate scores s, later candidates only need to
+  be scored if they can still reach s
+
+    index = get_roster_index(class_ids)
+    position, score = index.best("2021O45", threshold=0.85)
+"""
+
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+Q = 2                 # n-gram size for candidate retrieval
+INDEX_CACHE_SIZE = 32  # class lists whose index is kept in memory
+
+
+def normalize_id(value: str) -> str:
+    return (value or "").strip()
+
+
+def normalize_name(value: str) -> str:
+    return " ".join((value or "").lower().split())
+
+
+def _identity(value: str) -> str:
+    return value or ""
+
+
+def _qgrams(text: str) -> Dict[str, int]:
+    grams: Dict[str, int] = defaultdict(int)
+    for i in range(len(text) - Q + 1):
+        grams[text[i:i + Q]] += 1
+    return grams
+
+
+def _match_masks(pattern: str) -> Dict[str, int]:
+    masks: Dict[str, int] = defaultdict(int)
+    for i, ch in enumerate(pattern):
+        masks[ch] |= 1 << i
+    return masks
+
+
+def lcs_length(text: str, pattern: str, masks: Optional[Dict[str, int]] = None) -> int:
+    """Length of the longest common subsequence, one big-int step per character of `text`."""
+    if not text or not pattern:
+        return 0
+    masks = masks or _match_masks(pattern)
+    full = (1 << len(pattern)) - 1
+    v = full
+    for ch in text:
+        m = masks.get(ch, 0)
+        u = v & m
+        v = ((v + u) | (v - u)) & full
+    return len(pattern) - bin(v).count("1")
+
+
+def indel_ratio(a: str, b: str) -> float:
+    """1 - indel distance / total length (1.0 for two empty strings)."""
+    total = len(a) + len(b)
+    if not total:
+        return 1.0
+    return 2 * lcs_length(a, b) / total
+
+
+def _max_distance(total: int, threshold: float) -> int:
+    return int((1.0 - threshold) * total + 1e-9)
+
+
+class RosterIndex:
+    """Fuzzy lookup over a fixed list of values (e.g. every student ID in a class)."""
+
+    def __init__(self, values: Sequence[str], normalize: Callable[[str], str] = _identity):
+        self.values = list(values)
+        self.normalize = normalize
+        self.keys = [normalize(value) for value in self.values]
+        self._exact: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._by_length: Dict[int, List[int]] = defaultdict(list)
+        self._grams: List[Dict[str, int]] = []
+        for position, key in enumerate(self.keys):
+            self._exact.setdefault(key, position)
+            grams = _qgrams(key)
+            self._grams.append(grams)
+            for gram in grams:
+                self._postings[gram].append(position)
+            self._by_length[len(key)].append(position)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def exact(self, query: str) -> Optional[int]:
+        return self._exact.get(self.normalize(query))
+
+    def score(self, query: str, position: int) -> float:
+        return indel_ratio(self.normalize(query), self.keys[position])
+
+    def _candidates(self, query: str, threshold: float) -> List[Tuple[int, int]]:
+        """(shared q-grams, position) for every entry that can still reach `threshold`."""
+        n = len(query)
+        query_grams = _qgrams(query)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram, count in query_grams.items():
+            for position in self._postings.get(gram, ()):
+                shared[position] += min(count, self._grams[position][gram])
+
+        # Each indel removes at most Q q-grams, so a match within distance k
+        # shares at least max(n, m) - Q + 1 - k * Q of them (count filter)
+        candidates = []
+        # ratio <= 2 * min(n, m) / (n + m) bounds the lengths worth looking at
+        if threshold > 0:
+            min_len = int(n * threshold / (2 - threshold))
+            max_len = int(n * (2 - threshold) / threshold) + 1
+        else:
+            min_len, max_len = 0, max(self._by_length, default=0)
+        for m in range(min_len, max_len + 1):
+            positions = self._by_length.get(m)
+            if not positions:
+                continue
+            k = _max_distance(n + m, threshold)
+            if abs(n - m) > k:
+                continue
+            required = max(n, m) - Q + 1 - k * Q
+            if required <= 0:
+                candidates.extend((shared.get(position, 0), position) for position in positions)
+            else:
+                candidates.extend(
+                    (shared[position], position) for position in positions
+                    if shared.get(position, 0) >= required
+                )
+        return candidates
+
+    def search(self, query: str, threshold: float) -> List[Tuple[int, float]]:
+        """Every (position, score) with score >= threshold, best first (ties in list order)."""
+        query = self.normalize(query)
+        masks = _match_masks(query) if query else {}
+        results = []
+        for _, position in self._candidates(query, threshold):
+            key = self.keys[position]
+            total = len(query) + len(key)
+            score = 2 * lcs_length(key, query, masks) / total if total else 1.0
+            if score >= threshold:
+                results.append((position, score))
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results
+
+    def best(self, query: str, threshold: float) -> Tuple[Optional[int], float]:
+        """
+        Highest-scoring (position, score) at or above `threshold`, first in list
+        order on ties; (None, 0.0) when nothing qualifies.
+        """
+        query = self.normalize(query)
+        position = self._exact.get(query)
+        if position is not None:
+            return position, 1.0
+
+        masks = _match_masks(query) if query else {}
+        best_position, best_score = None, 0.0
+        # Most shared q-grams first, so a good score is found early and the cutoff bites
+        candidates = sorted(self._candidates(query, threshold),
+                            key=lambda item: (-item[0], item[1]))
+        for _, position in candidates:
+            key = self.keys[position]
+            total = len(query) + len(key)
+            floor = max(threshold, best_score)
+            if abs(len(query) - len(key)) > _max_distance(total, floor):
+                continue
+            score = 2 * lcs_length(key, query, masks) / total if total else 1.0
+            if score < threshold:
+                continue
+            earlier_tie = (score == best_score and best_position is not None
+                           and position < best_position)
+            if score > best_score or earlier_tie:
+                best_position, best_score = position, score
+        return best_position, best_score
+
+
+_indexes: "OrderedDict[tuple, RosterIndex]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_roster_index(values: Sequence[str],
+                     normalize: Callable[[str], str] = _identity) -> RosterIndex:
+    """The RosterIndex for this class list and normalization, built on first use."""
+    key = (getattr(normalize, "__name__", repr(normalize)), tuple(values))
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = RosterIndex(values, normalize)
+    with _lock:
+        _indexes[key] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,177 @@
+"""
+Compiled rubric keyword matching.
+
+A guide's `rubric` list ([{"keyword", "weight", "explanation"}, ...]) is
+compiled once into an Aho-Corasick automaton over the lowercased keywords, so
+every keyword is found in a single pass over the answer instead of one
+substring scan per keyword. Matching keeps the semantics of the old loop: a
+keyword counts once when it occurs anywhere in the answer (case-insensitive).
+
+With `max_edits` > 0, keywords that were not found exactly are searched
+approximately (Myers' bit-parallel algorithm), so a keyword with up to
+`max_edits` OCR errors (a dropped, extra or wrong character) still counts.
+Keywords shorter than FUZZY_CHARS_PER_EDIT characters per allowed edit only
+match exactly; a short word with an edit matches too much ordinary text.
+
+    rubric = get_compiled_rubric(guide_item["rubric"], max_edits=1)
+    score, matched_keywords, explanations = rubric.score(student_answer)
+"""
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Set, Tuple
+
+FUZZY_CHARS_PER_EDIT = 4
+COMPILED_CACHE_SIZE = 256
+
+
+def _match_masks(pattern: str) -> Dict[str, int]:
+    masks: Dict[str, int] = {}
+    for i, ch in enumerate(pattern):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+    return masks
+
+
+def within_edits(pattern: str, text: str, max_edits: int, masks: Dict[str, int] = None) -> bool:
+    """True when some substring of `text` is within `max_edits` edits of `pattern` (Myers, 1999)."""
+    m = len(pattern)
+    if m <= max_edits:
+        return True
+    masks = masks or _match_masks(pattern)
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    for ch in text:
+        eq = masks.get(ch, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & full) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & full
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) & full
+        mh = (mh << 1) & full
+        pv = (mh | ~(xv | ph)) & full
+        mv = ph & xv
+        if score <= max_edits:
+            return True
+    return False
+
+
+class CompiledRubric:
+    """Aho-Corasick automaton plus per-keyword weights/explanations for one rubric."""
+
+    def __init__(self, rubric_keywords: List[Dict[str, Any]], max_edits: int = 0):
+        self.rubric = list(rubric_keywords)
+        self.max_edits = max_edits
+        self.patterns = [str(item["keyword"]).lower() for item in self.rubric]
+
+        # goto[state][char] -> state; out[state] -> rubric indices ending there
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(index)
+        self._build_failure_links()
+
+        self._fuzzy = [
+            (index, pattern, _match_masks(pattern))
+            for index, pattern in enumerate(self.patterns)
+            if max_edits > 0 and len(pattern) >= FUZZY_CHARS_PER_EDIT * max_edits
+        ]
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self):
+        return len(self.rubric)
+
+    def find(self, answer: str) -> Set[int]:
+        """Indices of rubric entries whose keyword occurs in `answer`."""
+        text = (answer or "").lower()
+        found: Set[int] = set()
+        if not self.patterns:
+            return found
+        # Empty keywords are contained in every string, as with the `in` test they replace
+        found.update(index for index, pattern in enumerate(self.patterns) if not pattern)
+
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+
+        for index, pattern, masks in self._fuzzy:
+            if index not in found and within_edits(pattern, text, self.max_edits, masks):
+                found.add(index)
+        return found
+
+    def score(self, answer: str) -> Tuple[float, List[str], List[str]]:
+        """(score, matched_keywords, explanations), in rubric order, like scoring.match_keywords."""
+        found = self.find(answer)
+        matched_keywords = []
+        explanations = []
+        score = 0.0
+        for index, keyword in enumerate(self.rubric):
+            if index not in found:
+                continue
+            matched_keywords.append(keyword["keyword"])
+            score += keyword.get("weight", 1.0)
+            if "explanation" in keyword:
+                explanations.append(keyword["explanation"])
+        return score, matched_keywords, explanations
+
+
+def rubric_version(rubric_keywords: List[Dict[str, Any]]) -> str:
+    """Content hash of a rubric (keywords, weights and explanations)."""
+    payload = json.dumps(rubric_keywords, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+_compiled: "OrderedDict[Tuple[str, int], CompiledRubric]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_compiled_rubric(rubric_keywords: List[Dict[str, Any]],
+                        max_edits: int = 0) -> CompiledRubric:
+    """The CompiledRubric for this rubric version, compiled on first use and kept in an LRU."""
+    key = (rubric_version(rubric_keywords), max_edits)
+    with _lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled.move_to_end(key)
+            return compiled
+    compiled = CompiledRubric(rubric_keywords, max_edits)
+    with _lock:
+        _compiled[key] = compiled
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return compiled
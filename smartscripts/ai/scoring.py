@@ -1,7 +1,14 @@
-from typing import List, Dict, Any, Optional, Tuple
+import copy
+from typing import List, Dict, Any, Optional, Tuple, Union
 from difflib import SequenceMatcher
 
-from smartscripts.ai.text_matching import compute_similarity
+import numpy as np
+
+from smartscripts.ai.compiled_guide import CompiledGuide
+from smartscripts.ai.embedding_cache import cosine_matrix, embed_texts
+from smartscripts.ai.rubric_matcher import CompiledRubric, get_compiled_rubric
+from smartscripts.ai.text_matching import expected_similarities
+from smartscripts.config import BaseConfig
 from smartscripts.utils.text_cleaner import clean_text
 
 
@@ -9,52 +16,31 @@ def string_similarity(a: str, b: str) -> float:
     return SequenceMatcher(None, a.lower(), b.lower()).ratio()
 
 
-def match_keywords(student_answer: str, rubric_keywords: List[Dict[str, Any]]) -> Tuple[float, List[str], List[str]]:
-    matched_keywords = []
-    explanations = []
-    score = 0.0
-
-    for keyword in rubric_keywords:
-        if keyword["keyword"].lower() in student_answer.lower():
-            matched_keywords.append(keyword["keyword"])
-            score += keyword.get("weight", 1.0)
-            if "explanation" in keyword:
-                explanations.append(keyword["explanation"])
-
-    return score, matched_keywords, explanations
-
-
-def evaluate_question(
-    student_answer: Optional[str],
-    expected_answers: List[str],
-    rubric_keywords: List[Dict[str, Any]],
-    max_marks: float = 1.0,
-    method: str = "semantic",
-    threshold: float = 0.75
-) -> Dict[str, Any]:
+def match_keywords(
+    student_answer: str,
+    rubric_keywords: Union[List[Dict[str, Any]], CompiledRubric],
+    max_edits: Optional[int] = None
+) -> Tuple[float, List[str], List[str]]:
     """
-    Scores a single question using keyword match, similarity, and explanation feedback.
-
-    Returns a dict with marks, feedback, matched keywords, similarity, and explanations.
+    Sum the weights of the rubric keywords found in the answer. The rubric is
+    compiled once per version (see rubric_matcher); `max_edits` defaults to
+    RUBRIC_MAX_EDITS. An already compiled rubric is used as is.
     """
-    student_answer = clean_text(student_answer or "")
-    if not student_answer:
-        return {
-            "score": 0.0,
-            "feedback": "No answer provided.",
-            "matched_keywords": [],
-            "similarity": 0.0,
-            "explanations": []
-        }
-
-    # Check similarity
-    best_similarity = 0.0
-    for expected in expected_answers:
-        cleaned = clean_text(expected)
-        sim = compute_similarity(student_answer, cleaned) if method == "semantic" else string_similarity(student_answer, cleaned)
-        best_similarity = max(best_similarity, sim)
-
-    # Score using keyword rubric if available
+    if isinstance(rubric_keywords, CompiledRubric):
+        return rubric_keywords.score(student_answer)
+    if max_edits is None:
+        max_edits = BaseConfig.RUBRIC_MAX_EDITS
+    return get_compiled_rubric(rubric_keywords, max_edits).score(student_answer)
+
+
+def _question_result(
+    student_answer: str,
+    best_similarity: float,
+    rubric_keywords: Union[List[Dict[str, Any]], CompiledRubric],
+    max_marks: float,
+    threshold: float
+) -> Dict[str, Any]:
+    """Marks and feedback for one cleaned, non-empty answer whose best similarity is known."""
     rubric_score = 0.0
     matched_keywords = []
     explanations = []
@@ -86,7 +72,73 @@ def evaluate_question(
     }
 
 
-def grade_submission_using_guide(student_answers: List[str], guide: List[Dict[str, Any]], method: str = "semantic") -> Dict[str, Any]:
+def _no_answer_result() -> Dict[str, Any]:
+    return {
+        "score": 0.0,
+        "feedback": "No answer provided.",
+        "matched_keywords": [],
+        "similarity": 0.0,
+        "explanations": []
+    }
+
+
+def evaluate_question(
+    student_answer: Optional[str],
+    expected_answers: List[str],
+    rubric_keywords: List[Dict[str, Any]],
+    max_marks: float = 1.0,
+    method: str = "semantic",
+    threshold: float = 0.75
+) -> Dict[str, Any]:
+    """
+    Scores a single question using keyword match, similarity, and explanation feedback.
+
+    Returns a dict with marks, feedback, matched keywords, similarity, and explanations.
+    """
+    student_answer = clean_text(student_answer or "")
+    if not student_answer:
+        return _no_answer_result()
+
+    # Check similarity (semantic: one batched encode against every expected answer)
+    cleaned_expected = [clean_text(expected) for expected in expected_answers]
+    if method == "semantic":
+        similarities = expected_similarities(student_answer, cleaned_expected)
+    else:
+        similarities = [string_similarity(student_answer, cleaned) for cleaned in cleaned_expected]
+    best_similarity = max([0.0] + similarities)
+
+    return _question_result(student_answer, best_similarity, rubric_keywords, max_marks, threshold)
+
+
+def _question_info(guide_item: Dict[str, Any], idx: int,
+                   student_ans: Optional[str]) -> Dict[str, Any]:
+    return {
+        "question_id": guide_item.get("id", f"q{idx+1}"),
+        "student_answer": student_ans,
+        "expected_answers": guide_item.get("answers", []),
+        "max_marks": guide_item.get("max_marks", 1.0),
+        "question": guide_item.get("question", "")
+    }
+
+
+def _submission_result(per_question_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    total_score = sum(result["score"] for result in per_question_results)
+    max_total = sum(result["max_marks"] for result in per_question_results)
+    percentage = round((total_score / max_total) * 100, 2) if max_total > 0 else 0.0
+
+    return {
+        "total_score": round(total_score, 2),
+        "percentage": percentage,
+        "per_question": per_question_results,
+        "feedback_summary": generate_summary_feedback(per_question_results)
+    }
+
+
+def grade_submission_using_guide(
+    student_answers: List[str],
+    guide: Union[List[Dict[str, Any]], CompiledGuide],
+    method: str = "semantic"
+) -> Dict[str, Any]:
     """
     Grades a full submission using a structured guide with rubrics and explanations.
 
@@ -98,46 +150,114 @@ def grade_submission_using_guide(student_answers: List[str], guide: List[Dict[st
         "rubric": [{"keyword": "...", "weight": 1.0, "explanation": "..."}, ...],
         "max_marks": 2.0
     }
+
+    A CompiledGuide (see compiled_guide) may be passed instead of the list;
+    its cleaned answers, embeddings and rubric matchers are then reused.
     """
+    if isinstance(guide, CompiledGuide):
+        return grade_class_using_guide({0: student_answers}, guide, method)[0]
+
     assert len(student_answers) == len(guide), "Answer count must match rubric length."
 
-    total_score = 0.0
-    max_total = 0.0
     per_question_results = []
 
     for idx, (student_ans, guide_item) in enumerate(zip(student_answers, guide)):
-        expected = guide_item.get("answers", [])
-        rubric = guide_item.get("rubric", [])
-        max_marks = guide_item.get("max_marks", 1.0)
-
         result = evaluate_question(
             student_answer=student_ans,
-            expected_answers=expected,
-            rubric_keywords=rubric,
-            max_marks=max_marks,
+            expected_answers=guide_item.get("answers", []),
+            rubric_keywords=guide_item.get("rubric", []),
+            max_marks=guide_item.get("max_marks", 1.0),
             method=method
         )
+        result.update(_question_info(guide_item, idx, student_ans))
+        per_question_results.append(result)
 
-        result.update({
-            "question_id": guide_item.get("id", f"q{idx+1}"),
-            "student_answer": student_ans,
-            "expected_answers": expected,
-            "max_marks": max_marks,
-            "question": guide_item.get("question", "")
-        })
+    return _submission_result(per_question_results)
 
-        total_score += result["score"]
-        max_total += max_marks
-        per_question_results.append(result)
 
-    percentage = round((total_score / max_total) * 100, 2) if max_total > 0 else 0.0
+def _best_similarities(
+    answers: List[str],
+    expected: List[str],
+    method: str,
+    expected_vectors: Optional[np.ndarray] = None
+) -> List[float]:
+    """
+    Best similarity of every answer to any expected answer, from one answers x
+    expected matrix. `expected_vectors` (one row per expected answer) skips
+    encoding the expected answers.
+    """
+    if not answers:
+        return []
+    present = [i for i, e in enumerate(expected) if e]
+    if not present:
+        return [0.0] * len(answers)
+    if method == "semantic":
+        if expected_vectors is not None:
+            vectors = np.asarray(expected_vectors)[present]
+        else:
+            vectors = embed_texts([expected[i] for i in present])
+        sims = cosine_matrix(embed_texts(answers), vectors)
+    else:
+        sims = np.array([
+            [string_similarity(answer, expected[i]) for i in present] for answer in answers
+        ])
+    return np.maximum(sims.max(axis=1), 0.0).tolist()
 
-    return {
-        "total_score": round(total_score, 2),
-        "percentage": percentage,
-        "per_question": per_question_results,
-        "feedback_summary": generate_summary_feedback(per_question_results)
-    }
+
+def grade_class_using_guide(
+    class_answers: Dict[Any, List[str]],
+    guide: Union[List[Dict[str, Any]], CompiledGuide],
+    method: str = "semantic",
+    threshold: float = 0.75
+) -> Dict[Any, Dict[str, Any]]:
+    """
+    Grades every submission for a test at once. `class_answers` maps a
+    student key to that student's answers (in guide order); the result maps
+    the same keys to what grade_submission_using_guide returns for them.
+
+    Per question, all students' answers are encoded in one batch and scored
+    against the expected answers with a single similarity matrix; identical
+    answers are encoded and scored once. With a CompiledGuide the expected
+    answers are neither cleaned nor encoded again.
+    """
+    compiled = guide if isinstance(guide, CompiledGuide) else None
+    items = compiled.items if compiled else guide
+    for key, answers in class_answers.items():
+        assert len(answers) == len(items), f"Answer count must match rubric length (student {key})."
+
+    per_student: Dict[Any, List[Dict[str, Any]]] = {key: [] for key in class_answers}
+
+    for idx, guide_item in enumerate(items):
+        max_marks = guide_item.get("max_marks", 1.0)
+        if compiled:
+            rubric = compiled.rubric(idx)
+            expected = guide_item["clean_answers"]
+            expected_vectors = compiled.answer_vectors(idx)
+        else:
+            rubric = guide_item.get("rubric", [])
+            expected = [clean_text(e) for e in guide_item.get("answers", [])]
+            expected_vectors = None
+
+        cleaned = {key: clean_text(answers[idx] or "") for key, answers in class_answers.items()}
+        unique_answers = sorted({answer for answer in cleaned.values() if answer})
+        similarities = _best_similarities(unique_answers, expected, method, expected_vectors)
+        best = dict(zip(unique_answers, similarities))
+
+        results_by_answer: Dict[str, Dict[str, Any]] = {}
+        for key, answers in class_answers.items():
+            answer = cleaned[key]
+            if not answer:
+                result = _no_answer_result()
+            else:
+                if answer not in results_by_answer:
+                    results_by_answer[answer] = _question_result(
+                        answer, best[answer], rubric, max_marks, threshold
+                    )
+                result = copy.deepcopy(results_by_answer[answer])
+            result.update(_question_info(guide_item, idx, answers[idx]))
+            per_student[key].append(result)
+
+    return {key: _submission_result(results) for key, results in per_student.items()}
 
 
 def generate_summary_feedback(per_question_results: List[Dict[str, Any]]) -> str:
@@ -1,23 +1,21 @@
-from typing import List, Tuple, Dict
-from sentence_transformers import SentenceTransformer, util
-import openai
+from typing import List, Tuple, Dict, Optional
 import os
 from dotenv import load_dotenv
-from difflib import SequenceMatcher
 import csv
 
+from smartscripts.ai.embedding_cache import cosine_matrix, embed_texts
+from smartscripts.ai.llm_client import llm_chat
+from smartscripts.ai.roster_assignment import assign_scripts_to_students, average_rule, cascade_rule
+from smartscripts.ai.roster_index import RosterIndex, get_roster_index, normalize_id, normalize_name
+
 # -------------------- Setup --------------------
 
 load_dotenv()  # Load .env variables
 
-# Load sentence transformer model once
-_model = SentenceTransformer("all-MiniLM-L6-v2")
-
 # Load OpenAI key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise EnvironmentError("OPENAI_API_KEY environment variable not set.")
-openai.api_key = OPENAI_API_KEY
 
 # -------------------- Embedding-Based Similarity --------------------
 
@@ -25,19 +23,17 @@ def compute_embedding_similarity(text1: str, text2: str) -> float:
     if not text1 or not text2:
         return 0.0
 
-    embeddings = _model.encode([text1, text2], convert_to_tensor=True)
-    similarity = util.pytorch_cos_sim(embeddings[0], embeddings[1])
-    return similarity.item()
+    # Vectors come from the shared embedding cache, so a repeated text is encoded once
+    embeddings = embed_texts([text1, text2])
+    return float(cosine_matrix(embeddings[:1], embeddings[1:])[0, 0])
 
 def similarity_matrix(student_answers: List[str], expected_answers: List[str]) -> List[List[float]]:
     if not student_answers or not expected_answers:
         return []
 
-    student_embeds = _model.encode(student_answers, convert_to_tensor=True)
-    expected_embeds = _model.encode(expected_answers, convert_to_tensor=True)
-    sim_matrix = util.pytorch_cos_sim(student_embeds, expected_embeds)
-
-    return sim_matrix.cpu().tolist()
+    student_embeds = embed_texts(student_answers)
+    expected_embeds = embed_texts(expected_answers)
+    return cosine_matrix(student_embeds, expected_embeds).tolist()
 
 # -------------------- GPT-4 Similarity Fallback --------------------
 
@@ -53,13 +49,13 @@ def gpt_similarity(text1: str, text2: str) -> float:
     )
 
     try:
-        response = openai.ChatCompletion.create(
+        response = llm_chat(
+            [{"role": "user", "content": prompt}],
             model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
             temperature=0,
             max_tokens=5,
         )
-        score_str = response.choices[0].message.content.strip()
+        score_str = response.strip()
         return max(0.0, min(1.0, float(score_str)))
     except Exception as e:
         print(f"[GPT-4 Similarity Error] {e}")
@@ -67,6 +63,23 @@ def gpt_similarity(text1: str, text2: str) -> float:
 
 # -------------------- Matching Logic --------------------
 
+def expected_similarities(student_answer: str, expected_answers: List[str]) -> List[float]:
+    """
+    Cosine similarity of the student answer to every expected answer, from
+    one batched (cached) encode and a single matrix product. Empty texts
+    score 0.0.
+    """
+    scores = [0.0] * len(expected_answers)
+    present = [i for i, expected in enumerate(expected_answers) if expected]
+    if not student_answer or not present:
+        return scores
+
+    embeddings = embed_texts([student_answer] + [expected_answers[i] for i in present])
+    row = cosine_matrix(embeddings[:1], embeddings[1:])[0]
+    for i, score in zip(present, row.tolist()):
+        scores[i] = score
+    return scores
+
 def match_answer(
     student_answer: str,
     expected_answers: List[str],
@@ -76,8 +89,8 @@ def match_answer(
     best_score = 0.0
     best_match = ""
 
-    for expected in expected_answers:
-        score = compute_embedding_similarity(student_answer, expected)
+    scores = expected_similarities(student_answer, expected_answers)
+    for expected, score in zip(expected_answers, scores):
         if score > best_score:
             best_score = score
             best_match = expected
@@ -92,52 +105,44 @@ def match_answer(
     return "", best_score
 
 # -------------------- Fuzzy Matching for OCR IDs --------------------
+# All roster lookups go through a RosterIndex built once per class list
+# (q-gram candidate retrieval + bounded indel similarity, see roster_index).
 
 def fuzzy_match_id(
     ocr_id: str,
     class_ids: List[str],
     threshold: float = 0.85
 ) -> Tuple[str, float]:
-    best_score = 0.0
-    best_match = ""
-
-    for cid in class_ids:
-        score = SequenceMatcher(None, ocr_id, cid).ratio()
-        if score > best_score:
-            best_score = score
-            best_match = cid
-
-    return (best_match, best_score) if best_score >= threshold else ("", 0.0)
+    position, score = get_roster_index(class_ids).best(ocr_id, threshold)
+    return (class_ids[position], score) if position is not None else ("", 0.0)
 
 def fuzzy_match_name(
     ocr_name: str,
     class_names: List[str],
     threshold: float = 0.8
 ) -> Tuple[str, float]:
-    best_score = 0.0
-    best_match = ""
-
-    for cname in class_names:
-        score = SequenceMatcher(None, ocr_name.lower(), cname.lower()).ratio()
-        if score > best_score:
-            best_score = score
-            best_match = cname
-
-    return (best_match, best_score) if best_score >= threshold else ("", 0.0)
+    position, score = get_roster_index(class_names, normalize_name).best(ocr_name, threshold)
+    return (class_names[position], score) if position is not None else ("", 0.0)
 
 def match_ocr_ids_to_class(
     extracted_ids: List[str],
     class_list: List[dict],
     threshold: float = 0.85
 ) -> Tuple[List[str], List[str]]:
-    class_ids = [s["student_id"] for s in class_list]
+    """
+    Match OCR'd IDs one-to-one against the class list (a global assignment,
+    so two scripts never claim the same student).
+    """
+    results = assign_scripts_to_students(
+        [(ocr_id, None) for ocr_id in extracted_ids], class_list,
+        combine=cascade_rule(threshold, float("inf")), id_floor=threshold, name_floor=1.0
+    )
     matched_ids = []
     unmatched_ids = []
 
-    for ocr_id in extracted_ids:
-        match, score = fuzzy_match_id(ocr_id, class_ids, threshold)
-        if match:
-            matched_ids.append(match)
+    for ocr_id, result in zip(extracted_ids, results):
+        if result["student"]:
+            matched_ids.append(result["student"]["student_id"])
         else:
             unmatched_ids.append(ocr_id)
 
@@ -149,26 +154,26 @@ def fuzzy_match_students(
     id_threshold: float = 0.85,
     name_threshold: float = 0.8
 ) -> Tuple[List[dict], List[Tuple[str, str]], List[dict]]:
+    """
+    Match (ocr_id, ocr_name) pairs to class-list students by the mean of the
+    ID and name scores, solved as one global one-to-one assignment. `scores`
+    reports every pair's assigned (or closest) student and score.
+    """
     matched = []
     unmatched = []
     scores = []
 
-    for ocr_id, ocr_name in extracted_list:
-        best_match = None
-        best_score = 0.0
-
-        for student in class_list:
-            sid = student.get("student_id", "")
-            sname = student.get("name", "")
-            id_score = SequenceMatcher(None, ocr_id, sid).ratio()
-            name_score = SequenceMatcher(None, ocr_name.lower(), sname.lower()).ratio()
-            avg_score = (id_score + name_score) / 2
+    match_threshold = (id_threshold + name_threshold) / 2
+    results = assign_scripts_to_students(
+        extracted_list, class_list, combine=average_rule(match_threshold),
+        id_floor=match_threshold, name_floor=match_threshold
+    )
 
-            if avg_score > best_score:
-                best_score = avg_score
-                best_match = student
+    for (ocr_id, ocr_name), result in zip(extracted_list, results):
+        best_match = result["student"] or result["closest"]
+        best_score = (result["id_score"] + result["name_score"]) / 2
 
-        if best_score >= ((id_threshold + name_threshold) / 2):
+        if result["student"]:
             matched.append({
                 "ocr_id": ocr_id,
                 "ocr_name": ocr_name,
@@ -194,26 +199,20 @@ def fuzzy_match_ids(
     mode: str = "fuzzy"
 ) -> List[Dict[str, str]]:
     class_ids = [s["student_id"] for s in class_list]
+    index = get_roster_index(class_ids, normalize_id)
     matches = []
 
     for ocr_id in extracted_ids:
-        best_match = ""
-        best_score = 0.0
-
-        for class_id in class_ids:
-            if mode == "exact":
-                score = 1.0 if ocr_id.strip() == class_id.strip() else 0.0
-            else:
-                score = SequenceMatcher(None, ocr_id.strip(), class_id.strip()).ratio()
-
-            if score > best_score:
-                best_score = score
-                best_match = class_id
+        if mode == "exact":
+            position = index.exact(ocr_id)
+            best_score = 1.0 if position is not None else 0.0
+        else:
+            position, best_score = index.best(ocr_id, threshold)
 
-        if best_score >= threshold:
+        if position is not None and best_score >= threshold:
             matches.append({
                 "ocr_id": ocr_id,
-                "matched_id": best_match,
+                "matched_id": class_ids[position],
                 "score": round(best_score, 4)
             })
 
@@ -229,6 +228,26 @@ def export_matches_to_csv(matches: List[Dict[str, str]], path: str):
     except Exception as e:
         print(f"[CSV Export Error] {e}")
 
+def _name_id_candidates(
+    id_index: RosterIndex,
+    name_index: RosterIndex,
+    ocr_id: str,
+    ocr_name: str,
+    threshold: float,
+    field_threshold: Optional[float] = None
+) -> List[int]:
+    """
+    Roster positions whose weighted ID/name score can reach `threshold`. A
+    weighted average never exceeds its larger part, so one of the two fields
+    must reach it on its own.
+    """
+    if threshold <= 0:
+        return list(range(len(id_index)))
+    field_threshold = threshold if field_threshold is None else field_threshold
+    positions = {position for position, _ in id_index.search(ocr_id, field_threshold)}
+    positions.update(position for position, _ in name_index.search(ocr_name, field_threshold))
+    return sorted(positions)
+
 def fuzzy_match_name_and_id_students(
     extracted_pairs: List[Dict[str, str]],
     class_list: List[Dict[str, str]],
@@ -238,6 +257,11 @@ def fuzzy_match_name_and_id_students(
 ) -> List[Dict[str, str]]:
     matches = []
 
+    class_ids = [student["student_id"] for student in class_list]
+    class_names = [student["student_name"] for student in class_list]
+    id_index = get_roster_index(class_ids, normalize_id)
+    name_index = get_roster_index(class_names, normalize_name)
+
     for extracted in extracted_pairs:
         ocr_id = extracted["id"]
         ocr_name = extracted["name"]
@@ -245,16 +269,20 @@ def fuzzy_match_name_and_id_students(
         best_match = None
         best_score = 0.0
 
-        for student in class_list:
-            class_id = student["student_id"]
-            class_name = student["student_name"]
+        # Exact mode scores are 0/1, so only exact hits on either field can match
+        field_threshold = 1.0 if mode == "exact" else None
+        candidates = _name_id_candidates(id_index, name_index, ocr_id, ocr_name, threshold,
+                                         field_threshold)
+        for position in candidates:
+            class_id = class_ids[position]
+            class_name = class_names[position]
 
             if mode == "exact":
-                id_score = 1.0 if ocr_id.strip() == class_id.strip() else 0.0
-                name_score = 1.0 if ocr_name.strip().lower() == class_name.strip().lower() else 0.0
+                id_score = 1.0 if normalize_id(ocr_id) == id_index.keys[position] else 0.0
+                name_score = 1.0 if normalize_name(ocr_name) == name_index.keys[position] else 0.0
             else:
-                id_score = SequenceMatcher(None, ocr_id.strip(), class_id.strip()).ratio()
-                name_score = SequenceMatcher(None, ocr_name.strip().lower(), class_name.strip().lower()).ratio()
+                id_score = id_index.score(ocr_id, position)
+                name_score = name_index.score(ocr_name, position)
 
             combined_score = (1 - name_weight) * id_score + name_weight * name_score
 
@@ -2,31 +2,26 @@ import os
 import re
 import cv2
 import numpy as np
+from collections import Counter
 from PIL import Image
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
-import torch
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
-
-# Load TrOCR model and processor
-processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
-model = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-handwritten")
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = model.to(device)
+from smartscripts.ai.ocr_engine import OCR_BATCH_SIZE, run_tr_ocr_batch
+from smartscripts.ai.page_triage import TRIAGE_BLANK, TRIAGE_DUPLICATE, new_page_triage
+from smartscripts.ai.preprocessing import preprocess_page
 
 # Common keywords that appear on exam cover pages
 KEYWORDS = ["name", "id", "student", "signature", "date", "index", "admission", "reg"]
 
 def run_trocr(image: np.ndarray) -> str:
     """Run OCR on an image using TrOCR and return lowercased text."""
-    pil_img = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-    pixel_values = processor(images=pil_img, return_tensors="pt").pixel_values.to(device)
-    with torch.no_grad():
-        generated_ids = model.generate(pixel_values)
-    text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-    return text.lower().strip()
+    return run_trocr_batch([image])[0]
+
+def run_trocr_batch(images: List[np.ndarray], batch_size: int = OCR_BATCH_SIZE) -> List[str]:
+    """Run batched TrOCR over BGR images and return lowercased text per image."""
+    pil_images = [Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)) for image in images]
+    return [text.lower().strip() for text in run_tr_ocr_batch(pil_images, batch_size=batch_size)]
 
 def detect_form_lines(thresh_image: np.ndarray) -> int:
     """Count form-like lines using morphological operations."""
@@ -41,64 +36,245 @@ def detect_form_lines(thresh_image: np.ndarray) -> int:
     
     return len(contours)
 
-def score_front_page(image: np.ndarray) -> float:
+# Front-page cascade: cheap layout stages reject most answer pages and only
+# pages whose layout score reaches `reject_below` are confirmed with TrOCR.
+# Layout alone never accepts a page by default: ruled answer sheets saturate
+# the line and header terms just like cover-sheet boxes do. Set
+# `accept_above` only after calibrating it on real scans.
+CASCADE_THRESHOLDS = {
+    "blank_ink_density": 0.003,  # stage 0: (almost) no ink -> never a front page
+    "reject_below": 0.25,        # stage 1: layout score below this -> answer page
+    "accept_above": None,        # stage 1: layout score at/above this -> front page without OCR
+}
+DENSE_INK_DENSITY = 0.12  # ink coverage of a fully written answer page
+HEADER_FRACTION = 0.25    # top band of the page where cover-sheet boxes live
+
+def _binarize(image: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                 cv2.THRESH_BINARY_INV, 15, 10)
+
+def compute_layout_features(image: np.ndarray, thresh: Optional[np.ndarray] = None) -> dict:
+    """
+    Cheap, OCR-free page features:
+        - form_lines / header_lines: morphological line counts (whole page / header band)
+        - ink_density / header_ink_density / body_ink_density: fraction of inked pixels
+        - layout_score: 0.5 * line score + 0.25 * header score + 0.25 * body sparsity
+    """
+    if thresh is None:
+        thresh = _binarize(image)
+    header_rows = max(1, int(thresh.shape[0] * HEADER_FRACTION))
+    header, body = thresh[:header_rows], thresh[header_rows:]
+
+    def density(region: np.ndarray) -> float:
+        return float(np.count_nonzero(region)) / region.size if region.size else 0.0
+
+    form_lines = detect_form_lines(thresh)
+    header_lines = detect_form_lines(header)
+    body_ink_density = density(body)
+
+    line_score = min(form_lines / 10, 1.0)
+    header_score = min(header_lines / 4, 1.0)
+    sparsity_score = 1.0 - min(body_ink_density / DENSE_INK_DENSITY, 1.0)
+
+    return {
+        "form_lines": form_lines,
+        "header_lines": header_lines,
+        "ink_density": round(density(thresh), 5),
+        "header_ink_density": round(density(header), 5),
+        "body_ink_density": round(body_ink_density, 5),
+        "layout_score": round(0.5 * line_score + 0.25 * header_score + 0.25 * sparsity_score, 3),
+    }
+
+def score_front_page(image: np.ndarray, ocr_text: Optional[str] = None,
+                     features: Optional[dict] = None) -> float:
     """
     Score how likely the image is a front page using layout + OCR.
     Score = weighted sum of:
         - keyword_score (0.4)
         - layout_score (0.3)
         - title_score (0.3)
-    """
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
-                                   cv2.THRESH_BINARY_INV, 15, 10)
 
-    ocr_text = run_trocr(image)
+    Pass `ocr_text` when the page has already been OCR'd (e.g. in a batch) to
+    skip the per-page TrOCR call, and `features` from compute_layout_features
+    to skip recomputing the form-line count.
+    """
+    if ocr_text is None:
+        ocr_text = run_trocr(image)
     keyword_hits = sum(1 for word in KEYWORDS if word in ocr_text)
     keyword_score = min(keyword_hits / 4, 1.0)  # Cap at 1.0
 
     title_match = re.search(r"\b(examination|exam)\b", ocr_text)
     title_score = 1.0 if title_match else 0.0
 
-    line_count = detect_form_lines(thresh)
+    line_count = features["form_lines"] if features else detect_form_lines(_binarize(image))
     layout_score = min(line_count / 10, 1.0)  # Normalize
 
     final_score = (0.4 * keyword_score) + (0.3 * layout_score) + (0.3 * title_score)
     return round(final_score, 3)
 
-def detect_front_pages_via_ocr(image_paths: List[str], threshold: float = 0.5) -> List[Tuple[int, int]]:
+def _load_bgr(image) -> Optional[np.ndarray]:
+    """Accept an image path, a BGR array or a PIL image and return a BGR array."""
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, Image.Image):
+        return cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+    return cv2.imread(str(image))
+
+def _prepare_layout_image(image: np.ndarray) -> np.ndarray:
+    """Deskewed, border-trimmed, downscaled grayscale page (cached), back in BGR layout."""
+    gray = preprocess_page(cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if image.ndim == 3 else image,
+                           do_binarize=False)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+def classify_front_pages_cascade(pages: List, threshold: float = 0.5,
+                                 thresholds: Optional[dict] = None,
+                                 batch_size: int = OCR_BATCH_SIZE,
+                                 triage: bool = True) -> Tuple[List[dict], dict]:
     """
-    Detect front pages in a list of image paths based on OCR/layout score.
-    Returns: List of (start_page, end_page) ranges for each student.
+    Run the front-page cascade over `pages` (paths, BGR arrays or PIL images).
+
+    Stage 0 rejects blank pages and, with `triage`, near-identical repeats of
+    the previous page (double-feeds: they reuse that page's score but never
+    start a new script). A repeat of a page that is a front page is scored
+    like any other page instead, since it may be the next student's cover
+    sheet. Stage 1 rejects pages from layout features alone (and accepts
+    them only when `accept_above` is set); every other page is OCR'd (in
+    batches) and scored with score_front_page, which needs keyword or title
+    evidence to pass `threshold`.
+
+    Returns (decisions, stats): one decision dict per readable page
+    ({"index", "stage", "layout_score", "score", "is_front", "image",
+    "triage"}) and the number of pages settled by each stage.
     """
-    debug_dir = Path("tmp/front_pages")
-    debug_dir.mkdir(parents=True, exist_ok=True)
+    limits = dict(CASCADE_THRESHOLDS, **(thresholds or {}))
+    stats = Counter(pages=len(pages))
+    decisions = []
+    by_index = {}
+    pending = []
+    page_triage = new_page_triage() if triage else None
 
-    front_page_indices = []
+    def flush():
+        if not pending:
+            return
+        ocr_texts = run_trocr_batch([d["image"] for d in pending], batch_size=batch_size)
+        for decision, ocr_text in zip(pending, ocr_texts):
+            decision["score"] = score_front_page(decision["image"], ocr_text=ocr_text,
+                                                 features=decision["features"])
+            decision["is_front"] = decision["score"] >= threshold
+            if not decision["is_front"]:
+                decision["image"] = None
+        stats["ocr"] += len(pending)
+        pending.clear()
 
-    for idx, image_path in enumerate(image_paths):
-        image = cv2.imread(image_path)
+    for idx, page in enumerate(pages):
+        image = _load_bgr(page)
         if image is None:
-            print(f"[!] Failed to read image: {image_path}")
+            print(f"[!] Failed to read image: {page}")
+            stats["unreadable"] += 1
             continue
 
-        score = score_front_page(image)
-        if score >= threshold:
-            front_page_indices.append(idx)
-            debug_output = debug_dir / f"front_page_{idx + 1}.jpg"
-            Image.fromarray(image).save(debug_output)
-            print(f"[?] Detected front page at page {idx + 1}  Score: {score}")
+        image = _prepare_layout_image(image)
+        page_decision = page_triage.triage(image, idx + 1) if page_triage else None
+        original = None
+        if page_decision and page_decision["triage"] == TRIAGE_DUPLICATE:
+            original = by_index.get(page_decision["duplicate_of"] - 1)
+            if original is not None and "is_front" not in original:
+                flush()  # the original is still waiting for OCR
+            if original is None or original["is_front"]:
+                # A repeat of a front page may be the next student's cover sheet: score it
+                page_triage.overrule(page_decision)
+                original = None
+        if page_decision and page_decision["triage"] in (TRIAGE_BLANK, TRIAGE_DUPLICATE):
+            decision = {"index": idx, "layout_score": 0.0, "features": None, "image": None,
+                        "stage": page_decision["triage"],
+                        "score": original["score"] if original else 0.0,
+                        "is_front": False, "triage": page_decision}
+            decisions.append(decision)
+            by_index[idx] = decision
+            stats[decision["stage"]] += 1
+            continue
 
-    # Convert detected front page indices to (start, end) page ranges
-    total_pages = len(image_paths)
+        features = compute_layout_features(image)
+        layout_score = features["layout_score"]
+        decision = {"index": idx, "layout_score": layout_score, "features": features,
+                    "image": image, "triage": page_decision}
+        decisions.append(decision)
+        by_index[idx] = decision
+
+        if features["ink_density"] < limits["blank_ink_density"]:
+            decision.update(stage="blank", score=0.0, is_front=False)
+        elif layout_score < limits["reject_below"]:
+            decision.update(stage="layout_reject", score=layout_score, is_front=False)
+        elif limits["accept_above"] is not None and layout_score >= limits["accept_above"]:
+            decision.update(stage="layout_accept", score=layout_score, is_front=True)
+        else:
+            decision["stage"] = "ocr"
+            pending.append(decision)
+            if len(pending) >= batch_size:
+                flush()
+            continue
+        stats[decision["stage"]] += 1
+
+        # Settled pages no longer need their pixels unless they are front pages
+        if not decision["is_front"]:
+            decision["image"] = None
+    flush()
+
+    return decisions, dict(stats)
+
+def _indices_to_ranges(front_page_indices: List[int], total_pages: int) -> List[Tuple[int, int]]:
     page_ranges = []
     for i, start_idx in enumerate(front_page_indices):
         start_page = start_idx + 1  # Convert to 1-based
         end_page = front_page_indices[i + 1] if i + 1 < len(front_page_indices) else total_pages
         page_ranges.append((start_page, end_page))
-
     return page_ranges
 
+def detect_front_pages_via_ocr(image_paths: List, threshold: float = 0.5,
+                               batch_size: int = OCR_BATCH_SIZE,
+                               debug_dir: Optional[str] = None,
+                               use_cascade: bool = True,
+                               thresholds: Optional[dict] = None) -> List[Tuple[int, int]]:
+    """
+    Detect front pages in a list of pages based on OCR/layout score.
+    Pages may be image paths, BGR arrays or PIL images; in-memory pages are
+    never written to disk. Pass `debug_dir` to save detected front pages.
+
+    With `use_cascade` (default) blank and duplicate pages are triaged out and
+    cheap layout stages settle most others, so only uncertain pages are OCR'd;
+    `thresholds` overrides CASCADE_THRESHOLDS.
+    Without it every page is OCR'd. OCR runs `batch_size` pages per `generate`.
+    Returns: List of (start_page, end_page) ranges for each student.
+    """
+    if debug_dir:
+        debug_dir = Path(debug_dir)
+        debug_dir.mkdir(parents=True, exist_ok=True)
+
+    if not use_cascade:
+        thresholds = {"blank_ink_density": -1.0, "reject_below": -1.0, "accept_above": None}
+
+    decisions, stats = classify_front_pages_cascade(
+        image_paths, threshold=threshold, thresholds=thresholds, batch_size=batch_size,
+        triage=use_cascade
+    )
+    print(f"[i] Front-page cascade: {stats}")
+
+    front_page_indices = []
+    for decision in decisions:
+        if not decision["is_front"]:
+            continue
+        idx = decision["index"]
+        front_page_indices.append(idx)
+        if debug_dir:
+            debug_output = debug_dir / f"front_page_{idx + 1}.jpg"
+            cv2.imwrite(str(debug_output), decision["image"])
+        print(f"[?] Detected front page at page {idx + 1} ({decision['stage']}) "
+              f"— Score: {decision['score']}")
+
+    # Convert detected front page indices to (start, end) page ranges
+    return _indices_to_ranges(front_page_indices, len(image_paths))
+
 # Optional CLI usage
 if __name__ == "__main__":
     import sys
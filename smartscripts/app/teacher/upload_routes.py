@@ -17,6 +17,7 @@ from smartscripts.models import Test, AttendanceRecord
 from smartscripts.app.forms import TestMaterialsUploadForm
 from smartscripts.services.ocr_pipeline import process_combined_student_scripts
 from smartscripts.ai.ocr_engine import run_ocr_on_test
+from smartscripts.ai.compiled_guide import delete_compiled_guide
 
 upload_bp = Blueprint("upload_bp", __name__, url_prefix='/upload')
 
@@ -54,6 +55,25 @@ def save_uploaded_file(file, folder: str, test_id: int, filename: str = None):
     file.save(save_path)
     return save_path
 
+def refresh_guide_cache(test_id: int, guide_path: Path) -> bool:
+    """
+    Queue reading and compiling the uploaded marking guide, so neither the
+    upload request nor the first submission graded waits on its OCR. The
+    previous guide's text is dropped at once, so nothing is graded against it
+    meanwhile. Flashes an error and returns False when it cannot be queued.
+    """
+    from smartscripts.tasks.ocr_tasks import import_uploaded_guide_task
+
+    delete_compiled_guide(test_id)
+    try:
+        task = import_uploaded_guide_task.delay(test_id, str(guide_path))
+    except Exception as e:
+        current_app.logger.error(f"Could not queue marking guide import for test {test_id}: {e}")
+        flash(f"Marking guide saved, but reading it failed: {e}", "danger")
+        return False
+    flash(f"Reading the marking guide in the background (task {task.id}).", "info")
+    return True
+
 def get_file_path(relative_path: Path) -> Path:
     return Path(current_app.root_path) / 'static' / 'uploads' / relative_path
 
@@ -82,18 +102,21 @@ def upload_test_materials(test_id):
 
     if form.validate_on_submit():
         try:
+            saved_paths = {}
             for field, folder in UPLOAD_FOLDERS.items():
                 file = request.files.get(field)
                 if file and allowed_file(file.filename):
                     filename = secure_filename(file.filename)
                     unique_filename = f"{uuid.uuid4().hex}_{filename}"
-                    save_uploaded_file(file, folder, test_id, unique_filename)
+                    saved_paths[field] = save_uploaded_file(file, folder, test_id, unique_filename)
                     setattr(test, FILENAME_FIELDS[field], unique_filename)
                 elif file:
                     flash(f"Invalid file type for {field}.", "warning")
                     return redirect(request.url)
 
             db.session.commit()
+            if "marking_guide" in saved_paths:
+                refresh_guide_cache(test_id, saved_paths["marking_guide"])
             flash("All materials uploaded successfully.", "success")
             return redirect(url_for("teacher_bp.dashboard_bp.dashboard"))
 
@@ -138,9 +161,11 @@ def upload_individual_file(file_type, test_id):
     try:
         filename = secure_filename(file.filename)
         unique_filename = f"{uuid.uuid4().hex}_{filename}"
-        save_uploaded_file(file, UPLOAD_FOLDERS[file_type], test_id, unique_filename)
+        saved_path = save_uploaded_file(file, UPLOAD_FOLDERS[file_type], test_id, unique_filename)
         setattr(test, FILENAME_FIELDS[file_type], unique_filename)
         db.session.commit()
+        if file_type == "marking_guide":
+            refresh_guide_cache(test_id, saved_path)
         flash(f"{file_type.replace('_', ' ').title()} uploaded successfully.", "success")
     except Exception as e:
         db.session.rollback()
@@ -197,6 +222,8 @@ def delete_file(test_id, file_type):
             file_path.unlink()
             setattr(test, FILENAME_FIELDS[file_type], None)
             db.session.commit()
+            if file_type == "marking_guide":
+                delete_compiled_guide(test_id)
             flash(f"{file_type.replace('_', ' ').title()} deleted successfully.", "info")
         except Exception as e:
             current_app.logger.error(f"Failed to delete file: {e}")
@@ -45,6 +45,9 @@ QUESTION_PAPER_RUBRICS = QUESTION_PAPER_FOLDER / 'rubrics'
 LOG_DIR = BASE_DIR / 'logs'
 LOG_FILE = LOG_DIR / 'app.log'
 
+# Local caches (OCR results etc.) - kept outside static/ so they are never served
+CACHE_DIR = Path(os.getenv('CACHE_DIR', BASE_DIR / 'cache'))
+
 
 class BaseConfig:
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-default-secret-key')
@@ -99,7 +102,103 @@ class BaseConfig:
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     HUGGINGFACE_API_KEY = os.getenv('HUGGINGFACE_API_KEY')
     TROCR_MODEL = os.getenv('TROCR_MODEL', 'microsoft/trocr-base-handwritten')
+    TROCR_BACKEND = os.getenv('TROCR_BACKEND', 'torch')  # torch | torch-int8 | onnx
+    ONNX_EXPORT_DIR = os.getenv('ONNX_EXPORT_DIR', str(CACHE_DIR / 'onnx'))
     GPT_MODEL = os.getenv('GPT_MODEL', 'gpt-4')
+    OPENAI_API_BASE = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+    # In-flight OpenAI requests per process
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+    LLM_RATE_PER_SECOND = float(os.getenv('LLM_RATE_PER_SECOND', 5))  # token-bucket refill rate
+    LLM_BURST = int(os.getenv('LLM_BURST', 10))
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 60))  # seconds per attempt
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 3))
+    # Consecutive failures before failing fast
+    LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', 5))
+    # Seconds before a probe call is allowed
+    LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', 30))
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+    FEEDBACK_MODEL = os.getenv('FEEDBACK_MODEL', 'gpt2')
+    MODEL_DIR = os.getenv('MODEL_DIR')  # optional local copies of the models above
+    MODELS_OFFLINE = os.getenv('MODELS_OFFLINE', 'False').lower() in ['true', '1', 'yes']
+    OCR_BATCH_SIZE = int(os.getenv('OCR_BATCH_SIZE', 8))  # pages per TrOCR generate() call
+    # Logistic calibration of TrOCR's mean token log-prob into a confidence (ai/ocr_confidence.py)
+    OCR_CONFIDENCE_SLOPE = float(os.getenv('OCR_CONFIDENCE_SLOPE', 8.0))
+    OCR_CONFIDENCE_BIAS = float(os.getenv('OCR_CONFIDENCE_BIAS', 3.5))
+    # Page preprocessing before OCR / layout detection (see ai/preprocessing.py)
+    # Longest side in pixels; 0 = keep size
+    PREPROCESS_MAX_SIDE = int(os.getenv('PREPROCESS_MAX_SIDE', 1024))
+    PREPROCESS_BINARIZE = os.getenv('PREPROCESS_BINARIZE', 'True').lower() in ['true', '1', 'yes']
+    PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS', 0))  # 0 = one thread per core
+    OCR_POOL_ENABLED = os.getenv('OCR_POOL_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    OCR_POOL_WORKERS = int(os.getenv('OCR_POOL_WORKERS', 0))  # 0 = half the CPU cores
+    OCR_POOL_START_METHOD = os.getenv('OCR_POOL_START_METHOD', 'spawn')
+    PDF_READ_AHEAD = int(os.getenv('PDF_READ_AHEAD', 2))  # pages rendered ahead of the OCR consumer
+    # Text-layer chars needed to skip OCR
+    PDF_TEXT_MIN_CHARS = int(os.getenv('PDF_TEXT_MIN_CHARS', 20))
+    # Image share of a page that marks it as a scan
+    PDF_SCAN_COVERAGE = float(os.getenv('PDF_SCAN_COVERAGE', 0.6))
+    # Top share of a cover page searched for name/ID
+    HEADER_ROI_BAND = float(os.getenv('HEADER_ROI_BAND', 0.3))
+    # Header fields as page fractions, e.g. "name=0.1,0.05,0.6,0.1;id=0.6,0.05,0.95,0.1"
+    HEADER_ROI_TEMPLATE = os.getenv('HEADER_ROI_TEMPLATE', '')
+    TESSERACT_WORKERS = int(os.getenv('TESSERACT_WORKERS', 0))  # 0 = one per CPU core
+    # Uniform text block
+    TESSERACT_HEADER_CONFIG = os.getenv('TESSERACT_HEADER_CONFIG', '--oem 1 --psm 6')
+    # Blank/duplicate page triage before OCR (see ai/page_triage.py)
+    TRIAGE_ENABLED = os.getenv('TRIAGE_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    # Ink share below which a page is blank
+    TRIAGE_BLANK_INK_RATIO = float(os.getenv('TRIAGE_BLANK_INK_RATIO', 0.003))
+    # Max dHash bits (of 256) for a duplicate
+    TRIAGE_DUPLICATE_DISTANCE = int(os.getenv('TRIAGE_DUPLICATE_DISTANCE', 4))
+
+    # OCR result cache (content-addressed, SQLite)
+    CACHE_DIR = CACHE_DIR
+    OCR_CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    OCR_CACHE_PATH = os.getenv('OCR_CACHE_PATH', str(CACHE_DIR / 'ocr_cache.sqlite3'))
+    OCR_CACHE_MAX_ENTRIES = int(os.getenv('OCR_CACHE_MAX_ENTRIES', 50000))
+    OCR_CACHE_MAX_BYTES = int(os.getenv('OCR_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+    # LLM response cache (prompt fingerprint, SQLite)
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', str(CACHE_DIR / 'llm_cache.sqlite3'))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 100000))
+    LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+    LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 30 * 24 * 3600))  # seconds; 0 = never expire
+    LLM_CACHE_BYPASS_SAMPLED = (
+        os.getenv('LLM_CACHE_BYPASS_SAMPLED', 'False').lower() in ['true', '1', 'yes']
+    )
+
+    # Preprocessed page cache (input-pixel hash, SQLite)
+    PREPROCESS_CACHE_ENABLED = (
+        os.getenv('PREPROCESS_CACHE_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    )
+    PREPROCESS_CACHE_PATH = (
+        os.getenv('PREPROCESS_CACHE_PATH', str(CACHE_DIR / 'preprocess_cache.sqlite3'))
+    )
+    PREPROCESS_CACHE_MAX_ENTRIES = int(os.getenv('PREPROCESS_CACHE_MAX_ENTRIES', 20000))
+    PREPROCESS_CACHE_MAX_BYTES = int(os.getenv('PREPROCESS_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+    # Text embedding cache (text hash + model; in-process LRU plus per-guide .npy files)
+    EMBEDDING_CACHE_ENABLED = (
+        os.getenv('EMBEDDING_CACHE_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    )
+    EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', 50000))  # vectors kept in memory
+    EMBEDDING_STORE_DIR = os.getenv('EMBEDDING_STORE_DIR', str(CACHE_DIR / 'embeddings'))
+
+    # Rubric keyword matching (0 = exact substrings; n = keywords may carry up to n OCR edits)
+    RUBRIC_MAX_EDITS = int(os.getenv('RUBRIC_MAX_EDITS', 0))
+
+    # Compiled marking guides (cleaned answers, embeddings, rubric matchers; one manifest per test)
+    COMPILED_GUIDE_DIR = os.getenv('COMPILED_GUIDE_DIR', str(CACHE_DIR / 'guides'))
+
+    # Staged batch marking (OCR -> clean -> embed -> overlay threads joined by bounded queues)
+    MARKING_OCR_WORKERS = int(os.getenv('MARKING_OCR_WORKERS', 0))  # 0 = OCR pool size, else 1
+    MARKING_CLEAN_WORKERS = int(os.getenv('MARKING_CLEAN_WORKERS', 1))
+    MARKING_EMBED_BATCH_SIZE = int(os.getenv('MARKING_EMBED_BATCH_SIZE', 32))
+    MARKING_OVERLAY_WORKERS = int(os.getenv('MARKING_OVERLAY_WORKERS', 4))
+    MARKING_QUEUE_SIZE = int(os.getenv('MARKING_QUEUE_SIZE', 8))  # items held between two stages
+    # Submissions per Celery task
+    MARKING_TASK_CHUNK_SIZE = int(os.getenv('MARKING_TASK_CHUNK_SIZE', 32))
 
     # Celery config
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
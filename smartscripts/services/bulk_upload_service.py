@@ -2,7 +2,6 @@ import os
 import csv
 import re
 import zipfile
-from difflib import SequenceMatcher
 from werkzeug.utils import secure_filename
 from sqlalchemy.exc import SQLAlchemyError
 from flask import current_app, flash
@@ -14,10 +13,12 @@ from smartscripts.utils.file_helpers import (
     get_answer_dir, get_marking_guide_dir, get_rubric_dir,
     get_submission_dir, get_class_list_dir, get_combined_pdf_dir,
 )
-from smartscripts.ai.ocr_engine import extract_name_id_from_image
-from smartscripts.utils.pdf_helpers import convert_pdf_to_images, split_pdf_by_page_ranges
+from smartscripts.ai.ocr_engine import extract_name_id_from_images
+from smartscripts.utils.pdf_helpers import (
+    convert_pdf_to_images, iter_pdf_pages, split_pdf_by_page_ranges
+)
 from smartscripts.analytics.layout_detection import detect_front_pages_via_ocr
-from smartscripts.ai.text_matching import fuzzy_match_id, match_ocr_ids_to_class
+from smartscripts.ai.roster_assignment import assign_scripts_to_students
 
 
 # -------------------- Directory Setup --------------------
@@ -150,24 +151,11 @@ def zip_outputs(pdf_paths: list, attendance_csv_path: str, output_zip_path: str)
 
 # -------------------- Combined Script OCR & Matching --------------------
 
-def fuzzy_match_name(name: str, class_names: list, threshold: float = 0.8):
-    best_score = 0.0
-    best_match = ""
-    for cname in class_names:
-        score = SequenceMatcher(None, name.lower(), cname.lower()).ratio()
-        if score > best_score:
-            best_score = score
-            best_match = cname
-    return (best_match, best_score) if best_score >= threshold else ("", 0.0)
-
-
 def process_combined_student_scripts(pdf_path: str, class_list: list, output_dir: str = None):
-    class_ids = [s['student_id'] for s in class_list]
-    class_names = [s['name'] for s in class_list]
-
     temp_image_dir = os.path.join(output_dir, "temp_images")
-    image_paths = convert_pdf_to_images(pdf_path, temp_image_dir)
-    page_ranges = detect_front_pages_via_ocr(image_paths, extract_name_id_from_image)
+    # Render only (no test_id, so no per-page OCR); the cascade decides the front pages
+    image_paths, _ = convert_pdf_to_images(pdf_path, temp_image_dir)
+    page_ranges = detect_front_pages_via_ocr(image_paths)
     split_output_dir = os.path.join(output_dir, "student_scripts")
     split_paths = split_pdf_by_page_ranges(pdf_path, page_ranges, split_output_dir)
 
@@ -177,38 +165,34 @@ def process_combined_student_scripts(pdf_path: str, class_list: list, output_dir
     attendance = {"present": [], "absent": []}
     extracted_data = []
 
+    # Render only each script's cover page, then OCR them together in batches
+    cover_pages = []
     for pdf_file in split_paths:
-        page_images = convert_pdf_to_images(pdf_file, os.path.join(output_dir, "temp_single"))
-        if not page_images:
-            continue
-        ocr_result = extract_name_id_from_image(page_images[0])
-        extracted_data.append((pdf_file, ocr_result.get('id', ''), ocr_result.get('name', '')))
+        cover = next(iter_pdf_pages(pdf_file, dpi=200, read_ahead=0, last_page=1), None)
+        if cover is not None:
+            cover_pages.append((pdf_file, cover))
 
-    extracted_ids = [e[1] for e in extracted_data]
-    matched_ids, _ = match_ocr_ids_to_class(extracted_ids, class_list)
+    ocr_results = extract_name_id_from_images([image for _, image in cover_pages])
+    for (pdf_file, _), (ocr_name, ocr_id, _) in zip(cover_pages, ocr_results):
+        extracted_data.append((pdf_file, ocr_id, ocr_name))
 
-    for pdf_file, ocr_id, ocr_name in extracted_data:
-        matched_student = None
-        matched_by = ''
-        confidence = 0.0
+    # One global assignment over all scripts: ID match first, name as fallback,
+    # and no two scripts can claim the same student
+    assignments = assign_scripts_to_students(
+        [(ocr_id, ocr_name) for _, ocr_id, ocr_name in extracted_data], class_list
+    )
 
-        if ocr_id in matched_ids:
-            matched_student = next((s for s in class_list if s['student_id'] == ocr_id), None)
-            matched_by = 'id'
-            confidence = 1.0
-        else:
-            name_match, name_score = fuzzy_match_name(ocr_name, class_names)
-            if name_match:
-                matched_student = next((s for s in class_list if s['name'] == name_match), None)
-                matched_by = 'name'
-                confidence = name_score
+    for (pdf_file, ocr_id, ocr_name), assignment in zip(extracted_data, assignments):
+        matched_student = assignment['student']
 
         if matched_student:
             presence_table.append({
                 'student_id': matched_student['student_id'],
                 'student_name': matched_student['name'],
-                'matched_by': matched_by,
-                'confidence': confidence,
+                'matched_by': assignment['matched_by'],
+                'confidence': assignment['score'],
+                'id_score': assignment['id_score'],
+                'name_score': assignment['name_score'],
             })
             matched_student['script_path'] = pdf_file
             matched_files.append((matched_student, pdf_file))
@@ -277,15 +261,19 @@ def export_presence_csv(test_id: int, presence_table: list, class_list: list, ou
 
     with open(csv_path, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
-        writer.writerow(["student_id", "name", "status", "matched_by", "confidence"])
+        writer.writerow(["student_id", "name", "status", "matched_by", "confidence",
+                         "id_score", "name_score"])
         for student in class_list:
             sid = student.get("student_id", "")
             name = student.get("name", "")
             if sid in match_info:
                 entry = match_info[sid]
-                writer.writerow([sid, name, "Present", entry.get("matched_by", ""), round(entry.get("confidence", 0.0), 2)])
+                writer.writerow([sid, name, "Present", entry.get("matched_by", ""),
+                                 round(entry.get("confidence", 0.0), 2),
+                                 round(entry.get("id_score", 0.0), 2),
+                                 round(entry.get("name_score", 0.0), 2)])
             else:
-                writer.writerow([sid, name, "Absent", "", ""])
+                writer.writerow([sid, name, "Absent", "", "", "", ""])
     return csv_path
 
 
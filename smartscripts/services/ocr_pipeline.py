@@ -2,17 +2,16 @@ import os
 import csv
 import fitz  # PyMuPDF
 from uuid import uuid4
-from pdf2image import convert_from_path
 from werkzeug.utils import secure_filename
-from difflib import SequenceMatcher
 
 from flask import current_app, flash
 from sqlalchemy.exc import SQLAlchemyError
 
 from smartscripts.extensions import db
 from smartscripts.models import ExtractedStudentScript
-from smartscripts.ai.ocr_engine import extract_name_id_from_image
-from smartscripts.ai.text_matching import fuzzy_match_id  # ? ID matching
+from smartscripts.ai.ocr_engine import iter_name_id_from_images
+from smartscripts.utils.pdf_helpers import iter_pdf_pages, pdf_page_count
+from smartscripts.ai.roster_assignment import assign_scripts_to_students
 
 UPLOAD_DIR = os.path.join('smartscripts', 'app', 'static', 'uploads', 'extracted')
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -24,30 +23,26 @@ def process_combined_student_scripts(test_id, class_list_path, scripts_pdf_path)
     extracts individual scripts, performs OCR, and matches to students.
     """
     class_list = load_class_list(class_list_path)
-    class_ids = [s['id'] for s in class_list]
-    class_names = [s['name'] for s in class_list]
 
-    images = convert_from_path(scripts_pdf_path, dpi=300)
+    total_pages = pdf_page_count(scripts_pdf_path)
 
     current_script = None
     extracted_scripts = []
     attendance = {"present": [], "absent": []}
 
-    for i, image in enumerate(images):
-        name, student_id, confidence = extract_name_id_from_image(image)
-        matched = None
+    # Pages are rendered lazily and OCR'd in batches; only a bounded window is held in memory.
+    # The OCR'd (name, id) of every page is collected first so students are assigned globally.
+    ocr_results = list(iter_name_id_from_images(iter_pdf_pages(scripts_pdf_path)))
+    candidates = [i for i, (name, student_id, _) in enumerate(ocr_results) if name or student_id]
 
-        # Match by student ID
-        if student_id:
-            match_id, score = fuzzy_match_id(student_id, class_ids, threshold=0.85)
-            if match_id:
-                matched = next((s for s in class_list if s["id"] == match_id), None)
+    # One-to-one: ID match first, name as fallback, and a student starts at most one script
+    assignments = assign_scripts_to_students(
+        [(ocr_results[i][1], ocr_results[i][0]) for i in candidates], class_list, id_key="id"
+    )
+    matches = {i: assignment["student"] for i, assignment in zip(candidates, assignments)}
 
-        # Fallback match by name
-        if not matched and name:
-            match_name, score = fuzzy_match_name(name, class_names, threshold=0.8)
-            if match_name:
-                matched = next((s for s in class_list if s["name"] == match_name), None)
+    for i, (name, student_id, confidence) in enumerate(ocr_results):
+        matched = matches.get(i)
 
         if matched:
             attendance["present"].append(matched)
@@ -71,7 +66,7 @@ def process_combined_student_scripts(test_id, class_list_path, scripts_pdf_path)
     if current_script:
         script = split_pdf(
             scripts_pdf_path, test_id,
-            current_script['start'], len(images) - 1,
+            current_script['start'], total_pages - 1,
             current_script['matched']['name'], current_script['matched']['id']
         )
         extracted_scripts.append(script)
@@ -90,22 +85,6 @@ def process_combined_student_scripts(test_id, class_list_path, scripts_pdf_path)
     export_attendance_csv(attendance, UPLOAD_DIR)
 
 
-def fuzzy_match_name(name: str, class_names: list, threshold: float = 0.8):
-    """
-    Performs fuzzy matching of a name against a list of names.
-    """
-    best_score = 0.0
-    best_match = ""
-
-    for cname in class_names:
-        score = SequenceMatcher(None, name.lower(), cname.lower()).ratio()
-        if score > best_score:
-            best_score = score
-            best_match = cname
-
-    return (best_match, best_score) if best_score >= threshold else ("", 0.0)
-
-
 def load_class_list(path):
     """
     Loads a class list CSV or TXT. Expects either:
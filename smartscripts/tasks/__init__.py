@@ -1,12 +1,7 @@
 ﻿import os
-import re
-import tempfile
 from uuid import uuid4
 
 import fitz  # PyMuPDF
-from PIL import Image
-import pytesseract
-from pdf2image import convert_from_path
 from sqlalchemy.exc import SQLAlchemyError
 from flask import current_app, flash
 from werkzeug.utils import secure_filename
@@ -14,6 +9,9 @@ from werkzeug.utils import secure_filename
 from smartscripts.extensions import celery, db
 from smartscripts.models import Test, ExtractedStudentScript
 from smartscripts.services.ocr_pipeline import process_combined_student_scripts
+from smartscripts.utils.pdf_helpers import pdf_page_count
+# The parallel Tesseract / triage page reader (and the OCR pool's worker_ready hook) live there
+from smartscripts.tasks.ocr_tasks import PROGRESS_EVERY_PAGES, _front_page_fields, _iter_page_texts
 
 # Directory for saving extracted scripts
 UPLOAD_DIR = os.path.join('smartscripts', 'app', 'static', 'uploads', 'extracted')
@@ -50,54 +48,50 @@ def run_student_script_ocr_pipeline(test_id, class_list_path, scripts_pdf_path):
 
 def _process_pdf_with_ocr(task_self, test_id, pdf_path):
     try:
-        images = convert_from_path(pdf_path, dpi=300)
+        total_pages = pdf_page_count(pdf_path)
     except Exception as e:
         return f"Error converting PDF to images: {str(e)}"
 
-    total_pages = len(images)
     extracted_scripts = []
     current_script = {'start': 0, 'name': None, 'id': None}
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        for i, image in enumerate(images):
-            image_path = os.path.join(temp_dir, f"page_{i}.png")
-            image.save(image_path)
-
-            text = pytesseract.image_to_string(Image.open(image_path))
-
-            name_match = re.search(r'Name\s*[:\-]?\s*([\w\s]{2,})', text, re.IGNORECASE)
-            id_match = re.search(r'(ID|Student ID)\s*[:\-]?\s*(\d{4,})', text, re.IGNORECASE)
-
-            if name_match and id_match:
-                name = name_match.group(1).strip()
-                student_id = id_match.group(2).strip()
-
-                # If we already started another student's script, save it
-                if current_script['name'] and i != current_script['start']:
-                    script = split_pdf_and_create_script(
-                        pdf_path, test_id,
-                        current_script['start'], i - 1,
-                        current_script['name'], current_script['id']
-                    )
-                    extracted_scripts.append(script)
-
-                current_script = {'start': i, 'name': name, 'id': student_id}
-
-            # Progress update
+    page_strategies = []
+
+    # The native text layer is used where present; only the header band of
+    # image-only pages is rasterized and OCR'd, in parallel and in page order
+    for i, (plan, text) in enumerate(_iter_page_texts(pdf_path)):
+        page_strategies.append(plan['strategy'])
+
+        fields = _front_page_fields(text)
+        if fields:
+            name, student_id = fields
+
+            # If we already started another student's script, save it
+            if current_script['name'] and i != current_script['start']:
+                script = split_pdf_and_create_script(
+                    pdf_path, test_id,
+                    current_script['start'], i - 1,
+                    current_script['name'], current_script['id']
+                )
+                extracted_scripts.append(script)
+
+            current_script = {'start': i, 'name': name, 'id': student_id}
+
+        # Progress update, throttled to one backend write per batch of pages
+        if (i + 1) % PROGRESS_EVERY_PAGES == 0 or i + 1 == total_pages:
             progress = int((i + 1) / total_pages * 100)
             task_self.update_state(
                 state='PROGRESS',
                 meta={'current': i + 1, 'total': total_pages, 'progress': progress}
             )
 
-        # Save the last student script
-        if current_script['name']:
-            script = split_pdf_and_create_script(
-                pdf_path, test_id,
-                current_script['start'], total_pages - 1,
-                current_script['name'], current_script['id']
-            )
-            extracted_scripts.append(script)
+    # Save the last student script
+    if current_script['name']:
+        script = split_pdf_and_create_script(
+            pdf_path, test_id,
+            current_script['start'], total_pages - 1,
+            current_script['name'], current_script['id']
+        )
+        extracted_scripts.append(script)
 
     # Save to database
     for s in extracted_scripts:
@@ -116,7 +110,8 @@ def _process_pdf_with_ocr(task_self, test_id, pdf_path):
 
     return {
         'state': 'SUCCESS',
-        'message': f"OCR complete: {len(extracted_scripts)} student scripts extracted."
+        'message': f"OCR complete: {len(extracted_scripts)} student scripts extracted.",
+        'page_strategies': page_strategies
     }
 
 
@@ -1,24 +1,35 @@
 import os
 import re
-import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from uuid import uuid4
 
 import fitz  # PyMuPDF
-from PIL import Image
 import pytesseract
-from pdf2image import convert_from_path
+from celery.signals import worker_ready
 from sqlalchemy.exc import SQLAlchemyError
 from flask import current_app, flash
 from werkzeug.utils import secure_filename
 
+from smartscripts.config import BaseConfig
 from smartscripts.extensions import celery, db
 from smartscripts.models import Test, ExtractedStudentScript
+from smartscripts.ai.compiled_guide import import_uploaded_guide
+from smartscripts.ai.ocr_pool import start_ocr_pool_for_worker
+from smartscripts.ai.page_triage import TRIAGE_BLANK, TRIAGE_DUPLICATE, new_page_triage
 from smartscripts.services.ocr_pipeline import process_combined_student_scripts
+from smartscripts.utils.pdf_helpers import PAGE_STRATEGY_OCR, iter_pdf_page_plans, pdf_page_count
 
 # Directory for saving extracted scripts
 UPLOAD_DIR = os.path.join('smartscripts', 'app', 'static', 'uploads', 'extracted')
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Celery progress is reported once per this many pages instead of per page
+PROGRESS_EVERY_PAGES = 20
+
+# Threads/solo workers start the shared OCR pool as they come up (see ocr_pool)
+worker_ready.connect(start_ocr_pool_for_worker)
+
 
 @celery.task(bind=True)
 def run_ocr_on_test(self, test_id):
@@ -48,56 +59,145 @@ def run_student_script_ocr_pipeline(test_id, class_list_path, scripts_pdf_path):
     process_combined_student_scripts(test_id, class_list_path, scripts_pdf_path)
 
 
-def _process_pdf_with_ocr(task_self, test_id, pdf_path):
-    try:
-        images = convert_from_path(pdf_path, dpi=300)
-    except Exception as e:
-        return f"Error converting PDF to images: {str(e)}"
+@celery.task
+def import_uploaded_guide_task(test_id, upload_path):
+    """
+    Read an uploaded marking guide (text layer, OCR for scanned pages) and
+    compile it, outside the upload request.
+    """
+    guide = import_uploaded_guide(test_id, upload_path)
+    if guide is None:
+        return {
+            'state': 'FAILURE',
+            'message': f"No text could be read from the marking guide for test {test_id}."
+        }
+    return {
+        'state': 'SUCCESS',
+        'message': f"Marking guide compiled for test {test_id} (version {guide.version})."
+    }
 
-    total_pages = len(images)
-    extracted_scripts = []
-    current_script = {'start': 0, 'name': None, 'id': None}
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        for i, image in enumerate(images):
-            image_path = os.path.join(temp_dir, f"page_{i}.png")
-            image.save(image_path)
+def _page_text_with_tesseract(plan):
+    """Text layer for text/hybrid pages plus Tesseract on whatever was rasterized."""
+    parts = [] if plan['strategy'] == PAGE_STRATEGY_OCR else [plan['text_layer']]
+    # Rendered pages go straight to Tesseract; no temp PNG round-trip
+    parts.extend(
+        pytesseract.image_to_string(image, config=BaseConfig.TESSERACT_HEADER_CONFIG)
+        for image in plan['images']
+    )
+    return "\n".join(part for part in parts if part)
+
 
-            text = pytesseract.image_to_string(Image.open(image_path))
+def _front_page_fields(text):
+    """(name, student_id) when a page's text carries both, else None."""
+    name_match = re.search(r'Name\s*[:\-]?\s*([\w\s]{2,})', text, re.IGNORECASE)
+    id_match = re.search(r'(ID|Student ID)\s*[:\-]?\s*(\d{4,})', text, re.IGNORECASE)
+    if name_match and id_match:
+        return name_match.group(1).strip(), id_match.group(2).strip()
+    return None
 
-            name_match = re.search(r'Name\s*[:\-]?\s*([\w\s]{2,})', text, re.IGNORECASE)
-            id_match = re.search(r'(ID|Student ID)\s*[:\-]?\s*(\d{4,})', text, re.IGNORECASE)
 
-            if name_match and id_match:
-                name = name_match.group(1).strip()
-                student_id = id_match.group(2).strip()
+def _skipped_page_text():
+    """An already-finished future with no text, for pages triage lets skip Tesseract."""
+    future = Future()
+    future.set_result("")
+    return future
 
-                # If we already started another student's script, save it
-                if current_script['name'] and i != current_script['start']:
-                    script = split_pdf_and_create_script(
-                        pdf_path, test_id,
-                        current_script['start'], i - 1,
-                        current_script['name'], current_script['id']
-                    )
-                    extracted_scripts.append(script)
 
-                current_script = {'start': i, 'name': name, 'id': student_id}
+def _iter_page_texts(pdf_path):
+    """
+    Yield (plan, text) in page order with Tesseract running on several pages at once.
+
+    pytesseract runs each page in its own tesseract process, so a thread pool
+    is enough to keep every core busy, and unlike a process pool it also works
+    inside daemonic Celery prefork workers. Only the header band of scanned
+    pages is rendered, and at most two pages per worker are in flight.
+
+    Scanned pages are triaged first (see page_triage): blank header bands and
+    repeats of the previous header (double-feeds, whose name/ID was already
+    read from the original) skip Tesseract and yield empty text, so a repeated
+    sheet never starts another script. Both are reported via plan['strategy'].
+    A repeat of a header that carries a name and ID is read anyway: it may be
+    the next student's cover sheet (same template, different handwriting).
+    """
+    workers = BaseConfig.TESSERACT_WORKERS or os.cpu_count() or 1
+    # One thread per tesseract process; parallelism comes from the pool, not OpenMP
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+    plans = iter_pdf_page_plans(pdf_path, top_fraction=BaseConfig.HEADER_ROI_BAND)
+    triage = new_page_triage()
+    in_flight = deque()
+    previous = None  # (page, future) of the last page read with Tesseract
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tesseract') as executor:
+        for plan in plans:
+            decision = None
+            if triage and plan['strategy'] == PAGE_STRATEGY_OCR and len(plan['images']) == 1:
+                decision = triage.triage(plan['images'][0], plan['page'])
+            if decision and decision['triage'] == TRIAGE_DUPLICATE:
+                if previous is None or previous[0] != decision['duplicate_of'] or \
+                        _front_page_fields(previous[1].result()):
+                    triage.overrule(decision)
+            if decision and decision['triage'] in (TRIAGE_BLANK, TRIAGE_DUPLICATE):
+                plan.update(strategy=decision['triage'], images=[])
+                future = _skipped_page_text()
+            else:
+                future = executor.submit(_page_text_with_tesseract, plan)
+                previous = (plan['page'], future)
+            in_flight.append((plan, future))
+            if len(in_flight) >= workers * 2:
+                plan, future = in_flight.popleft()
+                yield plan, future.result()
+        while in_flight:
+            plan, future = in_flight.popleft()
+            yield plan, future.result()
 
-            # Progress update
+
+def _process_pdf_with_ocr(task_self, test_id, pdf_path):
+    try:
+        total_pages = pdf_page_count(pdf_path)
+    except Exception as e:
+        return f"Error converting PDF to images: {str(e)}"
+
+    extracted_scripts = []
+    current_script = {'start': 0, 'name': None, 'id': None}
+    page_strategies = []
+
+    # The native text layer is used where present; only the header band of
+    # image-only pages is rasterized and OCR'd, in parallel and in page order
+    for i, (plan, text) in enumerate(_iter_page_texts(pdf_path)):
+        page_strategies.append(plan['strategy'])
+
+        fields = _front_page_fields(text)
+        if fields:
+            name, student_id = fields
+
+            # If we already started another student's script, save it
+            if current_script['name'] and i != current_script['start']:
+                script = split_pdf_and_create_script(
+                    pdf_path, test_id,
+                    current_script['start'], i - 1,
+                    current_script['name'], current_script['id']
+                )
+                extracted_scripts.append(script)
+
+            current_script = {'start': i, 'name': name, 'id': student_id}
+
+        # Progress update, throttled to one backend write per batch of pages
+        if (i + 1) % PROGRESS_EVERY_PAGES == 0 or i + 1 == total_pages:
             progress = int((i + 1) / total_pages * 100)
             task_self.update_state(
                 state='PROGRESS',
                 meta={'current': i + 1, 'total': total_pages, 'progress': progress}
             )
 
-        # Save the last student script
-        if current_script['name']:
-            script = split_pdf_and_create_script(
-                pdf_path, test_id,
-                current_script['start'], total_pages - 1,
-                current_script['name'], current_script['id']
-            )
-            extracted_scripts.append(script)
+    # Save the last student script
+    if current_script['name']:
+        script = split_pdf_and_create_script(
+            pdf_path, test_id,
+            current_script['start'], total_pages - 1,
+            current_script['name'], current_script['id']
+        )
+        extracted_scripts.append(script)
 
     # Save to database
     for s in extracted_scripts:
@@ -116,7 +216,8 @@ def _process_pdf_with_ocr(task_self, test_id, pdf_path):
 
     return {
         'state': 'SUCCESS',
-        'message': f"OCR complete: {len(extracted_scripts)} student scripts extracted."
+        'message': f"OCR complete: {len(extracted_scripts)} student scripts extracted.",
+        'page_strategies': page_strategies
     }
 
 
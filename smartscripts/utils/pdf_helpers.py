@@ -1,23 +1,189 @@
 import os
 import json
+import queue
 import zipfile
+import threading
 from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
 from flask import current_app
 
 import fitz  # PyMuPDF
-from pdf2image import convert_from_path
 from PIL import Image, ImageDraw
 from fpdf import FPDF
 
-from smartscripts.analytics.layout_detection import detect_front_pages_via_ocr
-from smartscripts.ai.ocr_engine import (
-    extract_text_lines_from_image,
-    score_front_page,
-    is_probable_front_page
-)
+from smartscripts.config import BaseConfig
+
+# Streaming rasterization: pages are rendered one at a time with PyMuPDF, with at
+# most `read_ahead` pages rendered ahead of the consumer, so memory stays flat
+# regardless of how many pages the PDF has.
+PDF_RENDER_DPI = 300
+
+# Per-page extraction strategies (see classify_pdf_page)
+PAGE_STRATEGY_TEXT = "text"      # native text layer only, no OCR
+PAGE_STRATEGY_OCR = "ocr"        # image-only or scanned page, OCR the whole page
+PAGE_STRATEGY_HYBRID = "hybrid"  # text layer plus OCR of the embedded image regions
+
+# Embedded images smaller than this share of the page (logos, icons) are ignored
+MIN_IMAGE_REGION_FRACTION = 0.02
+
+# Front-page score at which a page is at least "Needs Review" (a script split candidate)
+FRONT_PAGE_REVIEW_SCORE = 0.6
+
+def pdf_page_count(pdf_path) -> int:
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+def render_pdf_page(page: "fitz.Page", dpi: int = PDF_RENDER_DPI,
+                    clip: Optional["fitz.Rect"] = None) -> Image.Image:
+    """Render a single PyMuPDF page (or the `clip` region of it) to an RGB PIL image."""
+    pix = page.get_pixmap(dpi=dpi, clip=clip, alpha=False)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+def _page_range(doc, first_page: int, last_page: Optional[int]) -> range:
+    last = doc.page_count if last_page is None else min(last_page, doc.page_count)
+    return range(first_page - 1, last)
+
+def _render_pages(pdf_path, dpi: int, first_page: int,
+                  last_page: Optional[int]) -> Iterator[Image.Image]:
+    with fitz.open(pdf_path) as doc:
+        for page_num in _page_range(doc, first_page, last_page):
+            yield render_pdf_page(doc.load_page(page_num), dpi=dpi)
+
+def _read_ahead(items: Iterator, read_ahead: int) -> Iterator:
+    """
+    Drive `items` from a background thread, keeping at most `read_ahead`
+    results queued ahead of the consumer. Producer exceptions are re-raised
+    in the consumer; closing the generator stops the producer.
+    """
+    if read_ahead <= 0:
+        yield from items
+        return
+
+    pending: queue.Queue = queue.Queue(maxsize=read_ahead)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except Exception as e:  # surfaced to the consumer
+            put(e)
+            return
+        put(done)
+
+    worker = threading.Thread(target=producer, name="pdf-read-ahead", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        worker.join(timeout=5)
+
+def iter_pdf_pages(pdf_path, dpi: int = PDF_RENDER_DPI, read_ahead: Optional[int] = None,
+                   first_page: int = 1, last_page: Optional[int] = None) -> Iterator[Image.Image]:
+    """
+    Lazily yield the pages of a PDF as PIL images (1-based, inclusive page range).
+
+    With `read_ahead` > 0 a background thread renders up to that many pages
+    ahead of the consumer through a bounded queue; with 0 pages are rendered
+    on demand. Defaults to BaseConfig.PDF_READ_AHEAD.
+    """
+    read_ahead = BaseConfig.PDF_READ_AHEAD if read_ahead is None else read_ahead
+    yield from _read_ahead(_render_pages(pdf_path, dpi, first_page, last_page), read_ahead)
+
+# Text-layer fast path
+def classify_pdf_page(page: "fitz.Page", min_text_chars: Optional[int] = None,
+                      scan_coverage: Optional[float] = None) -> Tuple[str, str, List["fitz.Rect"]]:
+    """
+    Pick an extraction strategy for one page from its text layer and embedded images.
+
+    Returns (strategy, text_layer, image_regions):
+      - "ocr":    fewer than `min_text_chars` of native text, or images cover at
+                  least `scan_coverage` of the page (a scan, possibly with an
+                  invisible OCR layer that misses handwriting)
+      - "hybrid": native text plus embedded images worth reading; only the
+                  image regions are OCR'd
+      - "text":   native text only, OCR is skipped entirely
+    """
+    min_text_chars = BaseConfig.PDF_TEXT_MIN_CHARS if min_text_chars is None else min_text_chars
+    scan_coverage = BaseConfig.PDF_SCAN_COVERAGE if scan_coverage is None else scan_coverage
+
+    text = page.get_text().strip()
+    page_rect = page.rect
+    page_area = abs(page_rect) or 1.0
+
+    regions = []
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & page_rect
+        if not rect.is_empty and abs(rect) / page_area >= MIN_IMAGE_REGION_FRACTION:
+            regions.append(rect)
+    coverage = min(1.0, sum(abs(rect) for rect in regions) / page_area)
+
+    if len(text) < min_text_chars or coverage >= scan_coverage:
+        return PAGE_STRATEGY_OCR, text, []
+    if regions:
+        return PAGE_STRATEGY_HYBRID, text, regions
+    return PAGE_STRATEGY_TEXT, text, []
+
+def _plan_pages(pdf_path, dpi: int, first_page: int, last_page: Optional[int],
+                min_text_chars: Optional[int], scan_coverage: Optional[float],
+                top_fraction: Optional[float]) -> Iterator[dict]:
+    with fitz.open(pdf_path) as doc:
+        for page_num in _page_range(doc, first_page, last_page):
+            page = doc.load_page(page_num)
+            strategy, text, regions = classify_pdf_page(page, min_text_chars, scan_coverage)
+            if strategy == PAGE_STRATEGY_OCR:
+                clip = None
+                if top_fraction:
+                    rect = page.rect
+                    clip = fitz.Rect(rect.x0, rect.y0, rect.x1,
+                                     rect.y0 + rect.height * top_fraction)
+                images = [render_pdf_page(page, dpi=dpi, clip=clip)]
+            else:
+                images = [render_pdf_page(page, dpi=dpi, clip=rect) for rect in regions]
+            yield {"page": page_num + 1, "strategy": strategy, "text_layer": text, "images": images}
+
+def iter_pdf_page_plans(pdf_path, dpi: int = PDF_RENDER_DPI, read_ahead: Optional[int] = None,
+                        first_page: int = 1, last_page: Optional[int] = None,
+                        min_text_chars: Optional[int] = None,
+                        scan_coverage: Optional[float] = None,
+                        top_fraction: Optional[float] = None) -> Iterator[dict]:
+    """
+    Lazily yield one extraction plan per page:
+        {"page": 1-based number, "strategy": "text" | "ocr" | "hybrid",
+         "text_layer": native text, "images": PIL images that still need OCR}
+    Only what needs OCR is rasterized: nothing for "text" pages, the whole page
+    for "ocr" pages (only its top `top_fraction` when given, e.g. the header
+    band of cover sheets) and just the image regions for "hybrid" pages.
+    """
+    read_ahead = BaseConfig.PDF_READ_AHEAD if read_ahead is None else read_ahead
+    plans = _plan_pages(pdf_path, dpi, first_page, last_page, min_text_chars, scan_coverage,
+                        top_fraction)
+    yield from _read_ahead(plans, read_ahead)
 
 # Utility: Check if a given image is likely a front page
 def is_page_front_page(image_path: str) -> bool:
+    from smartscripts.ai.ocr_engine import (
+        extract_text_lines_from_image, is_probable_front_page, score_front_page
+    )
+
     lines = extract_text_lines_from_image(image_path)
     text = "\n".join(lines)
     score = score_front_page(text, lines)
@@ -29,28 +195,54 @@ def convert_pdf_to_images(pdf_path, output_folder, test_id=None, detect_front_pa
     Converts PDF to PNG images in the output_folder.
     Optionally detects front pages and returns split page ranges.
 
+    Pages are OCR'd and scored for the front-page metadata only when `test_id`
+    is given; without it pages are just rendered and ([paths], []) returned.
+    Blank pages are not OCR'd and near-identical duplicates (double-feeds)
+    reuse the score of the page they repeat; the triage decision is recorded
+    per page in the metadata JSON. A duplicate never starts a new script, and
+    a repeat of a front-page candidate is always OCR'd rather than reused.
+
     Returns:
         tuple: (list of image paths, list of (start, end) page ranges)
     """
-    poppler_path = r"C:\\Users\\ALEX\\Downloads\\poppler-24.08.0\\Library\\bin"
-    images = convert_from_path(pdf_path, poppler_path=poppler_path)
+    from smartscripts.ai.ocr_engine import extract_text_lines_from_image, score_front_page
+    from smartscripts.ai.page_triage import TRIAGE_BLANK, TRIAGE_DUPLICATE, new_page_triage
+
     image_paths = []
     split_metadata = []
+    scores = {}
+    score_pages = bool(test_id)
+    triage = new_page_triage() if score_pages else None
 
     os.makedirs(output_folder, exist_ok=True)
 
-    for i, img in enumerate(images):
+    # Pages are rendered one at a time; only the current page is held in memory
+    for i, img in enumerate(iter_pdf_pages(pdf_path, dpi=200)):
         img_path = os.path.join(output_folder, f"{Path(pdf_path).stem}_page_{i + 1}.png")
         img.save(img_path, 'PNG')
         image_paths.append(img_path)
+        if not score_pages:
+            continue
 
-        lines = extract_text_lines_from_image(img_path)
-        text = "\n".join(lines)
-        score = score_front_page(text, lines)
+        decision = triage.triage(img, i + 1) if triage else {"triage": "ocr", "duplicate_of": None}
+        if (decision["triage"] == TRIAGE_DUPLICATE
+                and scores[decision["duplicate_of"]] >= FRONT_PAGE_REVIEW_SCORE):
+            # The original is a front-page candidate: this may be the next student's cover sheet
+            triage.overrule(decision)
+        if decision["triage"] == TRIAGE_BLANK:
+            score = 0.0
+        elif decision["triage"] == TRIAGE_DUPLICATE:
+            score = scores[decision["duplicate_of"]]
+        else:
+            # OCR the in-memory page, not the PNG just written
+            lines = extract_text_lines_from_image(img)
+            text = "\n".join(lines)
+            score = score_front_page(text, lines)
+        scores[i + 1] = score
 
         if score >= 0.9:
             status = "? Confident"
-        elif score >= 0.6:
+        elif score >= FRONT_PAGE_REVIEW_SCORE:
             status = "?? Needs Review"
         else:
             status = "? Not Front Page"
@@ -59,9 +251,16 @@ def convert_pdf_to_images(pdf_path, output_folder, test_id=None, detect_front_pa
             "page_number": i + 1,
             "confidence": round(score, 2),
             "status": status,
-            "image_path": img_path
+            "image_path": img_path,
+            "triage": decision["triage"],
+            "duplicate_of": decision["duplicate_of"],
+            "ink_ratio": decision.get("ink_ratio"),
+            "phash": decision.get("phash"),
         })
 
+    if triage:
+        print(f"[INFO] Page triage: {triage.counts}")
+
     # Save front page metadata
     if test_id:
         meta_path = os.path.join(output_folder, f"{test_id}_frontpage_status.json")
@@ -74,6 +273,7 @@ def convert_pdf_to_images(pdf_path, output_folder, test_id=None, detect_front_pa
         front_page_indices = [
             i for i, meta in enumerate(split_metadata)
             if meta["status"] in ("? Confident", "?? Needs Review")
+            and meta["triage"] != TRIAGE_DUPLICATE
         ]
         for i in range(len(front_page_indices)):
             start = front_page_indices[i] + 1
@@ -0,0 +1,188 @@
+"""
+Staged concurrent pipeline.
+
+Items flow through a chain of stages connected by bounded queues. Each stage
+has its own number of worker threads and, optionally, a batch size (the
+stage function then receives a list of items and returns a list of results).
+A full queue blocks the stage feeding it, so a slow stage throttles the ones
+upstream instead of letting work pile up in memory (backpressure).
+
+The last step, `sink`, runs in the calling thread, for work that must stay on
+it (e.g. database writes inside a Flask app context / SQLAlchemy session).
+
+An item whose stage raises is not passed to later stages; its exception is
+returned in its result slot. Per-stage timings are collected as it runs:
+
+    pipeline = StagedPipeline([Stage("ocr", ocr, workers=4), Stage("embed", embed, batch_size=32)],
+                              sink=persist)
+    results = pipeline.run(items)  # [(value, error), ...] in input order
+    pipeline.stats                 # {"ocr": {"items", "busy", "blocked", ...}, ..., "wall": s}
+"""
+
+import time
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+_STOP = object()
+
+
+class Stage:
+    """One pipeline step: `func(item)`, or `func(list_of_items)` when `batch_size` > 1."""
+
+    def __init__(self, name: str, func: Callable, workers: int = 1, batch_size: int = 1,
+                 queue_size: Optional[int] = None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = queue_size
+
+
+class _Envelope:
+    __slots__ = ("index", "value", "error")
+
+    def __init__(self, index: int, value: Any):
+        self.index = index
+        self.value = value
+        self.error: Optional[BaseException] = None
+
+
+class StagedPipeline:
+    def __init__(self, stages: List[Stage], sink: Optional[Callable] = None, queue_size: int = 8):
+        self.stages = stages
+        self.sink = sink
+        self.queue_size = max(1, queue_size)
+        self.stats: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, name: str, items: int = 0, busy: float = 0.0, blocked: float = 0.0):
+        with self._lock:
+            entry = self.stats[name]
+            entry["items"] += items
+            entry["busy"] += busy
+            entry["blocked"] += blocked
+
+    def _put(self, name: str, out: queue.Queue, item):
+        started = time.perf_counter()
+        out.put(item)
+        self._record(name, blocked=time.perf_counter() - started)
+
+    def _process(self, stage: Stage, batch: List[_Envelope]):
+        live = [envelope for envelope in batch if envelope.error is None]
+        if not live:
+            return
+        started = time.perf_counter()
+        try:
+            if stage.batch_size > 1:
+                values = stage.func([envelope.value for envelope in live])
+                for envelope, value in zip(live, values):
+                    envelope.value = value
+            else:
+                live[0].value = stage.func(live[0].value)
+        except Exception as e:
+            for envelope in live:
+                envelope.error = e
+        self._record(stage.name, items=len(live), busy=time.perf_counter() - started)
+
+    def _worker(self, stage: Stage, inbox: queue.Queue, out: queue.Queue, remaining: List[int]):
+        while True:
+            item = inbox.get()
+            stopping = item is _STOP
+            batch = [] if stopping else [item]
+            while not stopping and len(batch) < stage.batch_size:
+                try:
+                    item = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                self._process(stage, batch)
+                for envelope in batch:
+                    self._put(stage.name, out, envelope)
+
+            if stopping:
+                with self._lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    out.put(_STOP)
+                else:
+                    inbox.put(_STOP)  # let a sibling worker see it too
+                return
+
+    def run(self, items: Iterable) -> List[Tuple[Any, Optional[BaseException]]]:
+        """Push `items` through every stage and the sink; one (value, error) per item, in order."""
+        self.stats = {
+            stage.name: {"items": 0, "busy": 0.0, "blocked": 0.0, "workers": stage.workers}
+            for stage in self.stages
+        }
+        self.stats["feed"] = {"items": 0, "busy": 0.0, "blocked": 0.0, "workers": 1}
+        if self.sink is not None:
+            self.stats["sink"] = {"items": 0, "busy": 0.0, "blocked": 0.0, "workers": 1}
+        started = time.perf_counter()
+
+        queues = [queue.Queue(maxsize=stage.queue_size or self.queue_size) for stage in self.stages]
+        queues.append(queue.Queue(maxsize=self.queue_size))
+        threads = []
+        for position, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(stage, queues[position], queues[position + 1], remaining),
+                    name=f"pipeline-{stage.name}-{n}", daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        def feed():
+            count = 0
+            try:
+                for count, value in enumerate(items, start=1):
+                    self._put("feed", queues[0], _Envelope(count - 1, value))
+            finally:
+                self._record("feed", items=count)
+                queues[0].put(_STOP)
+
+        feeder = threading.Thread(target=feed, name="pipeline-feed", daemon=True)
+        feeder.start()
+
+        finished: List[_Envelope] = []
+        while True:
+            envelope = queues[-1].get()
+            if envelope is _STOP:
+                break
+            if self.sink is not None and envelope.error is None:
+                sink_started = time.perf_counter()
+                try:
+                    envelope.value = self.sink(envelope.value)
+                except Exception as e:
+                    envelope.error = e
+                self._record("sink", items=1, busy=time.perf_counter() - sink_started)
+            finished.append(envelope)
+
+        feeder.join()
+        for thread in threads:
+            thread.join()
+        self.stats["wall"] = time.perf_counter() - started
+        finished.sort(key=lambda envelope: envelope.index)
+        return [(envelope.value, envelope.error) for envelope in finished]
+
+    def report(self) -> str:
+        """
+        One line per stage: items, busy seconds (summed over workers) and
+        seconds blocked on a full queue.
+        """
+        lines = []
+        for name, entry in self.stats.items():
+            if name == "wall":
+                continue
+            lines.append(f"{name}: {entry['items']} item(s), {entry['workers']} worker(s), "
+                         f"busy {entry['busy']:.2f}s, blocked {entry['blocked']:.2f}s")
+        lines.append(f"wall: {self.stats.get('wall', 0.0):.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+import pytest
+
+from smartscripts.ai import embedding_cache
+from smartscripts.config import BaseConfig
+
+# text_matching and question_alignment refuse to import without a key; nothing here calls the API
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+
+class FakeModel:
+    """Stand-in sentence encoder: `vectorize(text)` gives a text's vector; calls are recorded."""
+
+    def __init__(self):
+        self.vectorize = lambda text: [len(text), text.count("o"), 1.0]
+        self.calls = 0
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        self.encoded.extend(texts)
+        return np.array([self.vectorize(text) for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def fake_model(monkeypatch, tmp_path):
+    """A FakeModel behind embedding_cache, with an empty cache and a store under tmp_path."""
+    model = FakeModel()
+    monkeypatch.setattr(embedding_cache, "get_embedding_model", lambda: model)
+    monkeypatch.setattr(BaseConfig, "EMBEDDING_CACHE_ENABLED", True)
+    monkeypatch.setattr(BaseConfig, "EMBEDDING_STORE_DIR", str(tmp_path / "embeddings"))
+    embedding_cache.clear_embedding_cache()
+    yield model
+    embedding_cache.clear_embedding_cache()
@@ -0,0 +1,61 @@
+import pytest
+
+from smartscripts.ai import scoring, text_matching
+
+VECTORS = {
+    "plants make food from light": [1.0, 0.0, 0.0],
+    "photosynthesis uses light to make food": [0.9, 0.1, 0.0],
+    "water moves by osmosis": [0.0, 1.0, 0.0],
+}
+
+
+@pytest.fixture
+def model(fake_model):
+    fake_model.vectorize = lambda text: VECTORS.get(text, [0.0, 0.0, 1.0])
+    return fake_model
+
+
+def test_match_answer_picks_best_expected_with_one_encode(model):
+    match, score = text_matching.match_answer(
+        "plants make food from light",
+        ["water moves by osmosis", "photosynthesis uses light to make food", ""],
+    )
+
+    assert match == "photosynthesis uses light to make food"
+    assert 0.99 < score <= 1.0
+    assert model.calls == 1
+
+
+def test_evaluate_question_uses_best_similarity(model, monkeypatch):
+    monkeypatch.setattr(scoring, "clean_text", lambda text: text.strip())
+
+    result = scoring.evaluate_question(
+        "plants make food from light",
+        ["water moves by osmosis", "plants make food from light"],
+        rubric_keywords=[],
+        max_marks=2.0,
+    )
+
+    assert result["similarity"] == 1.0
+    assert result["score"] == 2.0
+
+
+def test_grade_class_matches_single_submission_grading(model, monkeypatch):
+    monkeypatch.setattr(scoring, "clean_text", lambda text: text.strip())
+    guide = [
+        {"id": "q1", "answers": ["plants make food from light"], "max_marks": 2.0},
+        {"id": "q2", "answers": ["water moves by osmosis"],
+         "rubric": [{"keyword": "osmosis", "weight": 1.0}]},
+    ]
+    class_answers = {
+        "s1": ["photosynthesis uses light to make food", "water moves by osmosis"],
+        "s2": ["water moves by osmosis", ""],
+        "s3": ["photosynthesis uses light to make food", "no idea"],
+    }
+
+    graded = scoring.grade_class_using_guide(class_answers, guide)
+    calls_for_class = model.calls
+
+    for key, answers in class_answers.items():
+        assert graded[key] == scoring.grade_submission_using_guide(answers, guide)
+    assert calls_for_class <= 2 * len(guide)
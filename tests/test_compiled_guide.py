@@ -0,0 +1,129 @@
+import json
+import os
+import types
+
+import numpy as np
+import pytest
+
+from smartscripts.ai import compiled_guide, embedding_cache, scoring
+from smartscripts.config import BaseConfig
+
+GUIDE = [
+    {"id": "q1", "question": "What do plants make?", "answers": ["plants  make food  from light "],
+     "rubric": [], "max_marks": 2.0},
+    {"id": "q2", "question": "How does water move?", "answers": ["water moves by osmosis", ""],
+     "rubric": [{"keyword": "osmosis", "weight": 1.0, "explanation": "names osmosis"}],
+     "max_marks": 1.0},
+]
+
+
+@pytest.fixture
+def model(fake_model, tmp_path, monkeypatch):
+    """The fake encoder plus guide 5's sources, with tmp_path as the working directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(BaseConfig, "COMPILED_GUIDE_DIR", str(tmp_path / "compiled"))
+    compiled_guide._compiled.clear()
+
+    os.makedirs("uploads/guides/5")
+    with open("uploads/guides/5/guide.txt", "w", encoding="utf-8") as f:
+        f.write("Plants make food from light.")
+    with open("uploads/guides/5/guide.json", "w", encoding="utf-8") as f:
+        json.dump(GUIDE, f)
+    return fake_model
+
+
+def test_guide_is_compiled_once_and_reloaded_from_disk(model):
+
+    guide = compiled_guide.get_compiled_guide(5)
+    assert compiled_guide.get_compiled_guide(5) is guide
+    assert guide.answer_vectors(1).shape == (2, 3)
+    encoded = len(model.encoded)
+
+    # A restarted worker: nothing in memory, manifest and vectors on disk
+    compiled_guide._compiled.clear()
+    embedding_cache.clear_embedding_cache()
+    reloaded = compiled_guide.get_compiled_guide(5)
+
+    assert reloaded.version == guide.version
+    assert len(model.encoded) == encoded
+    assert np.array_equal(reloaded.expected_vector, guide.expected_vector)
+
+
+def test_edited_guide_is_recompiled(model):
+    guide = compiled_guide.get_compiled_guide(5)
+
+    with open("uploads/guides/5/guide.txt", "w", encoding="utf-8") as f:
+        f.write("Plants make sugar from sunlight.")
+
+    edited = compiled_guide.get_compiled_guide(5)
+    assert edited.version != guide.version
+    assert edited.expected_text == "Plants make sugar from sunlight."
+
+
+def test_grading_with_a_compiled_guide_matches_the_plain_guide(model):
+    guide = compiled_guide.get_compiled_guide(5)
+    class_answers = {"a": ["plants make food from light", "by osmosis"], "b": ["", "it diffuses"]}
+
+    assert scoring.grade_class_using_guide(class_answers, guide) == \
+        scoring.grade_class_using_guide(class_answers, GUIDE)
+    result = scoring.grade_submission_using_guide(class_answers["a"], guide)
+    assert result == scoring.grade_submission_using_guide(class_answers["a"], GUIDE)
+    # Reported as written in the guide; only matching uses the cleaned answers
+    assert result["per_question"][0]["expected_answers"] == GUIDE[0]["answers"]
+    assert guide.items[0]["clean_answers"] == ["plants make food from light"]
+
+
+def test_uploaded_guide_is_compiled_before_grading(model, tmp_path, monkeypatch):
+    # Reading the PDF itself needs PyMuPDF/OCR; the upload path from there on is real
+    monkeypatch.setattr(compiled_guide, "_uploaded_guide_text", lambda path: "Osmosis moves water.")
+
+    guide = compiled_guide.import_uploaded_guide(9, str(tmp_path / "marking_guide.pdf"))
+    encoded = len(model.encoded)
+
+    with open("uploads/guides/9/guide.txt", encoding="utf-8") as f:
+        assert f.read() == "Osmosis moves water."
+    assert guide is not None and encoded == 1
+    assert compiled_guide.get_compiled_guide(9) is guide
+    assert len(model.encoded) == encoded
+
+
+def test_deleted_or_unreadable_upload_leaves_no_guide(model, tmp_path, monkeypatch):
+    monkeypatch.setattr(compiled_guide, "_uploaded_guide_text", lambda path: "Osmosis moves water.")
+    compiled_guide.import_uploaded_guide(9, str(tmp_path / "marking_guide.pdf"))
+
+    compiled_guide.delete_compiled_guide(9)
+    assert not os.path.exists("uploads/guides/9/guide.txt")
+    assert not os.path.exists(tmp_path / "compiled" / "9.json")
+    assert not os.path.exists(tmp_path / "embeddings" / "guide-9")
+    with pytest.raises(FileNotFoundError):
+        compiled_guide.get_compiled_guide(9)
+
+    # A new upload with no readable text does not fall back to the previous one
+    compiled_guide.import_uploaded_guide(9, str(tmp_path / "marking_guide.pdf"))
+    monkeypatch.setattr(compiled_guide, "_uploaded_guide_text", lambda path: "  ")
+    assert compiled_guide.import_uploaded_guide(9, str(tmp_path / "scan.pdf")) is None
+    with pytest.raises(FileNotFoundError):
+        compiled_guide.get_compiled_guide(9)
+
+
+def test_upload_route_queues_the_guide_import(model, tmp_path, monkeypatch):
+    flask = pytest.importorskip("flask")
+    pytest.importorskip("celery")
+    from smartscripts.app.teacher import upload_routes
+    from smartscripts.tasks import ocr_tasks
+
+    monkeypatch.setattr(compiled_guide, "_uploaded_guide_text",
+                        lambda path: "Plants make food from light.")
+    queued = []
+    monkeypatch.setattr(ocr_tasks.import_uploaded_guide_task, "delay",
+                        lambda *args: queued.append(args) or types.SimpleNamespace(id="task-1"))
+
+    app = flask.Flask(__name__)
+    app.secret_key = "test"
+    with app.test_request_context():
+        assert upload_routes.refresh_guide_cache(11, tmp_path / "marking_guide.pdf")
+    assert queued == [(11, str(tmp_path / "marking_guide.pdf"))]
+    assert model.encoded == []  # nothing read or encoded inside the request
+
+    ocr_tasks.import_uploaded_guide_task(*queued[0])
+    assert compiled_guide.get_compiled_guide(11).expected_text == "Plants make food from light."
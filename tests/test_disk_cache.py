@@ -0,0 +1,41 @@
+from smartscripts.utils.disk_cache import DiskCache
+
+
+def test_get_set_and_counters(tmp_path):
+    cache = DiskCache(tmp_path / "cache.sqlite3", max_entries=10)
+
+    assert cache.get("missing") is None
+    cache.set("page", b"hello")
+    assert cache.get("page") == b"hello"
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_lru_eviction_by_entry_count(tmp_path):
+    cache = DiskCache(tmp_path / "cache.sqlite3", max_entries=2)
+
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")  # "b" is now least recently used
+    cache.set("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_eviction_by_size_and_ttl(tmp_path):
+    cache = DiskCache(tmp_path / "cache.sqlite3", max_entries=100, max_bytes=10)
+
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    cache.set("c", b"12345")
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] <= 10
+
+    cache.set("expired", b"x", ttl=-1)
+    assert cache.get("expired") is None
@@ -0,0 +1,32 @@
+import numpy as np
+
+from smartscripts.ai import embedding_cache
+
+
+def test_embed_texts_encodes_each_text_once(fake_model):
+    first = embedding_cache.embed_texts(["banana", "kiwi", "banana"])
+    again = embedding_cache.embed_texts(["kiwi", "apple"])
+
+    assert fake_model.encoded == ["banana", "kiwi", "apple"]
+    assert first.shape == (3, 3)
+    assert np.array_equal(first[1], again[0])
+
+
+def test_store_is_versioned_and_memory_mapped(fake_model, tmp_path):
+    embedding_cache.stored_embeddings("guide-7", ["photosynthesis", "osmosis"])
+    embedding_cache.clear_embedding_cache()
+    reloaded = embedding_cache.stored_embeddings("guide-7", ["photosynthesis", "osmosis"])
+
+    assert isinstance(reloaded, np.memmap)
+    assert fake_model.encoded == ["photosynthesis", "osmosis"]
+
+    embedding_cache.stored_embeddings("guide-7", ["photosynthesis", "diffusion"])
+    # The old version is replaced
+    assert len(list((tmp_path / "embeddings" / "guide-7").glob("*.npy"))) == 1
+    assert fake_model.encoded[-1] == "diffusion"
+
+
+def test_cosine_matrix():
+    sims = embedding_cache.cosine_matrix(np.array([[1.0, 0.0], [1.0, 1.0]]), np.array([[2.0, 0.0]]))
+
+    assert np.allclose(sims, [[1.0], [np.sqrt(0.5)]])
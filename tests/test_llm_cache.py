@@ -0,0 +1,33 @@
+from smartscripts.ai import llm_cache
+from smartscripts.config import BaseConfig
+from smartscripts.utils.disk_cache import DiskCache
+
+
+def _request(text, temperature=0):
+    return {"model": "gpt-4", "temperature": temperature,
+            "messages": [{"role": "user", "content": text}]}
+
+
+def test_key_ignores_whitespace_but_not_parameters():
+    key = llm_cache.llm_cache_key(_request("Rate  these\n texts"))
+
+    assert key == llm_cache.llm_cache_key(_request(" Rate these texts "))
+    assert key != llm_cache.llm_cache_key(_request("Rate these texts", temperature=0.7))
+    assert key != llm_cache.llm_cache_key(dict(_request("Rate these texts"), model="gpt-4o"))
+
+
+def test_store_lookup_and_bypass(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "_cache", DiskCache(tmp_path / "llm.sqlite3"))
+    monkeypatch.setattr(BaseConfig, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(BaseConfig, "LLM_CACHE_BYPASS_SAMPLED", True)
+
+    llm_cache.store(_request("same prompt"), "0.9")
+    llm_cache.store(_request("sampled prompt", temperature=0.7), "ignored")
+
+    assert llm_cache.lookup([_request("same  prompt")]) == ["0.9"]
+    assert llm_cache.lookup([_request("sampled prompt", temperature=0.7)]) == [None]
+    assert llm_cache.lookup([dict(_request("same prompt"), cache=False)]) == [None]
+
+    stats = llm_cache.llm_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["bypassed"] >= 2
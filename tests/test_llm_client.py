@@ -0,0 +1,152 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from smartscripts.ai.llm_client import (
+    AsyncLLMClient, CircuitBreaker, CircuitOpenError, LLMError, SyncLLMClient
+)
+
+
+class FakeOpenAI:
+    """Local stand-in for the chat completions endpoint with scripted failures."""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fail_first = 0
+        self.status = 200
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake._lock:
+                    fake.requests += 1
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                    failing = fake.requests <= fake.fail_first
+                try:
+                    time.sleep(fake.delay)
+                    status = 500 if failing else fake.status
+                    reply = payload["messages"][0]["content"].upper()
+                    body = {"choices": [{"message": {"content": reply}}]}
+                    data = json.dumps(body if status == 200 else {"error": "boom"}).encode("utf-8")
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_api():
+    server = FakeOpenAI()
+    yield server
+    server.close()
+
+
+def _client(fake_api, **kwargs):
+    options = dict(base_url=fake_api.base_url, rate_per_second=0, backoff_base=0.01,
+                   backoff_max=0.02)
+    options.update(kwargs)
+    return SyncLLMClient(**options)
+
+
+def _messages(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_sync_facade_returns_content(fake_api):
+    client = _client(fake_api)
+    assert client.chat(_messages("hello")) == "HELLO"
+    client.close()
+
+
+def test_retries_transient_server_errors(fake_api):
+    fake_api.fail_first = 2
+    client = _client(fake_api, max_retries=3)
+
+    assert client.chat(_messages("retry")) == "RETRY"
+    assert fake_api.requests == 3
+    assert client.client.stats["retries"] == 2
+    client.close()
+
+
+def test_client_errors_are_not_retried(fake_api):
+    fake_api.status = 400
+    client = _client(fake_api, max_retries=3)
+
+    with pytest.raises(LLMError) as error:
+        client.chat(_messages("bad"))
+    assert error.value.status == 400
+    assert fake_api.requests == 1
+    client.close()
+
+
+def test_timeout_raises_after_retries(fake_api):
+    fake_api.delay = 0.5
+    client = _client(fake_api, timeout=0.1, max_retries=1)
+
+    with pytest.raises(LLMError):
+        client.chat(_messages("slow"))
+    assert fake_api.requests == 2
+    client.close()
+
+
+def test_concurrency_is_bounded(fake_api):
+    fake_api.delay = 0.05
+    client = _client(fake_api, max_concurrency=3)
+
+    results = client.chat_many([{"messages": _messages(f"page {i}")} for i in range(12)])
+    assert results == [f"PAGE {i}" for i in range(12)]
+    assert fake_api.max_in_flight <= 3
+    client.close()
+
+
+def test_circuit_breaker_fails_fast(fake_api):
+    fake_api.status = 503
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    client = _client(fake_api, max_retries=0, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            client.chat(_messages("down"))
+    with pytest.raises(CircuitOpenError):
+        client.chat(_messages("down"))
+    assert fake_api.requests == 2
+    client.close()
+
+
+def test_token_bucket_limits_rate(fake_api):
+    async def run():
+        client = AsyncLLMClient(base_url=fake_api.base_url, rate_per_second=20, burst=1)
+        start = time.monotonic()
+        await client.chat_many([{"messages": _messages("x")} for _ in range(5)])
+        return time.monotonic() - start
+
+    # One request may go immediately, the other four wait ~1/20 s each
+    assert asyncio.run(run()) >= 0.18
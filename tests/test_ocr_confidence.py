@@ -0,0 +1,19 @@
+import math
+
+from smartscripts.ai.ocr_confidence import calibrate, fit_calibration, line_confidence
+
+
+def test_confident_lines_score_higher_than_struggling_lines():
+    confident = line_confidence([0.99, 0.97, 0.98], slope=8.0, bias=3.5)
+    struggling = line_confidence([0.9, 0.3, 0.2], slope=8.0, bias=3.5)
+
+    assert confident > 0.9
+    assert struggling < 0.1
+    assert line_confidence([], slope=8.0, bias=3.5) == 0.0
+
+
+def test_fit_calibration_separates_correct_and_wrong_lines():
+    samples = [(math.log(0.95), True)] * 10 + [(math.log(0.5), False)] * 10
+    slope, bias = fit_calibration(samples)
+
+    assert calibrate(math.log(0.95), slope, bias) > 0.5 > calibrate(math.log(0.5), slope, bias)
@@ -0,0 +1,14 @@
+from smartscripts.ai.ocr_parity import character_error_rate, levenshtein_distance
+
+
+def test_levenshtein_distance():
+    assert levenshtein_distance("kitten", "sitting") == 3
+    assert levenshtein_distance("", "abc") == 3
+    assert levenshtein_distance("same", "same") == 0
+
+
+def test_character_error_rate():
+    assert character_error_rate("hello", "hello") == 0.0
+    assert character_error_rate("hello", "hallo") == 0.2
+    assert character_error_rate("", "") == 0.0
+    assert character_error_rate("", "x") == 1.0
@@ -0,0 +1,71 @@
+import numpy as np
+
+from smartscripts.ai.page_triage import PageTriage, dhash, hamming_distance
+
+
+def _page(seed):
+    rng = np.random.default_rng(seed)
+    page = np.full((800, 600), 255, np.uint8)
+    for _ in range(12):
+        y, x = rng.integers(60, 700), rng.integers(40, 400)
+        page[y:y + 14, x:x + rng.integers(60, 160)] = 0  # a line of "writing"
+    return page
+
+
+def test_blank_duplicate_and_distinct_pages():
+    triage = PageTriage(blank_ink_ratio=0.003, duplicate_distance=4)
+    first = _page(1)
+    # The same sheet scanned again, a little lighter
+    rescanned = np.clip(first.astype(np.int16) + 3, 0, 255).astype(np.uint8)
+
+    decisions = [
+        triage.triage(first, 1),
+        triage.triage(np.full((800, 600), 250, np.uint8), 2),
+        triage.triage(rescanned, 3),
+        triage.triage(_page(2), 4),
+    ]
+
+    assert [d["triage"] for d in decisions] == ["ocr", "blank", "duplicate", "ocr"]
+    assert decisions[2]["duplicate_of"] == 1
+    assert triage.counts == {"blank": 1, "duplicate": 1, "ocr": 2}
+
+
+def test_dhash_separates_different_pages():
+    assert hamming_distance(dhash(_page(1)), dhash(_page(1))) == 0
+    assert hamming_distance(dhash(_page(1)), dhash(_page(2))) > 20
+
+
+def _cover(seed):
+    page = np.full((1100, 850), 255, np.uint8)
+    page[60:100, 200:650] = 0  # printed title
+    for y in (200, 280, 360):  # printed name / ID / class boxes
+        page[y, 100:750] = page[y + 50, 100:750] = 0
+        page[y:y + 51, 100] = page[y:y + 51, 750] = 0
+    for y in range(480, 1040, 40):  # printed instructions
+        page[y:y + 8, 100:700] = 0
+    rng = np.random.default_rng(seed)
+    for y in (215, 295):  # handwriting in the name and ID boxes
+        x = 260
+        for _ in range(rng.integers(5, 9)):
+            w = int(rng.integers(10, 30))
+            page[y + int(rng.integers(0, 8)):y + 22, x:x + w] = 0
+            x += w + int(rng.integers(4, 14))
+    return page
+
+
+def test_cover_sheets_of_different_students_are_not_duplicates():
+    first, second = _cover(1), _cover(2)
+    assert hamming_distance(dhash(first), dhash(second)) <= 4  # the template dominates the hash
+
+    # Only the previous page is compared, so a later student's cover sheet is read
+    triage = PageTriage(blank_ink_ratio=0.003, duplicate_distance=4)
+    decisions = [triage.triage(first, 1), triage.triage(_page(3), 2), triage.triage(second, 3)]
+    assert [d["triage"] for d in decisions] == ["ocr", "ocr", "ocr"]
+
+    # Adjacent covers (a one-page script) look like a double-feed; callers overrule it
+    triage = PageTriage(blank_ink_ratio=0.003, duplicate_distance=4)
+    triage.triage(first, 1)
+    decision = triage.overrule(triage.triage(second, 2))
+    assert decision["triage"] == "ocr" and decision["duplicate_of"] is None
+    assert triage.triage(second, 3)["duplicate_of"] == 2
+    assert triage.counts == {"blank": 0, "duplicate": 1, "ocr": 2}
@@ -0,0 +1,35 @@
+import numpy as np
+
+from smartscripts.ai.preprocessing import downscale, preprocess_pages, remove_borders
+
+
+def _page_with_border():
+    page = np.full((400, 300), 255, np.uint8)
+    page[:, :12] = 0                # scanner border on the left edge
+    page[150:170, 80:220] = 0       # a line of "ink"
+    return page
+
+
+def test_remove_borders_trims_scanner_edge_and_margins():
+    trimmed = remove_borders(_page_with_border())
+
+    assert trimmed.shape[0] < 100
+    assert trimmed.shape[1] < 200
+    assert trimmed.min() == 0  # the content survived
+
+
+def test_downscale_only_shrinks():
+    page = np.full((2000, 1000), 255, np.uint8)
+
+    assert downscale(page, 1024).shape == (1024, 512)
+    assert downscale(page, 4000).shape == (2000, 1000)
+
+
+def test_preprocess_pages_keeps_order_and_binarizes():
+    pages = [_page_with_border(), np.full((50, 50, 3), 255, np.uint8)]
+    cleaned = preprocess_pages(pages, max_side=256, do_binarize=True, use_cache=False, workers=2)
+
+    assert len(cleaned) == 2
+    assert cleaned[0].shape[0] < 100
+    assert set(np.unique(cleaned[0])) <= {0, 255}
+    assert cleaned[1].shape == (50, 50)
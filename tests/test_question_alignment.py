@@ -0,0 +1,47 @@
+import pytest
+
+from smartscripts.ai import question_alignment
+
+VECTORS = {
+    "What is osmosis?": [1.0, 0.0, 0.0],
+    "What is photosynthesis?": [0.0, 1.0, 0.0],
+    "osmosis is water moving across a membrane": [0.9, 0.3, 0.0],
+    "plants use light and osmosis to make food": [0.8, 0.6, 0.0],
+    "my name is": [0.0, 0.0, 1.0],
+}
+
+
+GUIDE = [
+    {"id": 1, "question": "What is osmosis?"},
+    {"id": 2, "question": "What is photosynthesis?"},
+]
+
+
+@pytest.fixture
+def model(fake_model):
+    fake_model.vectorize = VECTORS.__getitem__
+    return fake_model
+
+
+def test_alignment_is_one_to_one(model):
+    blocks = ["plants use light and osmosis to make food",
+              "osmosis is water moving across a membrane",
+              "my name is"]
+
+    alignment = question_alignment.align_questions(blocks, GUIDE, threshold=0.5)
+
+    assert alignment == {"1": "osmosis is water moving across a membrane",
+                         "2": "plants use light and osmosis to make food"}
+
+
+def test_batch_mode_embeds_everything_in_one_pass(model):
+    submissions = [["osmosis is water moving across a membrane"], [], ["my name is"]]
+
+    alignments = question_alignment.batch_align_multiple_submissions(
+        submissions, GUIDE, threshold=0.5
+    )
+
+    assert model.calls == 1
+    assert alignments[0] == {"1": "osmosis is water moving across a membrane", "2": ""}
+    assert alignments[1] == {"1": "", "2": ""}
+    assert alignments[2] == {"1": "", "2": ""}
@@ -0,0 +1,38 @@
+import itertools
+
+import numpy as np
+
+from smartscripts.ai.roster_assignment import (
+    _hungarian, assign_scripts_to_students, solve_assignment
+)
+
+
+def test_hungarian_matches_brute_force():
+    rng = np.random.default_rng(5)
+    for _ in range(50):
+        cost = rng.random((4, 5)).round(2)
+        pairs = _hungarian(cost)
+        best = min(sum(cost[i, perm[i]] for i in range(4))
+                   for perm in itertools.permutations(range(5), 4))
+
+        assert len(pairs) == 4
+        assert abs(sum(cost[r, c] for r, c in pairs) - best) < 1e-9
+
+
+def test_solve_assignment_prefers_the_global_optimum():
+    scores = np.array([[0.95, 0.90], [0.92, 0.0]])
+
+    # Greedy would give student 0 to script 0 and leave script 1 unmatched
+    assert solve_assignment(scores) == {0: 1, 1: 0}
+
+
+def test_two_scripts_cannot_claim_the_same_student():
+    class_list = [{"student_id": "20210045", "name": "Jane Doe"},
+                  {"student_id": "20210046", "name": "John Smith"}]
+    scripts = [("20210045", "Jane Doe"), ("", "Jane Doe"), ("", "Nobody")]
+
+    results = assign_scripts_to_students(scripts, class_list)
+
+    assert results[0]["student"]["name"] == "Jane Doe" and results[0]["matched_by"] == "id"
+    assert results[1]["student"] is None and results[1]["closest"]["name"] == "Jane Doe"
+    assert results[2]["student"] is None and results[2]["closest"] is None
@@ -0,0 +1,62 @@
+import random
+
+from smartscripts.ai import text_matching
+from smartscripts.ai.roster_index import RosterIndex, indel_ratio, lcs_length
+
+
+def _lcs_reference(a, b):
+    table = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            if x == y:
+                table[i + 1][j + 1] = table[i][j] + 1
+            else:
+                table[i + 1][j + 1] = max(table[i][j + 1], table[i + 1][j])
+    return table[-1][-1]
+
+
+def test_bit_parallel_lcs_matches_dynamic_programming():
+    rng = random.Random(3)
+    for _ in range(500):
+        a = "".join(rng.choice("abc1") for _ in range(rng.randint(0, 10)))
+        b = "".join(rng.choice("abc1") for _ in range(rng.randint(0, 10)))
+        assert lcs_length(a, b) == _lcs_reference(a, b)
+
+
+def test_index_finds_the_same_best_match_as_a_full_scan():
+    rng = random.Random(7)
+    ids = ["".join(rng.choice("0123456789") for _ in range(8)) for _ in range(500)]
+    index = RosterIndex(ids)
+
+    for student_id in ids[:50]:
+        noisy = list(student_id)
+        noisy[rng.randrange(8)] = rng.choice("OIl0")
+        query = "".join(noisy)
+        scores = [indel_ratio(query, candidate) for candidate in ids]
+        best = max(range(len(ids)), key=lambda i: (scores[i], -i))
+        expected = (best, scores[best]) if scores[best] >= 0.8 else (None, 0.0)
+
+        assert index.best(query, 0.8) == expected
+
+
+def test_text_matching_functions_use_the_index():
+    class_list = [
+        {"student_id": "20210045", "name": "Jane Doe", "student_name": "Jane Doe"},
+        {"student_id": "20210046", "name": "John Smith", "student_name": "John Smith"},
+    ]
+
+    ids = ["20210045", "20210046"]
+    assert text_matching.fuzzy_match_id("2021OO45", ids, threshold=0.7)[0] == "20210045"
+    names = ["Jane Doe", "John Smith"]
+    assert text_matching.fuzzy_match_name("JOHN  SMlTH", names)[0] == "John Smith"
+
+    matched, unmatched, _ = text_matching.fuzzy_match_students(
+        [("20210046", "Jon Smith"), ("999", "Nobody")], class_list
+    )
+    assert [m["matched_student"]["name"] for m in matched] == ["John Smith"]
+    assert unmatched == [("999", "Nobody")]
+
+    pairs = text_matching.fuzzy_match_name_and_id_students(
+        [{"id": " 20210045 ", "name": "jane doe"}], class_list, mode="exact"
+    )
+    assert pairs[0]["matched_id"] == "20210045" and pairs[0]["combined_score"] == 1.0
@@ -0,0 +1,59 @@
+import random
+
+from smartscripts.ai.rubric_matcher import get_compiled_rubric, within_edits
+
+
+def _reference_match(answer, rubric):
+    matched, explanations, score = [], [], 0.0
+    for keyword in rubric:
+        if keyword["keyword"].lower() in answer.lower():
+            matched.append(keyword["keyword"])
+            score += keyword.get("weight", 1.0)
+            if "explanation" in keyword:
+                explanations.append(keyword["explanation"])
+    return score, matched, explanations
+
+
+def _reference_within_edits(pattern, text, k):
+    # Sellers: edit distance of pattern to the best substring of text
+    row = list(range(len(pattern) + 1))
+    best = row[-1]
+    for ch in text:
+        new = [0]
+        for i, p in enumerate(pattern):
+            new.append(min(row[i] + (p != ch), row[i + 1] + 1, new[i] + 1))
+        row = new
+        best = min(best, row[-1])
+    return best <= k
+
+
+def test_automaton_matches_substring_scan():
+    rng = random.Random(11)
+    for _ in range(300):
+        rubric = [
+            {"keyword": "".join(rng.choice("abAB ") for _ in range(rng.randint(1, 4))),
+             "weight": rng.choice([0.5, 1.0]), "explanation": f"e{i}"}
+            for i in range(rng.randint(1, 6))
+        ]
+        answer = "".join(rng.choice("abAB c") for _ in range(rng.randint(0, 30)))
+
+        assert get_compiled_rubric(rubric).score(answer) == _reference_match(answer, rubric)
+
+
+def test_bit_parallel_search_matches_dynamic_programming():
+    rng = random.Random(4)
+    for _ in range(500):
+        pattern = "".join(rng.choice("abc") for _ in range(rng.randint(1, 8)))
+        text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 20)))
+        k = rng.randint(0, 2)
+        assert within_edits(pattern, text, k) == _reference_within_edits(pattern, text, k)
+
+
+def test_fuzzy_mode_tolerates_ocr_errors_in_long_keywords_only():
+    rubric = [{"keyword": "photosynthesis", "weight": 2.0, "explanation": "names the process"},
+              {"keyword": "sun", "weight": 1.0}]
+    answer = "Plants use photosynthesls and the son."
+
+    assert get_compiled_rubric(rubric).score(answer) == (0.0, [], [])
+    expected = (2.0, ["photosynthesis"], ["names the process"])
+    assert get_compiled_rubric(rubric, max_edits=1).score(answer) == expected
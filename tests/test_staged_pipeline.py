@@ -0,0 +1,57 @@
+import threading
+import time
+
+from smartscripts.utils.staged_pipeline import Stage, StagedPipeline
+
+
+def test_results_keep_input_order_and_failures_skip_later_stages():
+    seen_by_sink = []
+
+    def slow_double(x):
+        time.sleep(0.001 * (x % 3))
+        if x == 4:
+            raise ValueError("bad page")
+        return x * 2
+
+    def add_batch(batch):
+        return [x + 1 for x in batch]
+
+    pipeline = StagedPipeline(
+        [Stage("double", slow_double, workers=3), Stage("add", add_batch, batch_size=4)],
+        sink=lambda x: seen_by_sink.append(x) or x,
+        queue_size=2,
+    )
+    results = pipeline.run(range(10))
+
+    values = [value for value, error in results if error is None]
+    assert values == [x * 2 + 1 for x in range(10) if x != 4]
+    assert isinstance(results[4][1], ValueError)
+    assert sorted(seen_by_sink) == [x * 2 + 1 for x in range(10) if x != 4]
+    assert pipeline.stats["double"]["items"] == 10 and pipeline.stats["add"]["items"] == 9
+
+
+def test_bounded_queues_throttle_the_feeder():
+    released = threading.Event()
+    produced = []
+
+    def hold(x):
+        released.wait(1)
+        return x
+
+    def feed():
+        for x in range(50):
+            produced.append(x)
+            yield x
+
+    pipeline = StagedPipeline([Stage("hold", hold, workers=1)], queue_size=2)
+    runner = threading.Thread(target=lambda: pipeline.run(feed()))
+    runner.start()
+    time.sleep(0.1)
+    produced_while_stuck = len(produced)
+    released.set()
+    runner.join(5)
+
+    # One item in the stage, two queued, one waiting in put(): the feeder stops there
+    assert produced_while_stuck <= 4
+    assert pipeline.stats["feed"]["items"] == 50 and pipeline.stats["hold"]["items"] == 50
+    assert pipeline.stats["feed"]["blocked"] > 0